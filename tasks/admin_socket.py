@@ -6,11 +6,11 @@ from cStringIO import StringIO
 import json
 import logging
 import os
-import time
 
 from teuthology.orchestra import run
 from teuthology import misc as teuthology
 from teuthology.parallel import parallel
+from util.wait import Waiter, get_wait_report
 
 log = logging.getLogger(__name__)
 
@@ -85,8 +85,8 @@ def _socket_command(ctx, remote, socket_path, command, args):
     """
     json_fp = StringIO()
     testdir = teuthology.get_testdir(ctx)
-    max_tries = 60
-    while True:
+
+    def attempt():
         proc = remote.run(
             args=[
                 'sudo',
@@ -100,12 +100,15 @@ def _socket_command(ctx, remote, socket_path, command, args):
             check_status=False,
             )
         if proc.exitstatus == 0:
-            break
-        assert max_tries > 0
-        max_tries -= 1
+            return True
         log.info('ceph cli returned an error, command not registered yet?')
         log.info('sleeping and retrying ...')
-        time.sleep(1)
+        return False
+
+    waiter = Waiter('admin_socket.command', attempt, timeout=60,
+                    interval=0.25, max_interval=1, backoff=2,
+                    report=get_wait_report(ctx))
+    assert waiter.wait()
     out = json_fp.getvalue()
     json_fp.close()
     log.debug('admin socket command %s returned %s', command, out)
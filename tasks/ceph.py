@@ -10,15 +10,20 @@ import contextlib
 import logging
 import os
 import json
+import tarfile
 import time
 
 from ceph_manager import CephManager
+from util.pg_stats import iter_pg_stats
+from util.timings import get_phase_timings, timed_phase
 from teuthology import misc as teuthology
 from teuthology import contextutil
 from teuthology.orchestra import run
 import ceph_client as cclient
 from teuthology.orchestra.run import CommandFailedError
 from teuthology.orchestra.daemon import DaemonGroup
+from teuthology.parallel import parallel
+from gevent.pool import Pool
 
 DEFAULT_CONF_PATH = '/etc/ceph/ceph.conf'
 CEPH_ROLE_TYPES = ['mon', 'osd', 'mds', 'rgw']
@@ -218,6 +223,219 @@ def cephfs_setup(ctx, config):
     yield
 
 
+def send_monmap(remote, keyring_path, keyring, testdir, monmap):
+    """
+    Copy the mon key and initial monmap to a node.
+    """
+    log.info('Sending monmap to node {remote}'.format(remote=remote))
+    teuthology.sudo_write_file(
+        remote=remote,
+        path=keyring_path,
+        data=keyring,
+        perms='0644'
+        )
+    teuthology.write_file(
+        remote=remote,
+        path='{tdir}/monmap'.format(tdir=testdir),
+        data=monmap,
+        )
+
+
+def read_keyrings(remote, paths):
+    """
+    Read several keyrings of a node as a single tar stream.
+
+    :param paths: list of absolute keyring paths
+    :returns: dict of path -> keyring contents
+    """
+    proc = remote.run(
+        args=[
+            'sudo', 'tar', '-c', '-f', '-', '-C', '/',
+            ] + [path.lstrip('/') for path in paths],
+        stdout=StringIO(),
+        )
+    ret = {}
+    tar = tarfile.open(fileobj=StringIO(proc.stdout.getvalue()))
+    for member in tar.getmembers():
+        if member.isfile():
+            ret['/' + member.name] = tar.extractfile(member).read()
+    tar.close()
+    return ret
+
+
+def collect_keyrings(ctx):
+    """
+    Read the keyrings of all mds, osd and client roles, one tar stream
+    per node, all nodes in parallel.
+
+    :returns: list of (type, id, keyring contents)
+    """
+    wanted = []
+    for remote, roles_for_host in ctx.cluster.remotes.iteritems():
+        for type_ in ['mds','osd']:
+            for id_ in teuthology.roles_of_type(roles_for_host, type_):
+                wanted.append((remote, type_, id_,
+                               '/var/lib/ceph/{type}/ceph-{id}/keyring'.format(
+                                   type=type_,
+                                   id=id_,
+                                   )))
+    for remote, roles_for_host in ctx.cluster.remotes.iteritems():
+        for id_ in teuthology.roles_of_type(roles_for_host, 'client'):
+            wanted.append((remote, 'client', id_,
+                           '/etc/ceph/ceph.client.{id}.keyring'.format(id=id_)))
+
+    by_remote = {}
+    for (remote, _, _, path) in wanted:
+        by_remote.setdefault(remote, []).append(path)
+    contents = {}
+    with parallel() as p:
+        for (remote, paths) in by_remote.iteritems():
+            p.spawn(read_keyrings, remote, paths)
+        for result in p:
+            contents.update(result)
+    return [(type_, id_, contents[path])
+            for (remote, type_, id_, path) in wanted]
+
+
+def keyring_with_caps(keys):
+    """
+    Concatenate keyrings, adding the default caps of each daemon type
+    as 'caps' lines, for a single ceph-authtool --import-keyring.
+
+    :param keys: list of (type, id, keyring contents)
+    """
+    out = StringIO()
+    for type_, id_, data in keys:
+        out.write(data.rstrip('\n') + '\n')
+        caps = list(teuthology.generate_caps(type_))
+        # generate_caps yields '--cap', subsystem, capability triples
+        for i in range(0, len(caps), 3):
+            out.write('\tcaps {sub} = "{cap}"\n'.format(
+                sub=caps[i + 1], cap=caps[i + 2]))
+    return out.getvalue()
+
+
+def mkfs_osd(ctx, config, remote, id_, dev, devs_to_clean, coverage_dir,
+             testdir):
+    """
+    Create the data directory of an osd, make and mount its file system
+    if it has a scratch device, then run ceph-osd --mkfs.
+
+    :param dev: scratch device of the osd, or None
+    """
+    remote.run(
+        args=[
+            'sudo',
+            'mkdir',
+            '-p',
+            '/var/lib/ceph/osd/ceph-{id}'.format(id=id_),
+            ])
+    if dev:
+        fs = config.get('fs')
+        package = None
+        mkfs_options = config.get('mkfs_options')
+        mount_options = config.get('mount_options')
+        if fs == 'btrfs':
+            #package = 'btrfs-tools'
+            if mount_options is None:
+                mount_options = ['noatime','user_subvol_rm_allowed']
+            if mkfs_options is None:
+                mkfs_options = ['-m', 'single',
+                                '-l', '32768',
+                                '-n', '32768']
+        if fs == 'xfs':
+            #package = 'xfsprogs'
+            if mount_options is None:
+                mount_options = ['noatime']
+            if mkfs_options is None:
+                mkfs_options = ['-f', '-i', 'size=2048']
+        if fs == 'ext4' or fs == 'ext3':
+            if mount_options is None:
+                mount_options = ['noatime','user_xattr']
+
+        if mount_options is None:
+            mount_options = []
+        # copied, since osds are set up concurrently and '-f' may be
+        # appended below
+        mkfs_options = list(mkfs_options or [])
+        mkfs = ['mkfs.%s' % fs] + mkfs_options
+        log.info('%s on %s on %s' % (mkfs, dev, remote))
+        if package is not None:
+            remote.run(
+                args=[
+                    'sudo',
+                    'apt-get', 'install', '-y', package
+                    ],
+                stdout=StringIO(),
+                )
+
+        try:
+            remote.run(args= ['yes', run.Raw('|')] + ['sudo'] + mkfs + [dev])
+        except run.CommandFailedError:
+            # Newer btfs-tools doesn't prompt for overwrite, use -f
+            if '-f' not in mkfs_options:
+                mkfs_options.append('-f')
+                mkfs = ['mkfs.%s' % fs] + mkfs_options
+                log.info('%s on %s on %s' % (mkfs, dev, remote))
+            remote.run(args= ['yes', run.Raw('|')] + ['sudo'] + mkfs + [dev])
+
+        log.info('mount %s on %s -o %s' % (dev, remote,
+                                           ','.join(mount_options)))
+        remote.run(
+            args=[
+                'sudo',
+                'mount',
+                '-t', fs,
+                '-o', ','.join(mount_options),
+                dev,
+                os.path.join('/var/lib/ceph/osd', 'ceph-{id}'.format(id=id_)),
+                ]
+            )
+        ctx.disk_config.remote_to_roles_to_dev_mount_options[remote][id_] = mount_options
+        ctx.disk_config.remote_to_roles_to_dev_fstype[remote][id_] = fs
+        devs_to_clean[remote].append(
+            os.path.join(
+                os.path.join('/var/lib/ceph/osd', 'ceph-{id}'.format(id=id_)),
+                )
+            )
+
+    remote.run(
+        args=[
+            'sudo',
+            'MALLOC_CHECK_=3',
+            'adjust-ulimits',
+            'ceph-coverage',
+            coverage_dir,
+            'ceph-osd',
+            '--mkfs',
+            '--mkkey',
+            '-i', id_,
+            '--monmap', '{tdir}/monmap'.format(tdir=testdir),
+            ],
+        )
+
+
+def mkfs_osd_host(ctx, config, remote, roles_for_host, devs_to_clean,
+                  coverage_dir, testdir):
+    """
+    Set up the osds of one host, up to osd_mkfs_concurrency (default 4)
+    of them at a time.
+    """
+    roles_to_devs = ctx.disk_config.remote_to_roles_to_dev[remote]
+    ctx.disk_config.remote_to_roles_to_dev_mount_options.setdefault(remote, {})
+    ctx.disk_config.remote_to_roles_to_dev_fstype.setdefault(remote, {})
+    pool = Pool(config.get('osd_mkfs_concurrency', 4))
+    with get_phase_timings(ctx).timed_host('osd_mkfs', remote.shortname):
+        jobs = [pool.spawn(mkfs_osd, ctx, config, remote, id_,
+                           roles_to_devs.get(id_), devs_to_clean,
+                           coverage_dir, testdir)
+                for id_ in teuthology.roles_of_type(roles_for_host, 'osd')]
+        pool.join()
+    for job in jobs:
+        # raise the first failure
+        job.get()
+
+
 @contextlib.contextmanager
 def cluster(ctx, config):
     """
@@ -416,20 +634,9 @@ def cluster(ctx, config):
         path='{tdir}/monmap'.format(tdir=testdir),
         )
 
-    for rem in ctx.cluster.remotes.iterkeys():
-        # copy mon key and initial monmap
-        log.info('Sending monmap to node {remote}'.format(remote=rem))
-        teuthology.sudo_write_file(
-            remote=rem,
-            path=keyring_path,
-            data=keyring,
-            perms='0644'
-            )
-        teuthology.write_file(
-            remote=rem,
-            path='{tdir}/monmap'.format(tdir=testdir),
-            data=monmap,
-            )
+    with parallel() as p:
+        for rem in ctx.cluster.remotes.iterkeys():
+            p.spawn(send_monmap, rem, keyring_path, keyring, testdir, monmap)
 
     log.info('Setting up mon nodes...')
     mons = ctx.cluster.only(teuthology.is_type('mon'))
@@ -486,168 +693,42 @@ def cluster(ctx, config):
     ctx.disk_config.remote_to_roles_to_dev_fstype = {}
 
     log.info("ctx.disk_config.remote_to_roles_to_dev: {r}".format(r=str(ctx.disk_config.remote_to_roles_to_dev)))
-    for remote, roles_for_host in osds.remotes.iteritems():
-        roles_to_devs = remote_to_roles_to_devs[remote]
-        roles_to_journals = remote_to_roles_to_journals[remote]
-
-
-        for id_ in teuthology.roles_of_type(roles_for_host, 'osd'):
-            remote.run(
-                args=[
-                    'sudo',
-                    'mkdir',
-                    '-p',
-                    '/var/lib/ceph/osd/ceph-{id}'.format(id=id_),
-                    ])
-            log.info(str(roles_to_journals))
-            log.info(id_)
-            if roles_to_devs.get(id_):
-                dev = roles_to_devs[id_]
-                fs = config.get('fs')
-                package = None
-                mkfs_options = config.get('mkfs_options')
-                mount_options = config.get('mount_options')
-                if fs == 'btrfs':
-                    #package = 'btrfs-tools'
-                    if mount_options is None:
-                        mount_options = ['noatime','user_subvol_rm_allowed']
-                    if mkfs_options is None:
-                        mkfs_options = ['-m', 'single',
-                                        '-l', '32768',
-                                        '-n', '32768']
-                if fs == 'xfs':
-                    #package = 'xfsprogs'
-                    if mount_options is None:
-                        mount_options = ['noatime']
-                    if mkfs_options is None:
-                        mkfs_options = ['-f', '-i', 'size=2048']
-                if fs == 'ext4' or fs == 'ext3':
-                    if mount_options is None:
-                        mount_options = ['noatime','user_xattr']
-
-                if mount_options is None:
-                    mount_options = []
-                if mkfs_options is None:
-                    mkfs_options = []
-                mkfs = ['mkfs.%s' % fs] + mkfs_options
-                log.info('%s on %s on %s' % (mkfs, dev, remote))
-                if package is not None:
-                    remote.run(
-                        args=[
-                            'sudo',
-                            'apt-get', 'install', '-y', package
-                            ],
-                        stdout=StringIO(),
-                        )
-
-                try:
-                    remote.run(args= ['yes', run.Raw('|')] + ['sudo'] + mkfs + [dev])
-                except run.CommandFailedError:
-                    # Newer btfs-tools doesn't prompt for overwrite, use -f
-                    if '-f' not in mount_options:
-                        mkfs_options.append('-f')
-                        mkfs = ['mkfs.%s' % fs] + mkfs_options
-                        log.info('%s on %s on %s' % (mkfs, dev, remote))
-                    remote.run(args= ['yes', run.Raw('|')] + ['sudo'] + mkfs + [dev])
-
-                log.info('mount %s on %s -o %s' % (dev, remote,
-                                                   ','.join(mount_options)))
-                remote.run(
-                    args=[
-                        'sudo',
-                        'mount',
-                        '-t', fs,
-                        '-o', ','.join(mount_options),
-                        dev,
-                        os.path.join('/var/lib/ceph/osd', 'ceph-{id}'.format(id=id_)),
-                        ]
-                    )
-                if not remote in ctx.disk_config.remote_to_roles_to_dev_mount_options:
-                    ctx.disk_config.remote_to_roles_to_dev_mount_options[remote] = {}
-                ctx.disk_config.remote_to_roles_to_dev_mount_options[remote][id_] = mount_options
-                if not remote in ctx.disk_config.remote_to_roles_to_dev_fstype:
-                    ctx.disk_config.remote_to_roles_to_dev_fstype[remote] = {}
-                ctx.disk_config.remote_to_roles_to_dev_fstype[remote][id_] = fs
-                devs_to_clean[remote].append(
-                    os.path.join(
-                        os.path.join('/var/lib/ceph/osd', 'ceph-{id}'.format(id=id_)),
-                        )
-                    )
-
-        for id_ in teuthology.roles_of_type(roles_for_host, 'osd'):
-            remote.run(
-                args=[
-                    'sudo',
-                    'MALLOC_CHECK_=3',
-                    'adjust-ulimits',
-                    'ceph-coverage',
-                    coverage_dir,
-                    'ceph-osd',
-                    '--mkfs',
-                    '--mkkey',
-                    '-i', id_,
-                    '--monmap', '{tdir}/monmap'.format(tdir=testdir),
-                    ],
-                )
+    timings = get_phase_timings(ctx)
+    with timings.timed('cluster', 'osd_mkfs'):
+        with parallel() as p:
+            for remote, roles_for_host in osds.remotes.iteritems():
+                p.spawn(mkfs_osd_host, ctx, config, remote, roles_for_host,
+                        devs_to_clean, coverage_dir, testdir)
 
 
     log.info('Reading keys from all nodes...')
-    keys_fp = StringIO()
-    keys = []
-    for remote, roles_for_host in ctx.cluster.remotes.iteritems():
-        for type_ in ['mds','osd']:
-            for id_ in teuthology.roles_of_type(roles_for_host, type_):
-                data = teuthology.get_file(
-                    remote=remote,
-                    path='/var/lib/ceph/{type}/ceph-{id}/keyring'.format(
-                        type=type_,
-                        id=id_,
-                        ),
-                    sudo=True,
-                    )
-                keys.append((type_, id_, data))
-                keys_fp.write(data)
-    for remote, roles_for_host in ctx.cluster.remotes.iteritems():
-        for type_ in ['client']:
-            for id_ in teuthology.roles_of_type(roles_for_host, type_):
-                data = teuthology.get_file(
-                    remote=remote,
-                    path='/etc/ceph/ceph.client.{id}.keyring'.format(id=id_)
-                    )
-                keys.append((type_, id_, data))
-                keys_fp.write(data)
+    with timings.timed('cluster', 'collect_keys'):
+        keys = collect_keyrings(ctx)
 
     log.info('Adding keys to all mons...')
+    import_path = '{tdir}/daemon.keyring'.format(tdir=testdir)
     writes = mons.run(
         args=[
-            'sudo', 'tee', '-a',
+            'cat', run.Raw('>'), import_path,
+            run.Raw('&&'),
+            'sudo',
+            'adjust-ulimits',
+            'ceph-coverage',
+            coverage_dir,
+            'ceph-authtool',
             keyring_path,
+            '--import-keyring', import_path,
+            run.Raw('&&'),
+            'rm', '-f', import_path,
             ],
         stdin=run.PIPE,
         wait=False,
         stdout=StringIO(),
         )
-    keys_fp.seek(0)
-    teuthology.feed_many_stdins_and_close(keys_fp, writes)
-    run.wait(writes)
-    for type_, id_, data in keys:
-        run.wait(
-            mons.run(
-                args=[
-                    'sudo',
-                    'adjust-ulimits',
-                    'ceph-coverage',
-                    coverage_dir,
-                    'ceph-authtool',
-                    keyring_path,
-                    '--name={type}.{id}'.format(
-                        type=type_,
-                        id=id_,
-                        ),
-                    ] + list(teuthology.generate_caps(type_)),
-                wait=False,
-                ),
-            )
+    with timings.timed('cluster', 'import_keys'):
+        teuthology.feed_many_stdins_and_close(
+            StringIO(keyring_with_caps(keys)), writes)
+        run.wait(writes)
 
     log.info('Running mkfs on mon nodes...')
     for remote, roles_for_host in mons.remotes.iteritems():
@@ -772,34 +853,37 @@ def cluster(ctx, config):
             for remote, roles in mons.remotes.iteritems():
                 for role in roles:
                     if role.startswith('mon.'):
-                        teuthology.pull_directory_tarball(
-                            remote,
-                            '/var/lib/ceph/mon',
-                            path + '/' + role + '.tgz')
+                        with timings.timed_host('mon_data_pull',
+                                                remote.shortname):
+                            teuthology.pull_directory_tarball(
+                                remote,
+                                '/var/lib/ceph/mon',
+                                path + '/' + role + '.tgz')
 
             # and logs
             log.info('Compressing logs...')
-            run.wait(
-                ctx.cluster.run(
-                    args=[
-                        'sudo',
-                        'find',
-                        '/var/log/ceph',
-                        '-name',
-                        '*.log',
-                        '-print0',
-                        run.Raw('|'),
-                        'sudo',
-                        'xargs',
-                        '-0',
-                        '--no-run-if-empty',
-                        '--',
-                        'gzip',
-                        '--',
-                        ],
-                    wait=False,
-                    ),
-                )
+            with timings.timed('cluster', 'compress_logs'):
+                run.wait(
+                    ctx.cluster.run(
+                        args=[
+                            'sudo',
+                            'find',
+                            '/var/log/ceph',
+                            '-name',
+                            '*.log',
+                            '-print0',
+                            run.Raw('|'),
+                            'sudo',
+                            'xargs',
+                            '-0',
+                            '--no-run-if-empty',
+                            '--',
+                            'gzip',
+                            '--',
+                            ],
+                        wait=False,
+                        ),
+                    )
 
             log.info('Archiving logs...')
             path = os.path.join(ctx.archive, 'remote')
@@ -807,8 +891,9 @@ def cluster(ctx, config):
             for remote in ctx.cluster.remotes.iterkeys():
                 sub = os.path.join(path, remote.shortname)
                 os.makedirs(sub)
-                teuthology.pull_directory(remote, '/var/log/ceph',
-                                          os.path.join(sub, 'log'))
+                with timings.timed_host('log_pull', remote.shortname):
+                    teuthology.pull_directory(remote, '/var/log/ceph',
+                                              os.path.join(sub, 'log'))
 
 
         log.info('Cleaning ceph cluster...')
@@ -830,16 +915,10 @@ def cluster(ctx, config):
 
 def get_all_pg_info(rem_site, testdir):
     """
-    Get the results of a ceph pg dump
+    Get the state and last scrub stamp of every pg from a ceph pg dump
     """
-    info = rem_site.run(args=[
-                        'adjust-ulimits',
-                        'ceph-coverage',
-                        '{tdir}/archive/coverage'.format(tdir=testdir),
-                        'ceph', 'pg', 'dump',
-                        '--format', 'json'], stdout=StringIO())
-    all_info = json.loads(info.stdout.getvalue())
-    return all_info['pg_stats']
+    return list(iter_pg_stats(rem_site, testdir,
+                              fields=('state', 'last_scrub_stamp')))
 
 def osd_scrub_pgs(ctx, config):
     """
@@ -1176,6 +1255,21 @@ def task(ctx, config):
     Note, this will cause the task to check the /scratch_devs file on each node
     for available devices.  If no such file is found, /dev/sdb will be used.
 
+    The osds of all hosts are set up in parallel.  On each host, at most
+    osd_mkfs_concurrency (default 4) osds run mkfs, mount and
+    ceph-osd --mkfs at once::
+
+        tasks:
+        - ceph:
+            fs: btrfs
+            osd_mkfs_concurrency: 12
+
+    The setup and teardown of each phase (ceph_log, valgrind_post,
+    cluster, run_daemon.*, cephfs_setup), healthy, the final scrub and
+    steps of cluster such as osd mkfs and log compression are timed,
+    as are osd mkfs and log and mon data pulls per host.  The timings
+    go to ctx.summary under timings and to timings.json in the archive.
+
     To run some daemons under valgrind, include their names
     and the tool/args to use in a valgrind section::
 
@@ -1216,6 +1310,14 @@ def task(ctx, config):
         - ceph:
             log-whitelist: ['foo.*bar', 'bad message']
 
+    To send the mon commands issued by ctx.manager through one
+    long-lived connection instead of a ceph CLI process per command,
+    use::
+
+        tasks:
+        - ceph:
+            command_session: true
+
     :param ctx: Context
     :param config: Configuration
     """
@@ -1243,35 +1345,62 @@ def task(ctx, config):
                 )
             )
 
-    with contextutil.nested(
-        lambda: ceph_log(ctx=ctx, config=None),
-        lambda: valgrind_post(ctx=ctx, config=config),
-        lambda: cluster(ctx=ctx, config=dict(
-                conf=config.get('conf', {}),
-                fs=config.get('fs', None),
-                mkfs_options=config.get('mkfs_options', None),
-                mount_options=config.get('mount_options',None),
-                block_journal=config.get('block_journal', None),
-                tmpfs_journal=config.get('tmpfs_journal', None),
-                log_whitelist=config.get('log-whitelist', []),
-                cpu_profile=set(config.get('cpu_profile', [])),
-                )),
-        lambda: run_daemon(ctx=ctx, config=config, type_='mon'),
-        lambda: run_daemon(ctx=ctx, config=config, type_='osd'),
-        lambda: cephfs_setup(ctx=ctx, config=config),
-        lambda: run_daemon(ctx=ctx, config=config, type_='mds'),
-        ):
-        try:
-            if config.get('wait-for-healthy', True):
-                healthy(ctx=ctx, config=None)
-            first_mon = teuthology.get_first_mon(ctx, config)
-            (mon,) = ctx.cluster.only(first_mon).remotes.iterkeys()
-            ctx.manager = CephManager(
-                mon,
-                ctx=ctx,
-                logger=log.getChild('ceph_manager'),
-            )
-            yield
-        finally:
-            if config.get('wait-for-scrub', True):
-                osd_scrub_pgs(ctx, config)
+    timings = get_phase_timings(ctx)
+    try:
+        with contextutil.nested(
+            lambda: timed_phase(timings, 'ceph_log',
+                                ceph_log(ctx=ctx, config=None)),
+            lambda: timed_phase(timings, 'valgrind_post',
+                                valgrind_post(ctx=ctx, config=config)),
+            lambda: timed_phase(timings, 'cluster', cluster(ctx=ctx, config=dict(
+                    conf=config.get('conf', {}),
+                    fs=config.get('fs', None),
+                    mkfs_options=config.get('mkfs_options', None),
+                    mount_options=config.get('mount_options',None),
+                    osd_mkfs_concurrency=config.get('osd_mkfs_concurrency', 4),
+                    block_journal=config.get('block_journal', None),
+                    tmpfs_journal=config.get('tmpfs_journal', None),
+                    log_whitelist=config.get('log-whitelist', []),
+                    cpu_profile=set(config.get('cpu_profile', [])),
+                    ))),
+            lambda: timed_phase(timings, 'run_daemon.mon',
+                                run_daemon(ctx=ctx, config=config, type_='mon')),
+            lambda: timed_phase(timings, 'run_daemon.osd',
+                                run_daemon(ctx=ctx, config=config, type_='osd')),
+            lambda: timed_phase(timings, 'cephfs_setup',
+                                cephfs_setup(ctx=ctx, config=config)),
+            lambda: timed_phase(timings, 'run_daemon.mds',
+                                run_daemon(ctx=ctx, config=config, type_='mds')),
+            ):
+            try:
+                if config.get('wait-for-healthy', True):
+                    with timings.timed('healthy'):
+                        healthy(ctx=ctx, config=None)
+                first_mon = teuthology.get_first_mon(ctx, config)
+                (mon,) = ctx.cluster.only(first_mon).remotes.iterkeys()
+                ctx.manager = CephManager(
+                    mon,
+                    ctx=ctx,
+                    logger=log.getChild('ceph_manager'),
+                )
+                if config.get('command_session', False):
+                    ctx.manager.start_command_session()
+                yield
+            finally:
+                if hasattr(ctx, 'manager'):
+                    ctx.manager.stop_watcher()
+                    ctx.manager.stop_command_session()
+                if getattr(ctx, 'wait_report', None) is not None:
+                    ctx.summary['wait_times'] = ctx.wait_report.summary()
+                if getattr(ctx, 'command_stats', None) is not None:
+                    ctx.summary['command_times'] = ctx.command_stats.summary()
+                    if ctx.archive is not None:
+                        ctx.command_stats.write(
+                            os.path.join(ctx.archive, 'command_times.json'))
+                if config.get('wait-for-scrub', True):
+                    with timings.timed('osd_scrub_pgs'):
+                        osd_scrub_pgs(ctx, config)
+    finally:
+        ctx.summary['timings'] = timings.summary()
+        if ctx.archive is not None:
+            timings.write(os.path.join(ctx.archive, 'timings.json'))
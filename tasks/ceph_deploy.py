@@ -13,6 +13,7 @@ from teuthology import contextutil
 from teuthology.config import config as teuth_config
 from teuthology.task import install as install_fn
 from teuthology.orchestra import run
+from util.wait import Waiter, get_wait_report
 
 log = logging.getLogger(__name__)
 
@@ -66,14 +67,8 @@ def is_healthy(ctx, config):
     testdir = teuthology.get_testdir(ctx)
     ceph_admin = teuthology.get_first_mon(ctx, config)
     (remote,) = ctx.cluster.only(ceph_admin).remotes.keys()
-    max_tries = 90  # 90 tries * 10 secs --> 15 minutes
-    tries = 0
-    while True:
-        tries += 1
-        if tries >= max_tries:
-            msg = "ceph health was unable to get 'HEALTH_OK' after waiting 15 minutes"
-            raise RuntimeError(msg)
 
+    def health_ok():
         r = remote.run(
             args=[
                 'cd',
@@ -87,9 +82,14 @@ def is_healthy(ctx, config):
             )
         out = r.stdout.getvalue()
         log.info('Ceph health: %s', out.rstrip('\n'))
-        if out.split(None, 1)[0] == 'HEALTH_OK':
-            break
-        time.sleep(10)
+        return out.split(None, 1)[0] == 'HEALTH_OK'
+
+    waiter = Waiter('ceph_deploy.is_healthy', health_ok, timeout=900,
+                    interval=1, max_interval=10, backoff=2,
+                    report=get_wait_report(ctx))
+    if not waiter.wait():
+        msg = "ceph health was unable to get 'HEALTH_OK' after waiting 15 minutes"
+        raise RuntimeError(msg)
 
 def get_nodes_using_roles(ctx, config, role):
     """Extract the names of nodes that match a given role from a cluster"""
@@ -2,16 +2,49 @@
 ceph manager -- Thrasher and CephManager objects
 """
 from cStringIO import StringIO
+from array import array
+import functools
 import random
+import re
 import time
 import gevent
+from gevent.event import Event
+from gevent.pool import Pool
 import json
 import threading
 import os
 from teuthology import misc as teuthology
+from teuthology.orchestra import run
+from teuthology.parallel import parallel
 from tasks.scrub import Scrubber
 from util.rados import cmd_erasure_code_profile
+from util.ceph_session import CephCommandSession
+from util.wait import Waiter, get_wait_report
+from util.pg_stats import iter_pg_stats
+from util.roles import get_role_index, invalidate_role_index
+from util.cmd_stats import time_command
+from util.timeline import ThrashTimeline, ThrashSchedule, load_schedule
+from util.thrash_policy import ThrashPolicy
+from util.powercycle import PowerCycler
 from teuthology.orchestra.remote import Remote
+from teuthology.orchestra.run import CommandFailedError
+
+# pg stat fields kept by the cluster state cache
+PG_STAT_FIELDS = ('pgid', 'state', 'up', 'acting', 'stat_sum',
+                  'last_scrub_stamp', 'last_deep_scrub_stamp')
+
+
+def json_loads_dump(out):
+    """
+    Parse the output of a ceph dump command.  The CLI prints a status
+    line (e.g. 'dumped all in format json') ahead of the JSON, while the
+    command session returns the JSON alone.
+    """
+    try:
+        return json.loads(out)
+    except ValueError:
+        return json.loads('\n'.join(out.split('\n')[1:]))
+
 
 def make_admin_daemon_dir(ctx, remote):
     """
@@ -72,6 +105,11 @@ class Thrasher:
         self.stopping = False
         self.logger = logger
         self.config = config
+        self.random_seed = self.config.get('seed', None)
+        if self.random_seed is None:
+            self.random_seed = int(time.time())
+        self.rng = random.Random()
+        self.rng.seed(int(self.random_seed))
         self.revive_timeout = self.config.get("revive_timeout", 150)
         if self.config.get('powercycle'):
             self.revive_timeout += 120
@@ -79,6 +117,29 @@ class Thrasher:
         self.minin = self.config.get("min_in", 3)
         self.ceph_objectstore_tool = self.config.get('ceph_objectstore_tool', True)
         self.chance_move_pg = self.config.get('chance_move_pg', 1.0)
+        self.max_concurrent_actions = int(self.config.get(
+            'max_concurrent_actions', 1))
+        assert self.max_concurrent_actions >= 1, \
+            'max_concurrent_actions must be at least 1'
+        self.objectstore_tool_rate = self.config.get(
+            'objectstore_tool_rate', 1.0)
+        self.objectstore_tool_budget = self.config.get(
+            'objectstore_tool_budget', 0)
+        self.objectstore_tool_pool = Pool(self.config.get(
+                'objectstore_tool_concurrency', 2))
+        self.objectstore_tool_jobs = {}
+        self.timeline = ThrashTimeline()
+        self.objectstore_tool_cycle_bytes = 0
+        self.objectstore_tool_stats = {
+            'runs': 0,
+            'failures': 0,
+            'sampled_out': 0,
+            'over_budget': 0,
+            'pool_full': 0,
+            'osd_busy': 0,
+            'bytes': 0,
+            'seconds': 0.0,
+            }
 
         num_osds = self.in_osds + self.out_osds
         self.max_pgs = self.config.get("max_pgs_per_pool_osd", 1200) * num_osds
@@ -93,6 +154,14 @@ class Thrasher:
             self.log = tmp
         if self.config is None:
             self.config = dict()
+        self.schedule = ThrashSchedule(self.log)
+        self.policy = ThrashPolicy(
+            self.rng,
+            op_delay=self.config.get('op_delay', 5),
+            actions_per_minute=self.config.get('actions_per_minute'),
+            failures_per_minute=self.config.get('failures_per_minute'))
+        self.register_actions()
+        self.log('thrasher seed: {s}'.format(s=self.random_seed))
         # prevent monitor from auto-marking things out while thrasher runs
         # try both old and new tell syntax, in case we are testing old code
         try:
@@ -103,84 +172,193 @@ class Thrasher:
                                     '--mon-osd-down-out-interval 0')
         self.thread = gevent.spawn(self.do_thrash)
 
-    def kill_osd(self, osd=None, mark_down=False, mark_out=False):
+    def kill_osd(self, osd=None, mark_down=False, mark_out=False,
+                 test_objectstore_tool=True):
         """
         :param osd: Osd to be killed.
         :mark_down: Mark down if true.
         :mark_out: Mark out if true.
+        :test_objectstore_tool: Move a pg with ceph_objectstore_tool if
+                                enabled in the config.
         """
         if osd is None:
-            osd = random.choice(self.live_osds)
-        self.log("Killing osd %s, live_osds are %s" % (str(osd), str(self.live_osds)))
-        self.live_osds.remove(osd)
-        self.dead_osds.append(osd)
-        self.ceph_manager.kill_osd(osd)
-        if mark_down:
-            self.ceph_manager.mark_down_osd(osd)
-        if mark_out and osd in self.in_osds:
-            self.out_osd(osd)
-        if self.ceph_objectstore_tool:
-            self.log("Testing ceph_objectstore_tool on down osd")
-            (remote,) = self.ceph_manager.ctx.cluster.only('osd.{o}'.format(o=osd)).remotes.iterkeys()
-            FSPATH = self.ceph_manager.get_filepath()
-            JPATH = os.path.join(FSPATH, "journal")
-            exp_osd = imp_osd = osd
-            exp_remote = imp_remote = remote
-            # If an older osd is available we'll move a pg from there
-            if len(self.dead_osds) > 1 and random.random() < self.chance_move_pg:
-                exp_osd = random.choice(self.dead_osds[:-1])
-                (exp_remote,) = self.ceph_manager.ctx.cluster.only('osd.{o}'.format(o=exp_osd)).remotes.iterkeys()
-            prefix = "sudo ceph_objectstore_tool --data-path {fpath} --journal-path {jpath} ".format(fpath=FSPATH, jpath=JPATH)
-            cmd = (prefix + "--op list-pgs").format(id=exp_osd)
-            proc = exp_remote.run(args=cmd, wait=True, check_status=True, stdout=StringIO())
+            osd = self.rng.choice(self.live_osds)
+        with self.schedule.step('kill_osd', osd=osd, mark_down=mark_down,
+                                mark_out=mark_out):
+            self.log("Killing osd %s, live_osds are %s" % (str(osd), str(self.live_osds)))
+            self.live_osds.remove(osd)
+            self.dead_osds.append(osd)
+            with self.timeline.action('kill_osd', [osd]):
+                self.ceph_manager.kill_osd(osd)
+                if mark_down:
+                    self.ceph_manager.mark_down_osd(osd)
+            if mark_out and osd in self.in_osds:
+                self.out_osd(osd)
+            if self.ceph_objectstore_tool and test_objectstore_tool:
+                self.schedule_objectstore_tool(osd)
+
+    def kill_osds(self, osds):
+        """
+        Kill several osds in parallel.  ceph_objectstore_tool runs are
+        only scheduled once all of them are down.
+        :param osds: Osds to be killed.
+        """
+        with self.schedule.step('kill_osds', osds=osds):
+            self.for_osds(self.kill_osd, osds, test_objectstore_tool=False)
+            if self.ceph_objectstore_tool:
+                for osd in osds:
+                    self.schedule_objectstore_tool(osd, exclude=osds)
+
+    def objectstore_tool_busy(self):
+        """
+        :returns: osds with a ceph_objectstore_tool run in progress
+        """
+        return [osd for (osd, jobs) in self.objectstore_tool_jobs.iteritems()
+                if [job for job in jobs if not job.ready()]]
+
+    def schedule_objectstore_tool(self, osd, exclude=()):
+        """
+        Queue a ceph_objectstore_tool pg export/import for a dead osd
+        on the background pool, unless the run is sampled out, this
+        clean cycle's byte budget is used up, the pool is full (so
+        that the thrash loop never blocks on it) or a run already uses
+        the osd.  The osds involved are picked now so that they are
+        known to be down.
+        :param osd: Osd that was just killed.
+        :param exclude: Osds not to export from, e.g. the rest of a
+                        batch that gets runs of its own.
+        """
+        stats = self.objectstore_tool_stats
+        if self.rng.random() >= self.objectstore_tool_rate:
+            stats['sampled_out'] += 1
+            return
+        if self.objectstore_tool_budget and \
+                self.objectstore_tool_cycle_bytes >= \
+                self.objectstore_tool_budget:
+            stats['over_budget'] += 1
+            return
+        if self.objectstore_tool_pool.full():
+            stats['pool_full'] += 1
+            return
+        busy = self.objectstore_tool_busy()
+        if osd in busy:
+            stats['osd_busy'] += 1
+            return
+        exp_osd = osd
+        older = [o for o in self.dead_osds
+                 if o != osd and o not in busy and o not in exclude]
+        # If an older osd is available we'll move a pg from there
+        if older and self.rng.random() < self.chance_move_pg:
+            exp_osd = self.rng.choice(older)
+        job = self.objectstore_tool_pool.spawn(
+            self.objectstore_tool_job, osd, exp_osd)
+        for o in set([osd, exp_osd]):
+            self.objectstore_tool_jobs.setdefault(o, []).append(job)
+
+    def wait_objectstore_tool(self, osd=None):
+        """
+        Wait for the ceph_objectstore_tool runs using an osd (or all
+        of them) and raise their errors.
+        :param osd: Osd about to be revived, or None for all.
+        """
+        if osd is None:
+            osds = self.objectstore_tool_jobs.keys()
+        else:
+            osds = [osd]
+        for o in osds:
+            for job in self.objectstore_tool_jobs.pop(o, []):
+                job.get()
+
+    def objectstore_tool_job(self, osd, exp_osd):
+        """
+        Background ceph_objectstore_tool run, with accounting.
+        """
+        stats = self.objectstore_tool_stats
+        start = time.time()
+        try:
+            moved = self.test_objectstore_tool(osd, exp_osd)
+        except Exception:
+            stats['failures'] += 1
+            raise
+        finally:
+            stats['seconds'] += time.time() - start
+        stats['runs'] += 1
+        stats['bytes'] += moved
+        self.objectstore_tool_cycle_bytes += moved
+        self.log('ceph_objectstore_tool on osd.{osd} moved {bytes} bytes '
+                 'in {secs:.1f}s'.format(osd=osd, bytes=moved,
+                                         secs=time.time() - start))
+
+    def test_objectstore_tool(self, osd, exp_osd):
+        """
+        Export a pg from a dead osd, remove it and import it again,
+        either on the same osd or on another dead one.
+        :param osd: Osd that was just killed.
+        :param exp_osd: Osd to export the pg from.
+        :returns: size of the export in bytes
+        """
+        self.log("Testing ceph_objectstore_tool on down osd")
+        remote = self.ceph_manager.find_remote('osd', osd)
+        FSPATH = self.ceph_manager.get_filepath()
+        JPATH = os.path.join(FSPATH, "journal")
+        imp_osd = osd
+        exp_remote = imp_remote = remote
+        if exp_osd != osd:
+            exp_remote = self.ceph_manager.find_remote('osd', exp_osd)
+        prefix = "sudo ceph_objectstore_tool --data-path {fpath} --journal-path {jpath} ".format(fpath=FSPATH, jpath=JPATH)
+        cmd = (prefix + "--op list-pgs").format(id=exp_osd)
+        proc = exp_remote.run(args=cmd, wait=True, check_status=True, stdout=StringIO())
+        if proc.exitstatus:
+            raise Exception("ceph_objectstore_tool: exp list-pgs failure with status {ret}".format(ret=proc.exitstatus))
+        pgs = proc.stdout.getvalue().split('\n')[:-1]
+        if len(pgs) == 0:
+            self.log("No PGs found for osd.{osd}".format(osd=exp_osd))
+            return 0
+        pg = self.rng.choice(pgs)
+        exp_path = os.path.join(os.path.join(teuthology.get_testdir(self.ceph_manager.ctx), "data"), "exp.{pg}.{id}".format(pg=pg, id=exp_osd))
+        # export
+        cmd = (prefix + "--op export --pgid {pg} --file {file}").format(id=exp_osd, pg=pg, file=exp_path)
+        proc = exp_remote.run(args=cmd)
+        if proc.exitstatus:
+            raise Exception("ceph_objectstore_tool: export failure with status {ret}".format(ret=proc.exitstatus))
+        proc = exp_remote.run(args=['stat', '-c', '%s', exp_path],
+                              stdout=StringIO())
+        moved = int(proc.stdout.getvalue().strip())
+        # remove
+        cmd = (prefix + "--op remove --pgid {pg}").format(id=exp_osd, pg=pg)
+        proc = exp_remote.run(args=cmd)
+        if proc.exitstatus:
+            raise Exception("ceph_objectstore_tool: remove failure with status {ret}".format(ret=proc.exitstatus))
+        # If there are at least 2 dead osds we might move the pg
+        if exp_osd != imp_osd:
+            # If pg isn't already on this osd, then we will move it there
+            cmd = (prefix + "--op list-pgs").format(id=imp_osd)
+            proc = imp_remote.run(args=cmd, wait=True, check_status=True, stdout=StringIO())
             if proc.exitstatus:
-                raise Exception("ceph_objectstore_tool: exp list-pgs failure with status {ret}".format(ret=proc.exitstatus))
+                raise Exception("ceph_objectstore_tool: imp list-pgs failure with status {ret}".format(ret=proc.exitstatus))
             pgs = proc.stdout.getvalue().split('\n')[:-1]
-            if len(pgs) == 0:
-                self.log("No PGs found for osd.{osd}".format(osd=exp_osd))
-                return
-            pg = random.choice(pgs)
-            exp_path = os.path.join(os.path.join(teuthology.get_testdir(self.ceph_manager.ctx), "data"), "exp.{pg}.{id}".format(pg=pg, id=exp_osd))
-            # export
-            cmd = (prefix + "--op export --pgid {pg} --file {file}").format(id=exp_osd, pg=pg, file=exp_path)
-            proc = exp_remote.run(args=cmd)
-            if proc.exitstatus:
-                raise Exception("ceph_objectstore_tool: export failure with status {ret}".format(ret=proc.exitstatus))
-            # remove
-            cmd = (prefix + "--op remove --pgid {pg}").format(id=exp_osd, pg=pg)
-            proc = exp_remote.run(args=cmd)
-            if proc.exitstatus:
-                raise Exception("ceph_objectstore_tool: remove failure with status {ret}".format(ret=proc.exitstatus))
-            # If there are at least 2 dead osds we might move the pg
-            if exp_osd != imp_osd:
-                # If pg isn't already on this osd, then we will move it there
-                cmd = (prefix + "--op list-pgs").format(id=imp_osd)
-                proc = imp_remote.run(args=cmd, wait=True, check_status=True, stdout=StringIO())
-                if proc.exitstatus:
-                    raise Exception("ceph_objectstore_tool: imp list-pgs failure with status {ret}".format(ret=proc.exitstatus))
-                pgs = proc.stdout.getvalue().split('\n')[:-1]
-                if pg not in pgs:
-                    self.log("Moving pg {pg} from osd.{fosd} to osd.{tosd}".format(pg=pg, fosd=exp_osd, tosd=imp_osd))
-                    if imp_remote != exp_remote:
-                        # Copy export file to the other machine
-                        self.log("Transfer export file from {srem} to {trem}".format(srem=exp_remote, trem=imp_remote))
-                        tmpexport = Remote.get_file(exp_remote, exp_path)
-                        Remote.put_file(imp_remote, tmpexport, exp_path)
-                        os.remove(tmpexport)
-                else:
-                    # Can't move the pg after all
-                    imp_osd = exp_osd
-                    imp_remote = exp_remote
-            # import
-            cmd = (prefix + "--op import --file {file}").format(id=imp_osd, file=exp_path)
+            if pg not in pgs:
+                self.log("Moving pg {pg} from osd.{fosd} to osd.{tosd}".format(pg=pg, fosd=exp_osd, tosd=imp_osd))
+                if imp_remote != exp_remote:
+                    # Copy export file to the other machine
+                    self.log("Transfer export file from {srem} to {trem}".format(srem=exp_remote, trem=imp_remote))
+                    tmpexport = Remote.get_file(exp_remote, exp_path)
+                    Remote.put_file(imp_remote, tmpexport, exp_path)
+                    os.remove(tmpexport)
+            else:
+                # Can't move the pg after all
+                imp_osd = exp_osd
+                imp_remote = exp_remote
+        # import
+        cmd = (prefix + "--op import --file {file}").format(id=imp_osd, file=exp_path)
+        imp_remote.run(args=cmd)
+        if proc.exitstatus:
+            raise Exception("ceph_objectstore_tool: import failure with status {ret}".format(ret=proc.exitstatus))
+        cmd = "rm -f {file}".format(file=exp_path)
+        exp_remote.run(args=cmd)
+        if imp_remote != exp_remote:
             imp_remote.run(args=cmd)
-            if proc.exitstatus:
-                raise Exception("ceph_objectstore_tool: import failure with status {ret}".format(ret=proc.exitstatus))
-            cmd = "rm -f {file}".format(file=exp_path)
-            exp_remote.run(args=cmd)
-            if imp_remote != exp_remote:
-                imp_remote.run(args=cmd)
-
+        return moved
 
     def blackhole_kill_osd(self, osd=None):
         """
@@ -188,7 +366,7 @@ class Thrasher:
         :param osd: Osd to be killed.
         """
         if osd is None:
-            osd = random.choice(self.live_osds)
+            osd = self.rng.choice(self.live_osds)
         self.log("Blackholing and then killing osd %s, live_osds are %s" % (str(osd), str(self.live_osds)))
         self.live_osds.remove(osd)
         self.dead_osds.append(osd)
@@ -200,11 +378,14 @@ class Thrasher:
         :param osd: Osd to be revived.
         """
         if osd is None:
-            osd = random.choice(self.dead_osds)
-        self.log("Reviving osd %s" % (str(osd),))
-        self.live_osds.append(osd)
-        self.dead_osds.remove(osd)
-        self.ceph_manager.revive_osd(osd, self.revive_timeout)
+            osd = self.rng.choice(self.dead_osds)
+        with self.schedule.step('revive_osd', osd=osd):
+            self.wait_objectstore_tool(osd)
+            self.log("Reviving osd %s" % (str(osd),))
+            self.live_osds.append(osd)
+            self.dead_osds.remove(osd)
+            with self.timeline.action('revive_osd', [osd]):
+                self.ceph_manager.revive_osd(osd, self.revive_timeout)
 
     def out_osd(self, osd=None):
         """
@@ -212,11 +393,13 @@ class Thrasher:
         :param osd: Osd to be marked.
         """
         if osd is None:
-            osd = random.choice(self.in_osds)
-        self.log("Removing osd %s, in_osds are: %s" % (str(osd), str(self.in_osds)))
-        self.ceph_manager.mark_out_osd(osd)
-        self.in_osds.remove(osd)
-        self.out_osds.append(osd)
+            osd = self.rng.choice(self.in_osds)
+        with self.schedule.step('out_osd', osd=osd):
+            self.log("Removing osd %s, in_osds are: %s" % (str(osd), str(self.in_osds)))
+            with self.timeline.action('out_osd', [osd]):
+                self.ceph_manager.mark_out_osd(osd)
+            self.in_osds.remove(osd)
+            self.out_osds.append(osd)
 
     def in_osd(self, osd=None):
         """
@@ -224,37 +407,105 @@ class Thrasher:
         :param osd: Osd to be marked.
         """
         if osd is None:
-            osd = random.choice(self.out_osds)
+            osd = self.rng.choice(self.out_osds)
         if osd in self.dead_osds:
             return self.revive_osd(osd)
-        self.log("Adding osd %s" % (str(osd),))
-        self.out_osds.remove(osd)
-        self.in_osds.append(osd)
-        self.ceph_manager.mark_in_osd(osd)
-        self.log("Added osd %s"%(str(osd),))
+        with self.schedule.step('in_osd', osd=osd):
+            self.log("Adding osd %s" % (str(osd),))
+            self.out_osds.remove(osd)
+            self.in_osds.append(osd)
+            with self.timeline.action('in_osd', [osd]):
+                self.ceph_manager.mark_in_osd(osd)
+            self.log("Added osd %s"%(str(osd),))
 
-    def reweight_osd(self, osd=None):
+    def reweight_osd(self, osd=None, weight=None):
         """
         Reweight an osd that is in
         :param osd: Osd to be marked.
+        :param weight: New weight, random if None.
         """
         if osd is None:
-            osd = random.choice(self.in_osds)
-        val = random.uniform(.1, 1.0)
-        self.log("Reweighting osd %s to %s" % (str(osd), str(val)))
-        self.ceph_manager.raw_cluster_cmd('osd', 'reweight', str(osd), str(val))
-
-    def primary_affinity(self, osd=None):
+            osd = self.rng.choice(self.in_osds)
+        val = weight
+        if val is None:
+            val = self.rng.uniform(.1, 1.0)
+        with self.schedule.step('reweight_osd', osd=osd, weight=val):
+            self.log("Reweighting osd %s to %s" % (str(osd), str(val)))
+            with self.timeline.action('reweight_osd', [osd]):
+                self.ceph_manager.raw_cluster_cmd('osd', 'reweight', str(osd), str(val))
+
+    def primary_affinity(self, osd=None, affinity=None):
         if osd is None:
-            osd = random.choice(self.in_osds)
-        if random.random() >= .5:
-            pa = random.random()
-        elif random.random() >= .5:
-            pa = 1
-        else:
-            pa = 0
-        self.log('Setting osd %s primary_affinity to %f' % (str(osd), pa))
-        self.ceph_manager.raw_cluster_cmd('osd', 'primary-affinity', str(osd), str(pa))
+            osd = self.rng.choice(self.in_osds)
+        pa = affinity
+        if pa is None:
+            if self.rng.random() >= .5:
+                pa = self.rng.random()
+            elif self.rng.random() >= .5:
+                pa = 1
+            else:
+                pa = 0
+        with self.schedule.step('primary_affinity', osd=osd, affinity=pa):
+            self.log('Setting osd %s primary_affinity to %f' % (str(osd), pa))
+            with self.timeline.action('primary_affinity', [osd]):
+                self.ceph_manager.raw_cluster_cmd('osd', 'primary-affinity', str(osd), str(pa))
+
+    def for_osds(self, action, osds, **kwargs):
+        """
+        Run action on each of osds in parallel greenlets.
+        """
+        with parallel() as p:
+            for osd in osds:
+                p.spawn(action, osd, **kwargs)
+
+    def osd_batch(self, action, osds):
+        """
+        Apply a single osd action to several osds in parallel.
+        :param action: name of the action, e.g. 'revive_osd'
+        :param osds: Osds to apply it to.
+        """
+        with self.schedule.step('osd_batch', action=action, osds=osds):
+            self.for_osds(getattr(self, action), osds)
+
+    def osd_action(self, action, candidates, limit, batch_action=None,
+                   failure=False):
+        """
+        With max_concurrent_actions > 1, wrap a single osd action so
+        that it is applied to a random batch of candidates at once.
+
+        :param action: single osd action, e.g. self.out_osd
+        :param candidates: osds the action may be applied to
+        :param limit: most osds the action may be applied to without
+                      breaking the min_* settings
+        :param batch_action: callable taking a list of osds, if
+                             running action in parallel is not enough
+        :param failure: whether each osd of the batch counts against
+                        failures_per_minute
+        :returns: the callable to schedule
+        """
+        if self.max_concurrent_actions <= 1:
+            return action
+        def run_batch():
+            """
+            Apply action to a batch of osds.
+            """
+            most = min(self.max_concurrent_actions, limit)
+            if failure:
+                # the policy charged the first osd when choosing
+                spare = self.policy.spare_failures()
+                if spare is not None:
+                    most = min(most, 1 + spare)
+            count = self.rng.randint(1, most)
+            if failure:
+                self.policy.charge_failures(count - 1)
+            osds = self.rng.sample(candidates, count)
+            self.log('{action} on osds {osds}'.format(
+                action=action.__name__, osds=osds))
+            if batch_action is not None:
+                batch_action(osds)
+            else:
+                self.osd_batch(action.__name__, osds)
+        return run_batch
 
     def all_up(self):
         """
@@ -263,9 +514,45 @@ class Thrasher:
         while len(self.dead_osds) > 0:
             self.log("reviving osd")
             self.revive_osd()
-        while len(self.out_osds) > 0:
-            self.log("inning osd")
-            self.in_osd()
+        if self.out_osds:
+            self.in_osds_batch(list(self.out_osds))
+
+    def in_osds_batch(self, osds):
+        """
+        Mark several live osds in with one command.
+        :param osds: Osds to be marked.
+        """
+        with self.schedule.step('in_osds_batch', osds=osds):
+            self.log("inning osds %s" % (str(osds),))
+            with self.timeline.action('in_osd', osds):
+                self.ceph_manager.apply_osd_changes(
+                    [('in', osd) for osd in osds])
+            for osd in osds:
+                self.out_osds.remove(osd)
+                self.in_osds.append(osd)
+
+    def reset_weights(self):
+        """
+        Set the weight of every osd that is in back to 1.
+        """
+        with self.schedule.step('reset_weights'):
+            self.ceph_manager.apply_osd_changes(
+                [('reweight', osd, 1) for osd in self.in_osds])
+
+    def pause(self, seconds):
+        """
+        Sleep as part of a test sequence; replayed, unlike op_delay.
+        """
+        with self.schedule.step('pause', seconds=seconds):
+            time.sleep(seconds)
+
+    def scrub(self):
+        """
+        Run a Scrubber while thrashing.
+        """
+        with self.schedule.step('scrub'):
+            self.log('Scrubbing while thrashing being performed')
+            Scrubber(self.ceph_manager, self.config)
 
     def do_join(self):
         """
@@ -274,21 +561,26 @@ class Thrasher:
         self.stopping = True
         self.thread.get()
 
-    def grow_pool(self):
+    def grow_pool(self, pool=None):
         """
         Increase the size of the pool
         """
-        pool = self.ceph_manager.get_pool()
-        self.log("Growing pool %s"%(pool,))
-        self.ceph_manager.expand_pool(pool, self.config.get('pool_grow_by', 10), self.max_pgs)
+        if pool is None:
+            pool = self.ceph_manager.get_pool()
+        with self.schedule.step('grow_pool', pool=pool):
+            self.log("Growing pool %s"%(pool,))
+            with self.timeline.action('grow_pool'):
+                self.ceph_manager.expand_pool(pool, self.config.get('pool_grow_by', 10), self.max_pgs)
 
-    def fix_pgp_num(self):
+    def fix_pgp_num(self, pool=None):
         """
         Fix number of pgs in pool.
         """
-        pool = self.ceph_manager.get_pool()
-        self.log("fixing pg num pool %s"%(pool,))
-        self.ceph_manager.set_pool_pgpnum(pool)
+        if pool is None:
+            pool = self.ceph_manager.get_pool()
+        with self.schedule.step('fix_pgp_num', pool=pool):
+            self.log("fixing pg num pool %s"%(pool,))
+            self.ceph_manager.set_pool_pgpnum(pool)
 
     def test_pool_min_size(self):
         """
@@ -296,15 +588,13 @@ class Thrasher:
         """
         self.log("test_pool_min_size")
         self.all_up()
-        self.ceph_manager.wait_for_recovery(
-            timeout=self.config.get('timeout')
-            )
-        the_one = random.choice(self.in_osds)
+        self.wait_for_recovery()
+        the_one = self.rng.choice(self.in_osds)
         self.log("Killing everyone but %s", the_one)
         to_kill = filter(lambda x: x != the_one, self.in_osds)
         [self.kill_osd(i) for i in to_kill]
         [self.out_osd(i) for i in to_kill]
-        time.sleep(self.config.get("test_pool_min_size_time", 10))
+        self.pause(self.config.get("test_pool_min_size_time", 10))
         self.log("Killing %s" % (the_one,))
         self.kill_osd(the_one)
         self.out_osd(the_one)
@@ -313,37 +603,40 @@ class Thrasher:
         [self.in_osd(i) for i in to_kill]
         self.log("Revived everyone but %s" % (the_one,))
         self.log("Waiting for clean")
-        self.ceph_manager.wait_for_recovery(
-            timeout=self.config.get('timeout')
-            )
+        self.wait_for_recovery()
 
-    def inject_pause(self, conf_key, duration, check_after, should_be_down):
+    def inject_pause(self, conf_key, duration, check_after, should_be_down,
+                     osd=None):
         """
         Pause injection testing. Check for osd being down when finished.
         """
-        the_one = random.choice(self.live_osds)
-        self.log("inject_pause on {osd}".format(osd = the_one))
-        self.log(
-            "Testing {key} pause injection for duration {duration}".format(
-                key = conf_key,
-                duration = duration
-                ))
-        self.log(
-            "Checking after {after}, should_be_down={shouldbedown}".format(
-                after = check_after,
-                shouldbedown = should_be_down
-                ))
-        self.ceph_manager.set_config(the_one, **{conf_key:duration})
-        if not should_be_down:
-            return
-        time.sleep(check_after)
-        status = self.ceph_manager.get_osd_status()
-        assert the_one in status['down']
-        time.sleep(duration - check_after + 20)
-        status = self.ceph_manager.get_osd_status()
-        assert not the_one in status['down']
+        the_one = osd
+        if the_one is None:
+            the_one = self.rng.choice(self.live_osds)
+        with self.schedule.step('inject_pause', conf_key=conf_key,
+                                duration=duration, check_after=check_after,
+                                should_be_down=should_be_down, osd=the_one), \
+                self.timeline.action('inject_pause', [the_one]):
+            self.log("inject_pause on {osd}".format(osd = the_one))
+            self.log(
+                "Testing {key} pause injection for duration {duration}".format(
+                    key = conf_key,
+                    duration = duration
+                    ))
+            self.log(
+                "Checking after {after}, should_be_down={shouldbedown}".format(
+                    after = check_after,
+                    shouldbedown = should_be_down
+                    ))
+            self.ceph_manager.set_config(the_one, **{conf_key:duration})
+            if not should_be_down:
+                return
+            time.sleep(check_after)
+            assert not self.ceph_manager.get_osd_state_table().is_up(the_one)
+            time.sleep(duration - check_after + 20)
+            assert self.ceph_manager.get_osd_state_table().is_up(the_one)
 
-    def test_backfill_full(self):
+    def test_backfill_full(self, skip_check=None):
         """
         Test backfills stopping when the replica fills up.
 
@@ -356,12 +649,25 @@ class Thrasher:
 
         Then, verify that all backfills stop.
         """
+        if skip_check is None:
+            skip_check = {'false': [], 'true': []}
+            for i in self.live_osds:
+                skip_check[self.rng.choice(['false', 'true'])].append(i)
+        with self.schedule.step('test_backfill_full', skip_check=skip_check):
+            self.backfill_full(skip_check)
+
+    def backfill_full(self, skip_check):
+        """
+        Body of test_backfill_full.
+        :param skip_check: 'true'/'false' -> osds to set
+                           osd_debug_skip_full_check_in_backfill_reservation
+                           on
+        """
         self.log("injecting osd_backfill_full_ratio = 0")
-        for i in self.live_osds:
-            self.ceph_manager.set_config(
-                i,
-                osd_debug_skip_full_check_in_backfill_reservation = random.choice(
-                    ['false', 'true']),
+        for (skip, osds) in skip_check.iteritems():
+            self.ceph_manager.set_config_many(
+                osds,
+                osd_debug_skip_full_check_in_backfill_reservation = skip,
                 osd_backfill_full_ratio = 0)
         for i in range(30):
             status = self.ceph_manager.compile_pg_status()
@@ -372,12 +678,10 @@ class Thrasher:
                     still_going=status.get('backfill')))
             time.sleep(1)
         assert('backfill' not in self.ceph_manager.compile_pg_status().keys())
-        for i in self.live_osds:
-            self.ceph_manager.set_config(
-                i,
-                osd_debug_skip_full_check_in_backfill_reservation = \
-                    'false',
-                osd_backfill_full_ratio = 0.85)
+        self.ceph_manager.set_config_many(
+            self.live_osds,
+            osd_debug_skip_full_check_in_backfill_reservation = 'false',
+            osd_backfill_full_ratio = 0.85)
 
     def test_map_discontinuity(self):
         """
@@ -389,119 +693,661 @@ class Thrasher:
         This sequence should cause the revived osd to have to handle
         a map gap since the mons would have trimmed
         """
-        while len(self.in_osds) < (self.minin + 1):
-            self.in_osd()
-        self.log("Waiting for recovery")
-        self.ceph_manager.wait_for_all_up(
-            timeout=self.config.get('timeout')
-            )
-        # now we wait 20s for the pg status to change, if it takes longer,
-        # the test *should* fail!
-        time.sleep(20)
-        self.ceph_manager.wait_for_clean(
-            timeout=self.config.get('timeout')
-            )
+        with self.timeline.action('test_map_discontinuity'):
+            while len(self.in_osds) < (self.minin + 1):
+                self.in_osd()
+            self.log("Waiting for recovery")
+            self.wait_for_all_up()
+            # now we wait 20s for the pg status to change, if it takes longer,
+            # the test *should* fail!
+            self.pause(20)
+            self.wait_for_clean()
+
+            # now we wait 20s for the backfill replicas to hear about the clean
+            self.pause(20)
+            self.log("Recovered, killing an osd")
+            self.kill_osd(mark_down=True, mark_out=True)
+            self.log("Waiting for clean again")
+            self.wait_for_clean()
+            self.log("Waiting for trim")
+            self.pause(int(self.config.get("map_discontinuity_sleep_time", 40)))
+            self.revive_osd()
 
-        # now we wait 20s for the backfill replicas to hear about the clean
-        time.sleep(20)
-        self.log("Recovered, killing an osd")
-        self.kill_osd(mark_down=True, mark_out=True)
-        self.log("Waiting for clean again")
-        self.ceph_manager.wait_for_clean(
-            timeout=self.config.get('timeout')
-            )
-        self.log("Waiting for trim")
-        time.sleep(int(self.config.get("map_discontinuity_sleep_time", 40)))
-        self.revive_osd()
+    def wait_for_recovery(self):
+        """
+        Wait for recovery; the actions since the last wait are recorded
+        as recovered from.
+        """
+        with self.schedule.step('wait_for_recovery'):
+            self.ceph_manager.wait_for_recovery(
+                timeout=self.config.get('timeout')
+                )
+        self.timeline.recovered('recovery')
 
-    def choose_action(self):
+    def wait_for_clean(self):
         """
-        Random action selector.
+        Wait for clean; the actions since the last wait are recorded as
+        recovered from.
+        """
+        with self.schedule.step('wait_for_clean'):
+            self.ceph_manager.wait_for_clean(
+                timeout=self.config.get('timeout')
+                )
+        self.timeline.recovered('clean')
+
+    def wait_for_all_up(self):
+        """
+        Wait for all osds to be up.
+        """
+        with self.schedule.step('wait_for_all_up'):
+            self.ceph_manager.wait_for_all_up(
+                timeout=self.config.get('timeout')
+                )
+
+    def register_actions(self):
+        """
+        Register the built-in thrash actions with the policy, then the
+        actions of the plugins listed in the 'plugins' option.
         """
         chance_down = self.config.get('chance_down', 0.4)
-        chance_test_min_size = self.config.get('chance_test_min_size', 0)
-        chance_test_backfill_full = self.config.get('chance_test_backfill_full', 0)
         if isinstance(chance_down, int):
             chance_down = float(chance_down) / 100
         minin = self.minin
         minout = self.config.get("min_out", 0)
         minlive = self.config.get("min_live", 2)
         mindead = self.config.get("min_dead", 0)
-
-        self.log('choose_action: min_in %d min_out %d min_live %d min_dead %d' %
+        self.log('thrash policy: min_in %d min_out %d min_live %d min_dead %d' %
                  (minin, minout, minlive, mindead))
-        actions = []
-        if len(self.in_osds) > minin:
-            actions.append((self.out_osd, 1.0,))
-        if len(self.live_osds) > minlive and chance_down > 0:
-            actions.append((self.kill_osd, chance_down,))
-        if len(self.out_osds) > minout:
-            actions.append((self.in_osd, 1.7,))
-        if len(self.dead_osds) > mindead:
-            actions.append((self.revive_osd, 1.0,))
+
+        policy = self.policy
+        policy.register(
+            'out_osd',
+            lambda: self.osd_action(
+                self.out_osd, list(self.in_osds),
+                len(self.in_osds) - minin, failure=True)(),
+            1.0,
+            available=lambda: len(self.in_osds) > minin,
+            failure=True)
+        policy.register(
+            'kill_osd',
+            lambda: self.osd_action(
+                self.kill_osd, list(self.live_osds),
+                len(self.live_osds) - minlive, self.kill_osds,
+                failure=True)(),
+            chance_down,
+            available=lambda: len(self.live_osds) > minlive,
+            failure=True)
+        policy.register(
+            'in_osd',
+            lambda: self.osd_action(
+                self.in_osd, list(self.out_osds),
+                len(self.out_osds) - minout)(),
+            1.7,
+            available=lambda: len(self.out_osds) > minout)
+        policy.register(
+            'revive_osd',
+            lambda: self.osd_action(
+                self.revive_osd, list(self.dead_osds),
+                len(self.dead_osds) - mindead)(),
+            1.0,
+            available=lambda: len(self.dead_osds) > mindead)
         if self.config.get('thrash_primary_affinity', True):
-            actions.append((self.primary_affinity, 1.0,))
-        actions.append((self.reweight_osd, self.config.get('reweight_osd',.5),))
-        actions.append((self.grow_pool, self.config.get('chance_pgnum_grow', 0),))
-        actions.append((self.fix_pgp_num, self.config.get('chance_pgpnum_fix', 0),))
-        actions.append((self.test_pool_min_size, chance_test_min_size,))
-        actions.append((self.test_backfill_full, chance_test_backfill_full,))
+            policy.register('primary_affinity', self.primary_affinity, 1.0)
+        policy.register('reweight_osd', self.reweight_osd,
+                        self.config.get('reweight_osd', .5))
+        policy.register('grow_pool', self.grow_pool,
+                        self.config.get('chance_pgnum_grow', 0))
+        policy.register('fix_pgp_num', self.fix_pgp_num,
+                        self.config.get('chance_pgpnum_fix', 0))
+        policy.register('test_pool_min_size', self.test_pool_min_size,
+                        self.config.get('chance_test_min_size', 0))
+        policy.register('test_backfill_full', self.test_backfill_full,
+                        self.config.get('chance_test_backfill_full', 0))
         for key in ['heartbeat_inject_failure', 'filestore_inject_stall']:
-            for scenario in [
-                (lambda: self.inject_pause(key,
-                                           self.config.get('pause_short', 3),
-                                           0,
-                                           False),
-                 self.config.get('chance_inject_pause_short', 1),),
-                (lambda: self.inject_pause(key,
-                                           self.config.get('pause_long', 80),
-                                           self.config.get('pause_check_after', 70),
-                                           True),
-                 self.config.get('chance_inject_pause_long', 0),)]:
-                actions.append(scenario)
-
-        total = sum([y for (x, y) in actions])
-        val = random.uniform(0, total)
-        for (action, prob) in actions:
-            if val < prob:
-                return action
-            val -= prob
-        return None
+            policy.register(
+                'inject_pause_short_' + key,
+                functools.partial(self.inject_pause, key,
+                                  self.config.get('pause_short', 3), 0, False),
+                self.config.get('chance_inject_pause_short', 1))
+            policy.register(
+                'inject_pause_long_' + key,
+                functools.partial(self.inject_pause, key,
+                                  self.config.get('pause_long', 80),
+                                  self.config.get('pause_check_after', 70),
+                                  True),
+                self.config.get('chance_inject_pause_long', 0))
+        policy.load_plugins(self, self.config.get('plugins', []))
+
+    def choose_action(self):
+        """
+        Random action selector.
+        :returns: the chosen ThrashAction, or None if none is available
+        """
+        return self.policy.choose()
+
+    def plugin_action(self, name):
+        """
+        Run the plugin action registered as name, recorded by name so
+        that a replay runs it again.
+        """
+        action = self.policy.find(name)
+        assert action is not None, \
+            'thrash plugin action {name} is not loaded'.format(name=name)
+        with self.schedule.step('plugin_action', name=name):
+            action()
+
+    # Thrasher methods a replayed schedule may call
+    REPLAY_ACTIONS = [
+        'kill_osd', 'kill_osds', 'revive_osd', 'out_osd', 'in_osd',
+        'in_osds_batch', 'osd_batch', 'reweight_osd', 'primary_affinity',
+        'reset_weights', 'grow_pool', 'fix_pgp_num', 'inject_pause',
+        'test_backfill_full', 'pause', 'scrub', 'wait_for_recovery',
+        'wait_for_clean', 'wait_for_all_up', 'plugin_action',
+        ]
+
+    def do_replay(self, steps):
+        """
+        Re-execute a recorded schedule back to back, without the
+        op_delay gaps of the original run.
+        """
+        self.log("replaying {n} thrash steps".format(n=len(steps)))
+        for step in steps:
+            if self.stopping:
+                break
+            action = step['action']
+            assert action in self.REPLAY_ACTIONS, \
+                'cannot replay thrash action {a}'.format(a=action)
+            args = dict([(str(k), v)
+                         for (k, v) in step.get('args', {}).iteritems()])
+            self.log("replaying step at {t}s: {a} {args}".format(
+                    t=step.get('t'), a=action, args=args))
+            getattr(self, action)(**args)
+        self.all_up()
+        self.wait_objectstore_tool()
+        self.report()
 
     def do_thrash(self):
         """
         Loop to select random actions to thrash ceph manager with.
         """
+        if self.config.get('replay'):
+            return self.do_replay(load_schedule(self.config['replay']))
         cleanint = self.config.get("clean_interval", 60)
         scrubint = self.config.get("scrub_interval", -1)
         maxdead = self.config.get("max_dead", 0)
-        delay = self.config.get("op_delay", 5)
+        delay = self.policy.interval()
         self.log("starting do_thrash")
         while not self.stopping:
             self.log(" ".join([str(x) for x in ["in_osds: ", self.in_osds, " out_osds: ", self.out_osds,
                                                 "dead_osds: ", self.dead_osds, "live_osds: ",
                                                 self.live_osds]]))
-            if random.uniform(0, 1) < (float(delay) / cleanint):
+            if self.rng.uniform(0, 1) < (float(delay) / cleanint):
+                self.objectstore_tool_cycle_bytes = 0
                 while len(self.dead_osds) > maxdead:
-                    self.revive_osd()
-                for osd in self.in_osds:
-                    self.ceph_manager.raw_cluster_cmd('osd', 'reweight',
-                                                      str(osd), str(1))
-                if random.uniform(0, 1) < float(
+                    count = min(self.max_concurrent_actions,
+                                len(self.dead_osds) - maxdead)
+                    self.osd_batch('revive_osd',
+                                   self.rng.sample(self.dead_osds, count))
+                self.reset_weights()
+                if self.rng.uniform(0, 1) < float(
                     self.config.get('chance_test_map_discontinuity', 0)):
                     self.test_map_discontinuity()
                 else:
-                    self.ceph_manager.wait_for_recovery(
-                        timeout=self.config.get('timeout')
-                        )
-                time.sleep(self.clean_wait)
+                    self.wait_for_recovery()
+                if self.clean_wait:
+                    self.pause(self.clean_wait)
                 if scrubint > 0:
-                    if random.uniform(0, 1) < (float(delay) / scrubint):
-                        self.log('Scrubbing while thrashing being performed')
-                        Scrubber(self.ceph_manager, self.config)
-            self.choose_action()()
-            time.sleep(delay)
+                    if self.rng.uniform(0, 1) < (float(delay) / scrubint):
+                        self.scrub()
+            action = self.choose_action()
+            self.policy.started()
+            if action is not None:
+                self.log('thrash action: {name}'.format(name=action.name))
+                if action.plugin is not None:
+                    self.plugin_action(action.name)
+                else:
+                    action()
+            time.sleep(self.policy.delay())
         self.all_up()
+        self.wait_objectstore_tool()
+        self.report()
+
+    def report(self):
+        """
+        Store the objectstore tool stats and the action timeline summary
+        in ctx.summary, and the timeline and schedule in the archive.
+        """
+        ctx = self.ceph_manager.ctx
+        summary = getattr(ctx, 'summary', None)
+        if self.ceph_objectstore_tool:
+            self.log('ceph_objectstore_tool: {stats}'.format(
+                    stats=self.objectstore_tool_stats))
+            if summary is not None:
+                summary['objectstore_tool'] = dict(
+                    self.objectstore_tool_stats)
+        if summary is not None:
+            summary['thrash_actions'] = self.timeline.summary()
+            if self.ceph_manager.power is not None:
+                summary['powercycle'] = dict(self.ceph_manager.power.stats)
+        if getattr(ctx, 'archive', None) is not None:
+            self.timeline.write(
+                os.path.join(ctx.archive, 'thrash_timeline.jsonl'))
+            self.schedule.write(
+                os.path.join(ctx.archive, 'thrash_schedule.jsonl'))
+
+class PGStateSummary:
+    """
+    Counts of pg states built in a single pass over a pg dump.
+
+    Each distinct state string is parsed once into a bitmask; the
+    get_num_* family of CephManager is answered from the per-mask
+    counts instead of rescanning the pg list.
+    """
+    ACTIVE = 1 << 0
+    CLEAN = 1 << 1
+    STALE = 1 << 2
+    RECOVER = 1 << 3
+    BACKFILL = 1 << 4
+    DOWN = 1 << 5
+    INCOMPLETE = 1 << 6
+    CREATING = 1 << 7
+
+    # substring matched against each '+' separated state component
+    STATE_BITS = [
+        ('active', ACTIVE),
+        ('clean', CLEAN),
+        ('stale', STALE),
+        ('recover', RECOVER),
+        ('backfill', BACKFILL),
+        ('down', DOWN),
+        ('incomplete', INCOMPLETE),
+        ('creating', CREATING),
+        ]
+
+    _masks = {}
+
+    @classmethod
+    def parse_state(cls, state):
+        """
+        :param state: pg state string, e.g. 'active+recovery_wait'
+        :returns: bitmask of the states we count on
+        """
+        mask = cls._masks.get(state)
+        if mask is None:
+            mask = 0
+            for part in state.split('+'):
+                for name, bit in cls.STATE_BITS:
+                    if name in part:
+                        mask |= bit
+            cls._masks[state] = mask
+        return mask
+
+    def __init__(self, pg_stats):
+        self.by_mask = {}
+        for pg in pg_stats:
+            mask = self.parse_state(pg['state'])
+            self.by_mask[mask] = self.by_mask.get(mask, 0) + 1
+        self.num_pgs = sum(self.by_mask.itervalues())
+        self.num_active_clean = self.count(
+            lambda m: m & self.ACTIVE and m & self.CLEAN and
+            not m & self.STALE)
+        self.num_active_recovered = self.count(
+            lambda m: m & self.ACTIVE and
+            not m & (self.RECOVER | self.BACKFILL | self.STALE))
+        self.num_active = self.count(
+            lambda m: m & self.ACTIVE and not m & self.STALE)
+        self.num_down = self.count(
+            lambda m: m & (self.DOWN | self.INCOMPLETE) and
+            not m & self.STALE)
+        self.num_active_down = self.count(
+            lambda m: m & (self.ACTIVE | self.DOWN | self.INCOMPLETE) and
+            not m & self.STALE)
+        self.num_creating = self.count(lambda m: m & self.CREATING)
+
+    def count(self, pred):
+        """
+        :returns: number of pgs whose state mask satisfies pred
+        """
+        return sum([n for (m, n) in self.by_mask.iteritems() if pred(m)])
+
+    def is_clean(self):
+        """
+        True if all pgs are clean
+        """
+        return self.num_active_clean == self.num_pgs
+
+    def is_recovered(self):
+        """
+        True if all pgs have recovered
+        """
+        return self.num_active_recovered == self.num_pgs
+
+    def is_active(self):
+        """
+        True if all pgs are active
+        """
+        return self.num_active == self.num_pgs
+
+    def is_active_or_down(self):
+        """
+        True if all pgs are active or down
+        """
+        return self.num_active_down == self.num_pgs
+
+
+class OSDStateTable:
+    """
+    Per-osd state bits, weight and primary affinity from one osd dump.
+
+    Rows are indexed by osd id.  EXISTS, UP and IN come from the osdmap,
+    ALIVE from whether the teuthology daemon is running.
+    """
+    EXISTS = 1 << 0
+    UP = 1 << 1
+    IN = 1 << 2
+    ALIVE = 1 << 3
+
+    def __init__(self, osds, live=()):
+        """
+        :param osds: the 'osds' list of an osd dump
+        :param live: ids of the osds whose daemon is running
+        """
+        size = 0
+        if osds:
+            size = max([int(o['osd']) for o in osds]) + 1
+        size = max([size] + [int(i) + 1 for i in live])
+        self.bits = array('B', [0] * size)
+        self.weights = array('d', [0.0] * size)
+        self.affinities = array('d', [0.0] * size)
+        for o in osds:
+            i = int(o['osd'])
+            bits = self.EXISTS
+            if o['up']:
+                bits |= self.UP
+            if o['in']:
+                bits |= self.IN
+            self.bits[i] = bits
+            self.weights[i] = float(o.get('weight', 0))
+            self.affinities[i] = float(o.get('primary_affinity', 1))
+        for i in live:
+            self.bits[int(i)] |= self.ALIVE
+
+    def __len__(self):
+        return len(self.bits)
+
+    def has(self, osd, bit):
+        """
+        True if osd has all of the given state bits set.
+        """
+        osd = int(osd)
+        return 0 <= osd < len(self.bits) and self.bits[osd] & bit == bit
+
+    def is_up(self, osd):
+        """
+        True if the osdmap marks osd up.
+        """
+        return self.has(osd, self.UP)
+
+    def is_in(self, osd):
+        """
+        True if the osdmap marks osd in.
+        """
+        return self.has(osd, self.IN)
+
+    def is_alive(self, osd):
+        """
+        True if the osd's daemon is running.
+        """
+        return self.has(osd, self.ALIVE)
+
+    def select(self, set_bits=0, clear_bits=0):
+        """
+        :returns: set of ids of existing osds with every bit of set_bits
+                  set and every bit of clear_bits clear.
+        """
+        want = set_bits
+        mask = set_bits | clear_bits
+        return set([i for (i, b) in enumerate(self.bits)
+                    if b & self.EXISTS and b & mask == want])
+
+    def weight(self, osd):
+        """
+        :returns: the reweight value of osd
+        """
+        return self.weights[int(osd)]
+
+    def primary_affinity(self, osd):
+        """
+        :returns: the primary affinity of osd
+        """
+        return self.affinities[int(osd)]
+
+    def status(self):
+        """
+        :returns: osd ids grouped as returned by CephManager.get_osd_status
+        """
+        in_osds, out_osds, up_osds, down_osds = [], [], [], []
+        dead_osds, live_osds = [], []
+        for (i, b) in enumerate(self.bits):
+            if b & self.EXISTS:
+                (in_osds if b & self.IN else out_osds).append(i)
+                (up_osds if b & self.UP else down_osds).append(i)
+            if b & self.ALIVE:
+                live_osds.append(i)
+            elif b & self.EXISTS:
+                dead_osds.append(i)
+        return {'in': in_osds, 'out': out_osds, 'up': up_osds,
+                'down': down_osds, 'dead': dead_osds, 'live': live_osds}
+
+
+class ClusterStateCache:
+    """
+    Snapshot cache for the cluster status, pg stats and osdmap.
+
+    The status is reused for ``validity`` seconds.  Once it expires a
+    fresh status is fetched and the pg/osd dumps are only refetched if
+    the pgmap version or osdmap epoch it reports has moved past the one
+    of the cached dump.  Any other command issued through the manager
+    calls invalidate(), so a change made by the caller is never hidden
+    by the validity window.
+    """
+    def __init__(self, manager, validity=1.0):
+        self.manager = manager
+        self.validity = validity
+        self.lock = threading.RLock()
+        self.status_stamp = 0
+        self.status = None
+        self.pg_stats = None
+        self.pg_version = None
+        self.pg_summary = None
+        self.pg_index = None
+        self.osd_dump = None
+        self.pool_ids = None
+
+    def invalidate(self):
+        """
+        Force the next query to recheck the cluster epochs.
+        """
+        self.status_stamp = 0
+
+    def _fetch_dump(self, *args):
+        """
+        Fetch and parse a dump without invalidating the cache.
+        """
+        return json_loads_dump(self.manager.cluster_cmd_output(*args))
+
+    def get_status(self):
+        """
+        :returns: the cluster status, refreshed if older than validity.
+        """
+        with self.lock:
+            if self.status is None or \
+                    time.time() - self.status_stamp > self.validity:
+                out = self.manager.cluster_cmd_output(
+                    'status', '--format=json')
+                self.status = json.loads(out)
+                self.status_stamp = time.time()
+            return self.status
+
+    def get_pg_stats(self):
+        """
+        :returns: the pg stats for the current pgmap version, trimmed to
+                  PG_STAT_FIELDS.
+        """
+        with self.lock:
+            version = self.get_status()['pgmap'].get('version')
+            if self.pg_stats is None or version is None or \
+                    self.pg_version < version:
+                self.pg_stats = list(
+                    self.manager.iter_pg_stats(fields=PG_STAT_FIELDS))
+                # the stream is at least as new as the status it follows
+                self.pg_version = version
+                self.pg_summary = None
+                self.pg_index = None
+            return self.pg_stats
+
+    def get_pg_index(self):
+        """
+        :returns: dict of pgid -> pg stats for the current pg stats.
+        """
+        with self.lock:
+            pg_stats = self.get_pg_stats()
+            if self.pg_index is None:
+                self.pg_index = dict([(pg['pgid'], pg) for pg in pg_stats])
+            return self.pg_index
+
+    def get_pg_summary(self):
+        """
+        :returns: PGStateSummary of the current pg stats.
+        """
+        with self.lock:
+            pg_stats = self.get_pg_stats()
+            if self.pg_summary is None:
+                self.pg_summary = PGStateSummary(pg_stats)
+            return self.pg_summary
+
+    def get_osd_dump(self):
+        """
+        :returns: the osd dump for the current osdmap epoch.
+        """
+        with self.lock:
+            epoch = self.get_status()['osdmap']['osdmap']['epoch']
+            if self.osd_dump is None or self.osd_dump['epoch'] < epoch:
+                self.osd_dump = self._fetch_dump('osd', 'dump', '--format=json')
+                self.pool_ids = None
+            return self.osd_dump
+
+    def get_pool_ids(self):
+        """
+        :returns: dict of pool name -> pool id for the current osdmap.
+        """
+        with self.lock:
+            osd_dump = self.get_osd_dump()
+            if self.pool_ids is None:
+                self.pool_ids = dict(
+                    [(str(i['pool_name']), int(i['pool']))
+                     for i in osd_dump['pools']])
+            return self.pool_ids
+
+
+class ClusterWatcher:
+    """
+    Tail 'ceph -w' on the controller and wake up waiters as soon as the
+    osdmap epoch or the pg state distribution changes.
+
+    pgmap versions also move on plain stat updates, so only changes to
+    the 'N pgs: ...' state list of a pgmap line count.  If the stream
+    cannot be started or dies, wait() degrades to a plain sleep.
+    """
+    MAP_LINE = re.compile(r'(?:osdmap e(\d+)|pgmap v\d+: ([^;]*))')
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.changed = Event()
+        self.proc = None
+        self.thread = None
+        self.osdmap_epoch = None
+        self.pg_states = None
+
+    def start(self):
+        """
+        Spawn 'ceph -w' and the greenlet reading it.
+        """
+        testdir = teuthology.get_testdir(self.manager.ctx)
+        self.proc = self.manager.controller.run(
+            args=[
+                'adjust-ulimits',
+                'ceph-coverage',
+                '{tdir}/archive/coverage'.format(tdir=testdir),
+                'daemon-helper',
+                'kill',
+                'ceph', '-w',
+                ],
+            stdin=run.PIPE,
+            stdout=run.PIPE,
+            wait=False,
+            )
+        self.thread = gevent.spawn(self.watch)
+
+    def watch(self):
+        """
+        Read the event stream, notifying on map changes.
+        """
+        try:
+            while True:
+                line = self.proc.stdout.readline()
+                if not line:
+                    break
+                match = self.MAP_LINE.search(line)
+                if match is None:
+                    continue
+                (epoch, pg_states) = match.groups()
+                if epoch is not None:
+                    if epoch == self.osdmap_epoch:
+                        continue
+                    self.osdmap_epoch = epoch
+                else:
+                    if pg_states == self.pg_states:
+                        continue
+                    self.pg_states = pg_states
+                self.notify()
+        except Exception:
+            self.manager.log('ceph -w watcher failed, falling back to polling')
+        finally:
+            self.proc = None
+
+    def notify(self):
+        """
+        Wake everyone blocked in wait().
+        """
+        self.manager.cluster_state.invalidate()
+        changed = self.changed
+        self.changed = Event()
+        changed.set()
+
+    def wait(self, timeout):
+        """
+        Sleep for up to timeout seconds, returning early on a map change.
+        """
+        if self.proc is None:
+            time.sleep(timeout)
+        else:
+            self.changed.wait(timeout)
+
+    def stop(self):
+        """
+        Kill 'ceph -w' by closing its stdin.
+        """
+        proc = self.proc
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+            run.wait([proc])
+        except Exception:
+            pass
+        self.thread.join()
+
 
 class CephManager:
     """
@@ -514,6 +1360,10 @@ class CephManager:
         self.config = config
         self.controller = controller
         self.next_pool_id = 0
+        self.cluster_state = ClusterStateCache(self)
+        self.command_session = None
+        self.watcher = None
+        self.power = None
         if (logger):
             self.log = lambda x: logger.info(x)
         else:
@@ -525,8 +1375,11 @@ class CephManager:
             self.log = tmp
         if self.config is None:
             self.config = dict()
+        self.cluster_state.validity = self.config.get(
+            'cluster_state_validity', 1.0)
         pools = self.list_pools()
         self.pools = {}
+        self.pool_locks = {}
         for pool in pools:
             self.pools[pool] = self.get_pool_property(pool, 'pg_num')
 
@@ -534,37 +1387,179 @@ class CephManager:
         """
         Start ceph on a raw cluster.  Return count
         """
+        self.cluster_state.invalidate()
+        return self.cluster_cmd_output(*args)
+
+    def start_command_session(self):
+        """
+        Route mon commands through a persistent CephCommandSession on
+        the controller.  Commands the session cannot handle, and all
+        commands if it fails to start, still use the ceph CLI.
+        """
+        if self.command_session is not None:
+            return
+        session = CephCommandSession(
+            self.controller, teuthology.get_testdir(self.ctx))
+        if session.is_open():
+            self.log('using persistent ceph command session')
+            self.command_session = session
+
+    def stop_command_session(self):
+        """
+        Close the persistent command session, if any.
+        """
+        session = self.command_session
+        self.command_session = None
+        if session is not None:
+            session.close()
+
+    def wait_for_change(self, timeout=3):
+        """
+        Pause a polling loop until the cluster maps change or timeout
+        seconds pass.  The 'ceph -w' watcher is started on first use
+        unless the cluster_watch config option is false.
+        """
+        if self.watcher is None and self.config.get('cluster_watch', True):
+            self.watcher = ClusterWatcher(self)
+            try:
+                self.watcher.start()
+            except Exception:
+                self.log('unable to start ceph -w watcher')
+                self.watcher.proc = None
+        if self.watcher is None:
+            time.sleep(timeout)
+        else:
+            self.watcher.wait(timeout)
+
+    def stop_watcher(self):
+        """
+        Stop the 'ceph -w' watcher, if running.
+        """
+        watcher = self.watcher
+        self.watcher = None
+        if watcher is not None:
+            watcher.stop()
+
+    def session_cluster_cmd(self, args):
+        """
+        Try to run a command through the command session.
+
+        :returns: (exitstatus, output), or None if the CLI has to be used.
+        """
+        if self.command_session is None:
+            return None
+        result = self.command_session.command(args)
+        if result is None:
+            return None
+        (exitstatus, out, err) = result
+        if exitstatus:
+            self.log('ceph {args}: {err}'.format(args=' '.join(args), err=err))
+        return (exitstatus, out)
+
+    def cluster_cmd_output(self, *args):
+        """
+        Run a ceph command on the controller and return its output
+        without invalidating the cluster state cache.  Only meant for
+        read-only queries.
+        """
+        with time_command(self.ctx, ['ceph'] + list(args),
+                          self.controller.name) as call:
+            result = self.session_cluster_cmd(args)
+            if result is not None:
+                (exitstatus, out) = result
+                if exitstatus:
+                    raise CommandFailedError(
+                        command=' '.join(['ceph'] + list(args)),
+                        exitstatus=exitstatus,
+                        node=self.controller.name)
+                call.size = len(out)
+                return out
+            testdir = teuthology.get_testdir(self.ctx)
+            ceph_args = [
+                    'adjust-ulimits',
+                    'ceph-coverage',
+                    '{tdir}/archive/coverage'.format(tdir=testdir),
+                    'ceph',
+                    ]
+            ceph_args.extend(args)
+            proc = self.controller.run(
+                args=ceph_args,
+                stdout=StringIO(),
+                )
+            out = proc.stdout.getvalue()
+            call.size = len(out)
+            return out
+
+    def raw_cluster_cmds(self, cmds):
+        """
+        Run several ceph commands in as few round trips as possible:
+        through the command session when it is open, otherwise chained
+        with '&&' in a single shell on the controller.  Raises
+        CommandFailedError if any of them fails.
+
+        :param cmds: list of ceph CLI argument lists
+        """
+        self.cluster_state.invalidate()
+        remaining = []
+        for args in cmds:
+            with time_command(self.ctx, ['ceph'] + list(args),
+                              self.controller.name) as call:
+                result = self.session_cluster_cmd(args)
+                if result is None:
+                    # run by the CLI below, and timed there
+                    call.discard()
+                    remaining.append(args)
+                    continue
+                (exitstatus, out) = result
+                call.size = len(out)
+                if exitstatus:
+                    raise CommandFailedError(
+                        command=' '.join(['ceph'] + list(args)),
+                        exitstatus=exitstatus,
+                        node=self.controller.name)
+        if not remaining:
+            return
         testdir = teuthology.get_testdir(self.ctx)
-        ceph_args = [
-                'adjust-ulimits',
-                'ceph-coverage',
-                '{tdir}/archive/coverage'.format(tdir=testdir),
-                'ceph',
-                ]
-        ceph_args.extend(args)
-        proc = self.controller.run(
-            args=ceph_args,
-            stdout=StringIO(),
-            )
-        return proc.stdout.getvalue()
+        ceph_args = []
+        for args in remaining:
+            if ceph_args:
+                ceph_args.append(run.Raw('&&'))
+            ceph_args.extend([
+                    'adjust-ulimits',
+                    'ceph-coverage',
+                    '{tdir}/archive/coverage'.format(tdir=testdir),
+                    'ceph',
+                    ])
+            ceph_args.extend(args)
+        with time_command(self.ctx, ['ceph', 'chained'],
+                          self.controller.name):
+            self.controller.run(args=ceph_args)
 
     def raw_cluster_cmd_result(self, *args):
         """
         Start ceph on a cluster.  Return success or failure information.
         """
-        testdir = teuthology.get_testdir(self.ctx)
-        ceph_args = [
-                'adjust-ulimits',
-                'ceph-coverage',
-                '{tdir}/archive/coverage'.format(tdir=testdir),
-                'ceph',
-                ]
-        ceph_args.extend(args)
-        proc = self.controller.run(
-            args=ceph_args,
-            check_status=False,
-            )
-        return proc.exitstatus
+        self.cluster_state.invalidate()
+        with time_command(self.ctx, ['ceph'] + list(args),
+                          self.controller.name) as call:
+            result = self.session_cluster_cmd(args)
+            if result is not None:
+                call.success = result[0] == 0
+                return result[0]
+            testdir = teuthology.get_testdir(self.ctx)
+            ceph_args = [
+                    'adjust-ulimits',
+                    'ceph-coverage',
+                    '{tdir}/archive/coverage'.format(tdir=testdir),
+                    'ceph',
+                    ]
+            ceph_args.extend(args)
+            proc = self.controller.run(
+                args=ceph_args,
+                check_status=False,
+                )
+            call.success = proc.exitstatus == 0
+            return proc.exitstatus
 
     def do_rados(self, remote, cmd):
         """
@@ -578,10 +1573,11 @@ class CephManager:
             'rados',
             ]
         pre.extend(cmd)
-        proc = remote.run(
-            args=pre,
-            wait=True,
-            )
+        with time_command(self.ctx, ['rados'] + list(cmd), remote.name):
+            proc = remote.run(
+                args=pre,
+                wait=True,
+                )
         return proc
 
     def rados_write_objects(
@@ -641,12 +1637,7 @@ class CephManager:
         :param service_id: The second part of a role, e.g. '0' for the role 'client.0'
         :return: a Remote instance for the host where the requested role is placed
         """
-        for _remote, roles_for_host in self.ctx.cluster.remotes.iteritems():
-            for id_ in teuthology.roles_of_type(roles_for_host, service_type):
-                if id_ == str(service_id):
-                    return _remote
-
-        raise KeyError("Service {0}.{1} not found".format(service_type, service_id))
+        return get_role_index(self.ctx).find(service_type, service_id)
 
     def admin_socket(self, service_type, service_id, command, check_status=True):
         """
@@ -666,12 +1657,16 @@ class CephManager:
                 id=service_id),
             ]
         args.extend(command)
-        return remote.run(
-            args=args,
-            stdout=StringIO(),
-            wait=True,
-            check_status=check_status
-            )
+        with time_command(self.ctx, ['asok'] + list(command),
+                          remote.name) as call:
+            proc = remote.run(
+                args=args,
+                stdout=StringIO(),
+                wait=True,
+                check_status=check_status
+                )
+            call.size = len(proc.stdout.getvalue())
+        return proc
 
     def get_pgid(self, pool, pgnum):
         """
@@ -685,47 +1680,43 @@ class CephManager:
             pgnum=pgnum)
         return pg_str
 
+    def get_pg_map(self, pgid):
+        """
+        Look up the mapping of a single pg without dumping the pgmap.
+
+        :param pgid: pg id string, e.g. '1.0'
+        :returns: dict with the pg's 'up' and 'acting' sets
+        """
+        out = self.cluster_cmd_output('pg', 'map', pgid, '--format=json')
+        return json.loads(out)
+
     def get_pg_replica(self, pool, pgnum):
         """
         get replica for pool, pgnum (e.g. (data, 0)->0
         """
-        output = self.raw_cluster_cmd("pg", "dump", '--format=json')
-        j = json.loads('\n'.join(output.split('\n')[1:]))
-        pg_str = self.get_pgid(pool, pgnum)
-        for pg in j['pg_stats']:
-            if pg['pgid'] == pg_str:
-                return int(pg['acting'][-1])
-        assert False
+        pg_map = self.get_pg_map(self.get_pgid(pool, pgnum))
+        return int(pg_map['acting'][-1])
 
     def get_pg_primary(self, pool, pgnum):
         """
         get primary for pool, pgnum (e.g. (data, 0)->0
         """
-        output = self.raw_cluster_cmd("pg", "dump", '--format=json')
-        j = json.loads('\n'.join(output.split('\n')[1:]))
-        pg_str = self.get_pgid(pool, pgnum)
-        for pg in j['pg_stats']:
-            if pg['pgid'] == pg_str:
-                return int(pg['acting'][0])
-        assert False
+        pg_map = self.get_pg_map(self.get_pgid(pool, pgnum))
+        return int(pg_map['acting'][0])
 
     def get_pool_num(self, pool):
         """
         get number for pool (e.g., data -> 2)
         """
-        out = self.raw_cluster_cmd('osd', 'dump', '--format=json')
-        j = json.loads('\n'.join(out.split('\n')[1:]))
-        for i in j['pools']:
-            if i['pool_name'] == pool:
-                return int(i['pool'])
-        assert False
+        pool_ids = self.cluster_state.get_pool_ids()
+        assert pool in pool_ids
+        return pool_ids[pool]
 
     def list_pools(self):
         """
         list all pool names
         """
-        out = self.raw_cluster_cmd('osd', 'dump', '--format=json')
-        j = json.loads('\n'.join(out.split('\n')[1:]))
+        j = self.cluster_state.get_osd_dump()
         self.log(j['pools'])
         return [str(i['pool_name']) for i in j['pools']]
 
@@ -748,35 +1739,124 @@ class CephManager:
     def wait_run_admin_socket(self, service_type, service_id, args=['version'], timeout=75):
         """
         If osd_admin_socket call suceeds, return.  Otherwise wait
-        five seconds and try again.
+        and try again, backing off up to five seconds between tries.
         """
-        tries = 0
-        while True:
+        def ready():
             proc = self.admin_socket(service_type, service_id, args, check_status=False)
-            if proc.exitstatus is 0:
-                break
-            else:
-                tries += 1
-                if (tries * 5) > timeout:
-                    raise Exception('timed out waiting for admin_socket to appear after {type}.{id} restart'.format(
-                        type=service_type,
-                        id=service_id))
+            if proc.exitstatus != 0:
                 self.log(
                     "waiting on admin_socket for {type}-{id}, {command}".format(
                         type=service_type,
                         id=service_id,
                         command=args))
-                time.sleep(5)
+            return proc.exitstatus == 0
+        waiter = Waiter(
+            'ceph_manager.wait_run_admin_socket', ready, timeout=timeout,
+            interval=1, max_interval=5, backoff=2,
+            report=get_wait_report(self.ctx))
+        if not waiter.wait():
+            raise Exception('timed out waiting for admin_socket to appear after {type}.{id} restart'.format(
+                type=service_type,
+                id=service_id))
+
+    def admin_socket_chain(self, service_type, service_id, commands,
+                           timeout=75):
+        """
+        Run several admin socket commands on one daemon in a single
+        remote exec, retrying with backoff up to five seconds until they
+        all succeed or timeout seconds have passed.
+
+        :returns: (exitstatus, stdout) of the last attempt
+        """
+        testdir = teuthology.get_testdir(self.ctx)
+        remote = self.find_remote(service_type, service_id)
+        args = []
+        for command in commands:
+            if args:
+                args.append(run.Raw('&&'))
+            args.extend([
+                'sudo',
+                'adjust-ulimits',
+                'ceph-coverage',
+                '{tdir}/archive/coverage'.format(tdir=testdir),
+                'ceph',
+                '--admin-daemon',
+                '/var/run/ceph/ceph-{type}.{id}.asok'.format(
+                    type=service_type,
+                    id=service_id),
+                ])
+            args.extend(command)
+        procs = []
+        def attempt():
+            with time_command(self.ctx, ['asok', 'chained'],
+                              remote.name) as call:
+                proc = remote.run(
+                    args=args,
+                    stdout=StringIO(),
+                    wait=True,
+                    check_status=False,
+                    )
+                call.size = len(proc.stdout.getvalue())
+                call.success = proc.exitstatus == 0
+            procs.append(proc)
+            if proc.exitstatus != 0:
+                self.log(
+                    "waiting on admin_socket for {type}-{id}, {commands}".format(
+                        type=service_type,
+                        id=service_id,
+                        commands=commands))
+            return proc.exitstatus == 0
+        Waiter(
+            'ceph_manager.admin_socket_chain', attempt, timeout=timeout,
+            interval=1, max_interval=5, backoff=2,
+            report=get_wait_report(self.ctx)).wait()
+        proc = procs[-1]
+        return (proc.exitstatus, proc.stdout.getvalue())
+
+    def admin_socket_many(self, targets, commands, timeout=75,
+                          max_parallel=16):
+        """
+        Run the same admin socket commands on many daemons, with up to
+        max_parallel daemons handled concurrently.
+
+        :param targets: list of (service_type, service_id)
+        :param commands: list of admin socket commands, each a list of args
+        :returns: dict of '{type}.{id}' -> (exitstatus, stdout)
+        """
+        pool = Pool(max_parallel)
+        greenlets = {}
+        for (service_type, service_id) in targets:
+            role = '{type}.{id}'.format(type=service_type, id=service_id)
+            greenlets[role] = pool.spawn(
+                self.admin_socket_chain, service_type, service_id,
+                commands, timeout)
+        pool.join(raise_error=True)
+        return dict([(r, g.get()) for (r, g) in greenlets.iteritems()])
 
     def set_config(self, osdnum, **argdict):
         """
         :param osdnum: osd number
         :param argdict: dictionary containing values to set.
         """
-        for k, v in argdict.iteritems():
-            self.wait_run_admin_socket(
-                'osd', osdnum,
-                ['config', 'set', str(k), str(v)])
+        self.set_config_many([osdnum], **argdict)
+
+    def set_config_many(self, osds, **argdict):
+        """
+        Set config values on several osds at once.
+
+        :param osds: osd numbers
+        :param argdict: dictionary containing values to set.
+        """
+        commands = [['config', 'set', str(k), str(v)]
+                    for (k, v) in argdict.iteritems()]
+        results = self.admin_socket_many(
+            [('osd', osd) for osd in osds], commands)
+        failed = sorted([role for (role, (exitstatus, _)) in
+                         results.iteritems() if exitstatus != 0])
+        if failed:
+            raise Exception(
+                'timed out setting {args} on {roles}'.format(
+                    args=argdict, roles=', '.join(failed)))
 
     def raw_cluster_status(self):
         """
@@ -791,63 +1871,58 @@ class CephManager:
         """
         return self.raw_cluster_cmd('osd', 'dump')
 
+    def get_osd_state_table(self):
+        """
+        :returns: an OSDStateTable for the current osdmap.
+        """
+        live = [int(x.id_) for x in
+                self.ctx.daemons.iter_daemons_of_role('osd') if x.running()]
+        return OSDStateTable(self.get_osd_dump(), live)
+
     def get_osd_status(self):
         """
         Get osd statuses sorted by states that the osds are in.
         """
-        osd_lines = filter(
-            lambda x: x.startswith('osd.') and (("up" in x) or ("down" in x)),
-            self.raw_osd_status().split('\n'))
-        self.log(osd_lines)
-        in_osds = [int(i[4:].split()[0]) for i in filter(
-                lambda x: " in " in x,
-                osd_lines)]
-        out_osds = [int(i[4:].split()[0]) for i in filter(
-                lambda x: " out " in x,
-                osd_lines)]
-        up_osds = [int(i[4:].split()[0]) for i in filter(
-                lambda x: " up " in x,
-                osd_lines)]
-        down_osds = [int(i[4:].split()[0]) for i in filter(
-                lambda x: " down " in x,
-                osd_lines)]
-        dead_osds = [int(x.id_) for x in
-                     filter(lambda x: not x.running(), self.ctx.daemons.iter_daemons_of_role('osd'))]
-        live_osds = [int(x.id_) for x in
-                     filter(lambda x: x.running(), self.ctx.daemons.iter_daemons_of_role('osd'))]
-        return { 'in' : in_osds, 'out' : out_osds, 'up' : up_osds,
-                 'down' : down_osds, 'dead' : dead_osds, 'live' : live_osds,
-                 'raw' : osd_lines}
+        status = self.get_osd_state_table().status()
+        status['raw'] = self.get_osd_dump()
+        return status
 
     def get_num_pgs(self):
         """
         Check cluster status for the number of pgs
         """
-        status = self.raw_cluster_status()
-        self.log(status)
-        return status['pgmap']['num_pgs']
+        return self.get_pg_state_summary().num_pgs
 
     def create_erasure_code_profile(self, profile_name, profile):
         """
         Create an erasure code profile name that can be used as a parameter
         when creating an erasure coded pool.
         """
+        args = cmd_erasure_code_profile(profile_name, profile)
+        self.raw_cluster_cmd(*args)
+
+    def pool_lock(self, pool_name):
+        """
+        :returns: the lock serializing changes to one pool.
+
+        self.lock guards self.pools and self.pool_locks, which are only
+        changed while holding it, and is never held across a cluster
+        command; self.pools may be read without it.
+        """
         with self.lock:
-            args = cmd_erasure_code_profile(profile_name, profile)
-            self.raw_cluster_cmd(*args)
+            return self.pool_locks.setdefault(pool_name, threading.RLock())
 
     def create_pool_with_unique_name(self, pg_num=16, erasure_code_profile_name=None):
         """
         Create a pool named unique_pool_X where X is unique.
         """
-        name = ""
         with self.lock:
             name = "unique_pool_%s" % (str(self.next_pool_id),)
             self.next_pool_id += 1
-            self.create_pool(
-                name,
-                pg_num,
-                erasure_code_profile_name=erasure_code_profile_name)
+        self.create_pool(
+            name,
+            pg_num,
+            erasure_code_profile_name=erasure_code_profile_name)
         return name
 
     def create_pool(self, pool_name, pg_num=16, erasure_code_profile_name=None):
@@ -857,7 +1932,7 @@ class CephManager:
         :param pg_num: initial number of pgs.
         :param erasure_code_profile_name: if set and !None create an erasure coded pool using the profile 
         """
-        with self.lock:
+        with self.pool_lock(pool_name):
             assert isinstance(pool_name, str)
             assert isinstance(pg_num, int)
             assert pool_name not in self.pools
@@ -866,39 +1941,39 @@ class CephManager:
                 self.raw_cluster_cmd('osd', 'pool', 'create', pool_name, str(pg_num), str(pg_num), 'erasure', erasure_code_profile_name)
             else:
                 self.raw_cluster_cmd('osd', 'pool', 'create', pool_name, str(pg_num))
-            self.pools[pool_name] = pg_num
+            with self.lock:
+                self.pools[pool_name] = pg_num
 
     def remove_pool(self, pool_name):
         """
         Remove the indicated pool
         :param pool_name: Pool to be removed
         """
-        with self.lock:
+        with self.pool_lock(pool_name):
             assert isinstance(pool_name, str)
             assert pool_name in self.pools
             self.log("removing pool_name %s" % (pool_name,))
-            del self.pools[pool_name]
+            with self.lock:
+                del self.pools[pool_name]
             self.do_rados(
                 self.controller,
                 ['rmpool', pool_name, pool_name, "--yes-i-really-really-mean-it"]
                 )
+            with self.lock:
+                self.pool_locks.pop(pool_name, None)
 
     def get_pool(self):
         """
         Pick a random pool
         """
-        with self.lock:
-            return random.choice(self.pools.keys())
+        return random.choice(self.pools.keys())
 
     def get_pool_pg_num(self, pool_name):
         """
         Return the number of pgs in the pool specified.
         """
-        with self.lock:
-            assert isinstance(pool_name, str)
-            if pool_name in self.pools:
-                return self.pools[pool_name]
-            return 0
+        assert isinstance(pool_name, str)
+        return self.pools.get(pool_name, 0)
 
     def get_pool_property(self, pool_name, prop):
         """
@@ -906,16 +1981,15 @@ class CephManager:
         :param prop: property to be checked.
         :returns: property as an int value.
         """
-        with self.lock:
-            assert isinstance(pool_name, str)
-            assert isinstance(prop, str)
-            output = self.raw_cluster_cmd(
-                'osd',
-                'pool',
-                'get',
-                pool_name,
-                prop)
-            return int(output.split()[1])
+        assert isinstance(pool_name, str)
+        assert isinstance(prop, str)
+        output = self.raw_cluster_cmd(
+            'osd',
+            'pool',
+            'get',
+            pool_name,
+            prop)
+        return int(output.split()[1])
 
     def set_pool_property(self, pool_name, prop, val):
         """
@@ -923,14 +1997,15 @@ class CephManager:
         :param prop: property to be set.
         :param val: value to set.
 
-        This routine retries if set operation fails.
+        This routine retries if set operation fails.  The pool lock is
+        dropped while waiting to retry.
         """
-        with self.lock:
-            assert isinstance(pool_name, str)
-            assert isinstance(prop, str)
-            assert isinstance(val, int)
-            tries = 0
-            while True:
+        assert isinstance(pool_name, str)
+        assert isinstance(prop, str)
+        assert isinstance(val, int)
+        tries = 0
+        while True:
+            with self.pool_lock(pool_name):
                 r = self.raw_cluster_cmd_result(
                     'osd',
                     'pool',
@@ -938,41 +2013,44 @@ class CephManager:
                     pool_name,
                     prop,
                     str(val))
-                if r != 11: # EAGAIN
-                    break
-                tries += 1
-                if tries > 50:
-                    raise Exception('timed out getting EAGAIN when setting pool property %s %s = %s' % (pool_name, prop, val))
-                self.log('got EAGAIN setting pool property, waiting a few seconds...')
-                time.sleep(2)
+            if r != 11: # EAGAIN
+                break
+            tries += 1
+            if tries > 50:
+                raise Exception('timed out getting EAGAIN when setting pool property %s %s = %s' % (pool_name, prop, val))
+            self.log('got EAGAIN setting pool property, waiting a few seconds...')
+            time.sleep(2)
 
     def expand_pool(self, pool_name, by, max_pgs):
         """
         Increase the number of pgs in a pool
         """
-        with self.lock:
-            assert isinstance(pool_name, str)
-            assert isinstance(by, int)
-            assert pool_name in self.pools
-            if self.get_num_creating() > 0:
-                return
+        assert isinstance(pool_name, str)
+        assert isinstance(by, int)
+        assert pool_name in self.pools
+        if self.get_num_creating() > 0:
+            return
+        with self.pool_lock(pool_name):
             if (self.pools[pool_name] + by) > max_pgs:
                 return
-            self.log("increase pool size by %d"%(by,))
             new_pg_num = self.pools[pool_name] + by
-            self.set_pool_property(pool_name, "pg_num", new_pg_num)
-            self.pools[pool_name] = new_pg_num
+        self.log("increase pool size by %d"%(by,))
+        self.set_pool_property(pool_name, "pg_num", new_pg_num)
+        with self.pool_lock(pool_name):
+            with self.lock:
+                if pool_name in self.pools:
+                    self.pools[pool_name] = max(self.pools[pool_name],
+                                                new_pg_num)
 
     def set_pool_pgpnum(self, pool_name):
         """
         Set pgpnum property of pool_name pool.
         """
-        with self.lock:
-            assert isinstance(pool_name, str)
-            assert pool_name in self.pools
-            if self.get_num_creating() > 0:
-                return
-            self.set_pool_property(pool_name, 'pgp_num', self.pools[pool_name])
+        assert isinstance(pool_name, str)
+        assert pool_name in self.pools
+        if self.get_num_creating() > 0:
+            return
+        self.set_pool_property(pool_name, 'pgp_num', self.pools[pool_name])
 
     def list_pg_missing(self, pgid):
         """
@@ -999,11 +2077,22 @@ class CephManager:
 
     def get_pg_stats(self):
         """
-        Dump the cluster and get pg stats
+        Dump the cluster and get pg stats, limited to PG_STAT_FIELDS
+        """
+        return self.cluster_state.get_pg_stats()
+
+    def iter_pg_stats(self, fields=None):
+        """
+        Stream the pg stats without holding the whole dump in memory.
+
+        :param fields: pg stat fields to keep, or None for all of them
         """
-        out = self.raw_cluster_cmd('pg', 'dump', '--format=json')
-        j = json.loads('\n'.join(out.split('\n')[1:]))
-        return j['pg_stats']
+        testdir = teuthology.get_testdir(self.ctx)
+        with time_command(self.ctx, ['ceph', 'pg', 'dump'],
+                          self.controller.name) as call:
+            for pg in iter_pg_stats(self.controller, testdir, fields,
+                                    call=call):
+                yield pg
 
     def compile_pg_status(self):
         """
@@ -1053,32 +2142,28 @@ class CephManager:
         """
         Scrub pg and wait for scrubbing to finish
         """
-        init = self.get_last_scrub_stamp(pool, pgnum)
-        self.raw_cluster_cmd('pg', stype, self.get_pgid(pool, pgnum))
-        while init == self.get_last_scrub_stamp(pool, pgnum):
+        pgid = self.get_pgid(pool, pgnum)
+        init = self.get_single_pg_stats(pgid)["last_scrub_stamp"]
+        self.raw_cluster_cmd('pg', stype, pgid)
+        def scrubbed():
+            if init != self.get_single_pg_stats(pgid)["last_scrub_stamp"]:
+                return True
             self.log("waiting for scrub type %s"%(stype,))
-            time.sleep(10)
+            return False
+        self.waiter('do_pg_scrub', scrubbed, max_interval=10).wait()
 
     def get_single_pg_stats(self, pgid):
         """
         Return pg for the pgid specified.
         """
-        all_stats = self.get_pg_stats()
-
-        for pg in all_stats:
-            if pg['pgid'] == pgid:
-                return pg
-
-        return None
+        return self.cluster_state.get_pg_index().get(pgid)
 
     def get_osd_dump(self):
         """
         Dump osds
         :returns: all osds
         """
-        out = self.raw_cluster_cmd('osd', 'dump', '--format=json')
-        j = json.loads('\n'.join(out.split('\n')[1:]))
-        return j['osds']
+        return self.cluster_state.get_osd_dump()['osds']
 
     def get_stuck_pgs(self, type_, threshold):
         """
@@ -1092,49 +2177,40 @@ class CephManager:
         """
         Check cluster status to get the number of unfound objects
         """
-        status = self.raw_cluster_status()
+        status = self.cluster_state.get_status()
         self.log(status)
         return status['pgmap'].get('unfound_objects', 0)
 
+    def get_pg_state_summary(self):
+        """
+        :returns: a PGStateSummary for the current pg dump.
+        """
+        return self.cluster_state.get_pg_summary()
+
     def get_num_creating(self):
         """
         Find the number of pgs in creating mode.
         """
-        pgs = self.get_pg_stats()
-        num = 0
-        for pg in pgs:
-            if 'creating' in pg['state']:
-                num += 1
-        return num
+        return self.get_pg_state_summary().num_creating
 
     def get_num_active_clean(self):
         """
         Find the number of active and clean pgs.
         """
-        pgs = self.get_pg_stats()
-        num = 0
-        for pg in pgs:
-            if pg['state'].count('active') and pg['state'].count('clean') and not pg['state'].count('stale'):
-                num += 1
-        return num
+        return self.get_pg_state_summary().num_active_clean
 
     def get_num_active_recovered(self):
         """
         Find the number of active and recovered pgs.
         """
-        pgs = self.get_pg_stats()
-        num = 0
-        for pg in pgs:
-            if pg['state'].count('active') and not pg['state'].count('recover') and not pg['state'].count('backfill') and not pg['state'].count('stale'):
-                num += 1
-        return num
+        return self.get_pg_state_summary().num_active_recovered
 
     def get_is_making_recovery_progress(self):
         """
         Return whether there is recovery progress discernable in the
         raw cluster status
         """
-        status = self.raw_cluster_status()
+        status = self.cluster_state.get_status()
         kps = status['pgmap'].get('recovering_keys_per_sec', 0)
         bps = status['pgmap'].get('recovering_bytes_per_sec', 0)
         ops = status['pgmap'].get('recovering_objects_per_sec', 0)
@@ -1144,77 +2220,63 @@ class CephManager:
         """
         Find the number of active pgs.
         """
-        pgs = self.get_pg_stats()
-        num = 0
-        for pg in pgs:
-            if pg['state'].count('active') and not pg['state'].count('stale'):
-                num += 1
-        return num
+        return self.get_pg_state_summary().num_active
 
     def get_num_down(self):
         """
         Find the number of pgs that are down.
         """
-        pgs = self.get_pg_stats()
-        num = 0
-        for pg in pgs:
-            if (pg['state'].count('down') and not pg['state'].count('stale')) or \
-                    (pg['state'].count('incomplete') and not pg['state'].count('stale')):
-                num += 1
-        return num
+        return self.get_pg_state_summary().num_down
 
     def get_num_active_down(self):
         """
         Find the number of pgs that are either active or down.
         """
-        pgs = self.get_pg_stats()
-        num = 0
-        for pg in pgs:
-            if (pg['state'].count('active') and not pg['state'].count('stale')) or \
-                    (pg['state'].count('down') and not pg['state'].count('stale')) or \
-                    (pg['state'].count('incomplete') and not pg['state'].count('stale')):
-                num += 1
-        return num
+        return self.get_pg_state_summary().num_active_down
 
     def is_clean(self):
         """
         True if all pgs are clean
         """
-        return self.get_num_active_clean() == self.get_num_pgs()
+        return self.get_pg_state_summary().is_clean()
 
     def is_recovered(self):
         """
         True if all pgs have recovered
         """
-        return self.get_num_active_recovered() == self.get_num_pgs()
+        return self.get_pg_state_summary().is_recovered()
 
     def is_active_or_down(self):
         """
         True if all pgs are active or down
         """
-        return self.get_num_active_down() == self.get_num_pgs()
+        return self.get_pg_state_summary().is_active_or_down()
+
+    def waiter(self, name, predicate, timeout=None, **kwargs):
+        """
+        :returns: a Waiter polling predicate, woken early by cluster map
+                  changes and reporting into the job's wait report.
+        """
+        kwargs.setdefault('interval', 1)
+        kwargs.setdefault('max_interval', 3)
+        kwargs.setdefault('backoff', 1.5)
+        kwargs.setdefault('jitter', 0.1)
+        return Waiter(
+            'ceph_manager.' + name, predicate, timeout=timeout,
+            wake=self.wait_for_change, report=get_wait_report(self.ctx),
+            **kwargs)
 
     def wait_for_clean(self, timeout=None):
         """
         Returns trues when all pgs are clean.
         """
         self.log("waiting for clean")
-        start = time.time()
-        num_active_clean = self.get_num_active_clean()
-        while not self.is_clean():
-            if timeout is not None:
-                if self.get_is_making_recovery_progress():
-                    self.log("making progress, resetting timeout")
-                    start = time.time()
-                else:
-                    self.log("no progress seen, keeping timeout for now")
-                    assert time.time() - start < timeout, \
-                        'failed to become clean before timeout expired'
-            cur_active_clean = self.get_num_active_clean()
-            if cur_active_clean != num_active_clean:
-                start = time.time()
-                num_active_clean = cur_active_clean
-            time.sleep(3)
+        waiter = self.waiter(
+            'wait_for_clean', self.is_clean, timeout,
+            progress=self.get_num_active_clean,
+            making_progress=self.get_is_making_recovery_progress)
+        assert waiter.wait(), \
+            'failed to become clean before timeout expired'
         self.log("clean!")
 
     def are_all_osds_up(self):
@@ -1231,12 +2293,8 @@ class CephManager:
         osds are up.
         """
         self.log("waiting for all up")
-        start = time.time()
-        while not self.are_all_osds_up():
-            if timeout is not None:
-                assert time.time() - start < timeout, \
-                    'timeout expired in wait_for_all_up'
-            time.sleep(3)
+        waiter = self.waiter('wait_for_all_up', self.are_all_osds_up, timeout)
+        assert waiter.wait(), 'timeout expired in wait_for_all_up'
         self.log("all up!")
 
     def wait_for_recovery(self, timeout=None):
@@ -1244,22 +2302,11 @@ class CephManager:
         Check peering. When this exists, we have recovered.
         """
         self.log("waiting for recovery to complete")
-        start = time.time()
-        num_active_recovered = self.get_num_active_recovered()
-        while not self.is_recovered():
-            if timeout is not None:
-                if self.get_is_making_recovery_progress():
-                    self.log("making progress, resetting timeout")
-                    start = time.time()
-                else:
-                    self.log("no progress seen, keeping timeout for now")
-                    assert time.time() - start < timeout, \
-                        'failed to recover before timeout expired'
-            cur_active_recovered = self.get_num_active_recovered()
-            if cur_active_recovered != num_active_recovered:
-                start = time.time()
-                num_active_recovered = cur_active_recovered
-            time.sleep(3)
+        waiter = self.waiter(
+            'wait_for_recovery', self.is_recovered, timeout,
+            progress=self.get_num_active_recovered,
+            making_progress=self.get_is_making_recovery_progress)
+        assert waiter.wait(), 'failed to recover before timeout expired'
         self.log("recovered!")
 
     def wait_for_active(self, timeout=None):
@@ -1267,17 +2314,10 @@ class CephManager:
         Check peering. When this exists, we are definitely active
         """
         self.log("waiting for peering to complete")
-        start = time.time()
-        num_active = self.get_num_active()
-        while not self.is_active():
-            if timeout is not None:
-                assert time.time() - start < timeout, \
-                    'failed to recover before timeout expired'
-            cur_active = self.get_num_active()
-            if cur_active != num_active:
-                start = time.time()
-                num_active = cur_active
-            time.sleep(3)
+        waiter = self.waiter(
+            'wait_for_active', self.is_active, timeout,
+            progress=self.get_num_active)
+        assert waiter.wait(), 'failed to recover before timeout expired'
         self.log("active!")
 
     def wait_for_active_or_down(self, timeout=None):
@@ -1286,17 +2326,10 @@ class CephManager:
         active or down
         """
         self.log("waiting for peering to complete or become blocked")
-        start = time.time()
-        num_active_down = self.get_num_active_down()
-        while not self.is_active_or_down():
-            if timeout is not None:
-                assert time.time() - start < timeout, \
-                    'failed to recover before timeout expired'
-            cur_active_down = self.get_num_active_down()
-            if cur_active_down != num_active_down:
-                start = time.time()
-                num_active_down = cur_active_down
-            time.sleep(3)
+        waiter = self.waiter(
+            'wait_for_active_or_down', self.is_active_or_down, timeout,
+            progress=self.get_num_active_down)
+        assert waiter.wait(), 'failed to recover before timeout expired'
         self.log("active or down!")
 
     def osd_is_up(self, osd):
@@ -1311,33 +2344,44 @@ class CephManager:
         Loop waiting for osd.
         """
         self.log('waiting for osd.%d to be up' % osd)
-        start = time.time()
-        while not self.osd_is_up(osd):
-            if timeout is not None:
-                assert time.time() - start < timeout, \
-                    'osd.%d failed to come up before timeout expired' % osd
-            time.sleep(3)
+        waiter = self.waiter(
+            'wait_till_osd_is_up', lambda: self.osd_is_up(osd), timeout)
+        assert waiter.wait(), \
+            'osd.%d failed to come up before timeout expired' % osd
         self.log('osd.%d is up' % osd)
 
     def is_active(self):
         """
         Wrapper to check if active
         """
-        return self.get_num_active() == self.get_num_pgs()
+        return self.get_pg_state_summary().is_active()
 
     def wait_till_active(self, timeout=None):
         """
         Wait until osds are active.
         """
         self.log("waiting till active")
-        start = time.time()
-        while not self.is_active():
-            if timeout is not None:
-                assert time.time() - start < timeout, \
-                    'failed to become active before timeout expired'
-            time.sleep(3)
+        waiter = self.waiter('wait_till_active', self.is_active, timeout)
+        assert waiter.wait(), 'failed to become active before timeout expired'
         self.log("active!")
 
+    def power_cycler(self):
+        """
+        :returns: the PowerCycler of this manager, created on first use
+        """
+        if self.power is None:
+            def reconnect(remotes):
+                """
+                Reconnect to rebooted hosts.
+                """
+                teuthology.reconnect(self.ctx, 60, remotes)
+                invalidate_role_index(self.ctx)
+            self.power = PowerCycler(
+                reconnect,
+                on_boot=lambda remote: make_admin_daemon_dir(self.ctx, remote),
+                logger=self.log)
+        return self.power
+
     def mark_out_osd(self, osd):
         """
         Wrapper to mark osd out.
@@ -1350,10 +2394,9 @@ class CephManager:
         or by stopping.
         """
         if self.config.get('powercycle'):
-            (remote,) = self.ctx.cluster.only('osd.{o}'.format(o=osd)).remotes.iterkeys()
+            remote = self.find_remote('osd', osd)
             self.log('kill_osd on osd.{o} doing powercycle of {s}'.format(o=osd, s=remote.name))
-            assert remote.console is not None, "powercycling requested but RemoteConsole is not initialized.  Check ipmi config."
-            remote.console.power_off()
+            self.power_cycler().power_off([remote])
         else:
             self.ctx.daemons.get_daemon('osd', osd).stop()
 
@@ -1372,15 +2415,10 @@ class CephManager:
         or by restarting.
         """
         if self.config.get('powercycle'):
-            (remote,) = self.ctx.cluster.only('osd.{o}'.format(o=osd)).remotes.iterkeys()
-            self.log('kill_osd on osd.{o} doing powercycle of {s}'.format(o=osd, s=remote.name))
-            assert remote.console is not None, "powercycling requested but RemoteConsole is not initialized.  Check ipmi config."
-            remote.console.power_on()
-            if not remote.console.check_status(300):
-                raise Exception('Failed to revive osd.{o} via ipmi'.format(o=osd))
-            teuthology.reconnect(self.ctx, 60, [remote])
+            remote = self.find_remote('osd', osd)
+            self.log('revive_osd on osd.{o} doing powercycle of {s}'.format(o=osd, s=remote.name))
+            self.power_cycler().power_on([remote])
             mount_osd_data(self.ctx, remote, str(osd))
-            make_admin_daemon_dir(self.ctx, remote)
             self.ctx.daemons.get_daemon('osd', osd).reset()
         self.ctx.daemons.get_daemon('osd', osd).restart()
         # wait for dump_ops_in_flight; this command doesn't appear
@@ -1403,6 +2441,51 @@ class CephManager:
         """
         self.raw_cluster_cmd('osd', 'in', str(osd))
 
+    def apply_osd_changes(self, changes):
+        """
+        Apply a list of osd changes with as few commands as possible.
+
+        Changes the osdmap already reflects are dropped, all 'in' and
+        'out' changes are each folded into one multi-osd command, and
+        the rest are run by raw_cluster_cmds.
+
+        :param changes: list of ('reweight', osd, weight),
+                        ('primary-affinity', osd, affinity), ('in', osd)
+                        or ('out', osd)
+        :returns: the number of commands issued
+        """
+        table = self.get_osd_state_table()
+        ins = []
+        outs = []
+        cmds = []
+        for change in changes:
+            (op, osd) = change[:2]
+            known = table.has(osd, table.EXISTS)
+            if op == 'in':
+                if not (known and table.is_in(osd)):
+                    ins.append(str(osd))
+            elif op == 'out':
+                if not (known and not table.is_in(osd)):
+                    outs.append(str(osd))
+            elif op == 'reweight':
+                if not (known and table.weight(osd) == float(change[2])):
+                    cmds.append(['osd', 'reweight', str(osd), str(change[2])])
+            elif op == 'primary-affinity':
+                if not (known and
+                        table.primary_affinity(osd) == float(change[2])):
+                    cmds.append(['osd', 'primary-affinity', str(osd),
+                                 str(change[2])])
+            else:
+                raise ValueError('unknown osd change {op}'.format(op=op))
+        if outs:
+            cmds.insert(0, ['osd', 'out'] + outs)
+        if ins:
+            cmds.insert(0, ['osd', 'in'] + ins)
+        self.log('applying {n} osd changes with {c} commands'.format(
+                n=len(changes), c=len(cmds)))
+        self.raw_cluster_cmds(cmds)
+        return len(cmds)
+
 
     ## monitors
 
@@ -1418,10 +2501,9 @@ class CephManager:
         or by doing a stop.
         """
         if self.config.get('powercycle'):
-            (remote,) = self.ctx.cluster.only('mon.{m}'.format(m=mon)).remotes.iterkeys()
+            remote = self.find_remote('mon', mon)
             self.log('kill_mon on mon.{m} doing powercycle of {s}'.format(m=mon, s=remote.name))
-            assert remote.console is not None, "powercycling requested but RemoteConsole is not initialized.  Check ipmi config."
-            remote.console.power_off()
+            self.power_cycler().power_off([remote])
         else:
             self.ctx.daemons.get_daemon('mon', mon).stop()
 
@@ -1431,11 +2513,9 @@ class CephManager:
         or by doing a normal restart.
         """
         if self.config.get('powercycle'):
-            (remote,) = self.ctx.cluster.only('mon.{m}'.format(m=mon)).remotes.iterkeys()
+            remote = self.find_remote('mon', mon)
             self.log('revive_mon on mon.{m} doing powercycle of {s}'.format(m=mon, s=remote.name))
-            assert remote.console is not None, "powercycling requested but RemoteConsole is not initialized.  Check ipmi config."
-            remote.console.power_on()
-            make_admin_daemon_dir(self.ctx, remote)
+            self.power_cycler().power_on([remote])
         self.ctx.daemons.get_daemon('mon', mon).restart()
 
     def get_mon_status(self, mon):
@@ -1443,7 +2523,7 @@ class CephManager:
         Extract all the monitor status information from the cluster
         """
         addr = self.ctx.ceph.conf['mon.%s' % mon]['mon addr']
-        out = self.raw_cluster_cmd('-m', addr, 'mon_status')
+        out = self.cluster_cmd_output('-m', addr, 'mon_status')
         return json.loads(out)
 
     def get_mon_quorum(self):
@@ -1460,12 +2540,13 @@ class CephManager:
         Loop until quorum size is reached.
         """
         self.log('waiting for quorum size %d' % size)
-        start = time.time()
-        while not len(self.get_mon_quorum()) == size:
-            if timeout is not None:
-                assert time.time() - start < timeout, \
-                    'failed to reach quorum size %d before timeout expired' % size
-            time.sleep(3)
+        waiter = Waiter(
+            'ceph_manager.wait_for_mon_quorum_size',
+            lambda: len(self.get_mon_quorum()) == size,
+            timeout=timeout, interval=1, max_interval=3, backoff=1.5,
+            report=get_wait_report(self.ctx))
+        assert waiter.wait(), \
+            'failed to reach quorum size %d before timeout expired' % size
         self.log("quorum is size %d" % size)
 
     def get_mon_health(self, debug=False):
@@ -1484,10 +2565,9 @@ class CephManager:
         Powercyle if set in config, otherwise just stop.
         """
         if self.config.get('powercycle'):
-            (remote,) = self.ctx.cluster.only('mds.{m}'.format(m=mds)).remotes.iterkeys()
+            remote = self.find_remote('mds', mds)
             self.log('kill_mds on mds.{m} doing powercycle of {s}'.format(m=mds, s=remote.name))
-            assert remote.console is not None, "powercycling requested but RemoteConsole is not initialized.  Check ipmi config."
-            remote.console.power_off()
+            self.power_cycler().power_off([remote])
         else:
             self.ctx.daemons.get_daemon('mds', mds).stop()
 
@@ -1504,11 +2584,9 @@ class CephManager:
         and then restart (using --hot-standby if specified.
         """
         if self.config.get('powercycle'):
-            (remote,) = self.ctx.cluster.only('mds.{m}'.format(m=mds)).remotes.iterkeys()
+            remote = self.find_remote('mds', mds)
             self.log('revive_mds on mds.{m} doing powercycle of {s}'.format(m=mds, s=remote.name))
-            assert remote.console is not None, "powercycling requested but RemoteConsole is not initialized.  Check ipmi config."
-            remote.console.power_on()
-            make_admin_daemon_dir(self.ctx, remote)
+            self.power_cycler().power_on([remote])
         args = []
         if standby_for_rank:
             args.extend(['--hot-standby', standby_for_rank])
@@ -1526,7 +2604,7 @@ class CephManager:
         Run cluster commands for the mds in order to get mds information
         """
         out = self.raw_cluster_cmd('mds', 'dump', '--format=json')
-        j = json.loads(' '.join(out.splitlines()[1:]))
+        j = json_loads_dump(out)
         # collate; for dup ids, larger gid wins.
         for info in j['info'].itervalues():
             if info['name'] == mds:
@@ -1539,7 +2617,7 @@ class CephManager:
         check rank.
         """
         out = self.raw_cluster_cmd('mds', 'dump', '--format=json')
-        j = json.loads(' '.join(out.splitlines()[1:]))
+        j = json_loads_dump(out)
         # collate; for dup ids, larger gid wins.
         for info in j['info'].itervalues():
             if info['rank'] == rank:
@@ -1550,10 +2628,22 @@ class CephManager:
         """
         Run cluster command to extract all the mds status.
         """
-        out = self.raw_cluster_cmd('mds', 'dump', '--format=json')
-        j = json.loads(' '.join(out.splitlines()[1:]))
+        out = self.cluster_cmd_output('mds', 'dump', '--format=json')
+        j = json_loads_dump(out)
         return j
 
+    def get_mds_epoch(self):
+        """
+        Get the mdsmap epoch from the one line 'mds stat' summary.
+
+        :returns: the epoch, or None if the output cannot be parsed
+        """
+        out = self.cluster_cmd_output('mds', 'stat')
+        m = re.search(r'\be(\d+):', out)
+        if m is None:
+            return None
+        return int(m.group(1))
+
     def get_filepath(self):
         """
         Return path to osd data with {id} needing to be replaced
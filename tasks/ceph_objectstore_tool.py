@@ -203,10 +203,10 @@ def task(ctx, config):
 
     log.debug("repid={num}".format(num=REPID))
 
-    while len(manager.get_osd_status()['up']) != len(manager.get_osd_status()['raw']):
-        time.sleep(10)
-    while len(manager.get_osd_status()['in']) != len(manager.get_osd_status()['up']):
+    osds = manager.get_osd_state_table()
+    while osds.select(clear_bits=osds.UP) or osds.select(clear_bits=osds.IN):
         time.sleep(10)
+        osds = manager.get_osd_state_table()
     manager.raw_cluster_cmd('osd', 'set', 'noout')
     manager.raw_cluster_cmd('osd', 'set', 'nodown')
 
@@ -225,11 +225,10 @@ def task(ctx, config):
     ERRORS += cod_setup(log, ctx, cli_remote, NUM_OBJECTS, DATADIR, REP_NAME, DATALINECOUNT, REP_POOL, db)
 
     pgs = {}
-    jsontext = manager.raw_cluster_cmd('pg', 'dump_json')
-    pgdump = json.loads(jsontext)
-    PGS = [str(p["pgid"]) for p in pgdump["pg_stats"] if p["pgid"].find(str(REPID) + ".") == 0]
-    for stats in pgdump["pg_stats"]:
-        if stats["pgid"] in PGS:
+    PGS = []
+    for stats in manager.iter_pg_stats(fields=('pgid', 'acting')):
+        if stats["pgid"].find(str(REPID) + ".") == 0:
+            PGS.append(str(stats["pgid"]))
             for osd in stats["acting"]:
                 if not pgs.has_key(osd):
                     pgs[osd] = []
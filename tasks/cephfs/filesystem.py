@@ -2,12 +2,12 @@
 from StringIO import StringIO
 import json
 import logging
-import time
 
 from teuthology import misc
 from teuthology.nuke import clear_firewall
 from teuthology.parallel import parallel
 from tasks import ceph_manager
+from tasks.util.wait import Waiter, get_wait_report
 
 
 log = logging.getLogger(__name__)
@@ -71,16 +71,11 @@ class Filesystem(object):
         if timeout is None:
             timeout = DAEMON_WAIT_TIMEOUT
 
-        elapsed = 0
-        while True:
-            if self.are_daemons_healthy():
-                return
-            else:
-                time.sleep(1)
-                elapsed += 1
-
-            if elapsed > timeout:
-                raise RuntimeError("Timed out waiting for MDS daemons to become healthy")
+        waiter = Waiter('filesystem.wait_for_daemons', self.are_daemons_healthy,
+                        timeout=timeout, interval=0.25, max_interval=1, backoff=2,
+                        report=get_wait_report(self._ctx))
+        if not waiter.wait():
+            raise RuntimeError("Timed out waiting for MDS daemons to become healthy")
 
     def get_lone_mds_id(self):
         if len(self.mds_ids) != 1:
@@ -230,22 +225,25 @@ class Filesystem(object):
         if mds_id is None:
             mds_id = self.get_lone_mds_id()
 
-        elapsed = 0
-        while True:
+        states = []
+
+        def reached():
             # mds_info is None if no daemon currently claims this rank
             mds_info = self.mon_manager.get_mds_status(mds_id)
             current_state = mds_info['state'] if mds_info else None
-
-            if current_state == goal_state:
-                log.info("reached state '{0}' in {1}s".format(current_state, elapsed))
-                return elapsed
-            elif reject is not None and current_state == reject:
+            states.append(current_state)
+            if reject is not None and current_state == reject:
                 raise RuntimeError("MDS in reject state {0}".format(current_state))
-            elif timeout is not None and elapsed > timeout:
-                raise RuntimeError(
-                    "Reached timeout after {0} seconds waiting for state {1}, while in state {2}".format(
-                    elapsed, goal_state, current_state
-                ))
-            else:
-                time.sleep(1)
-                elapsed += 1
+            return current_state == goal_state
+
+        waiter = Waiter('filesystem.wait_for_state', reached, timeout=timeout,
+                        interval=0.25, max_interval=1, backoff=2,
+                        report=get_wait_report(self._ctx))
+        if not waiter.wait():
+            raise RuntimeError(
+                "Reached timeout after {0} seconds waiting for state {1}, while in state {2}".format(
+                int(waiter.elapsed), goal_state, states[-1]
+            ))
+        elapsed = int(waiter.elapsed)
+        log.info("reached state '{0}' in {1}s".format(goal_state, elapsed))
+        return elapsed
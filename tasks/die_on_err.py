@@ -8,6 +8,7 @@ from teuthology.orchestra import run
 
 import ceph_manager
 from teuthology import misc as teuthology
+from util.roles import get_role_index
 
 log = logging.getLogger(__name__)
 
@@ -37,8 +38,9 @@ def task(ctx, config):
     testdir = teuthology.get_testdir(ctx)
 
     while True:
+        roles = get_role_index(ctx)
         for i in range(num_osds):
-            (osd_remote,) = ctx.cluster.only('osd.%d' % i).remotes.iterkeys()
+            osd_remote = roles.find('osd', i)
             p = osd_remote.run(
                 args = [ 'test', '-e', '{tdir}/err'.format(tdir=testdir) ],
                 wait=True,
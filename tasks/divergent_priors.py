@@ -44,8 +44,7 @@ def task(ctx, config):
     ctx.manager.raw_cluster_cmd('osd', 'pool', 'create', 'foo', '1')
 
     osds = [0, 1, 2]
-    for i in osds:
-        ctx.manager.set_config(i, osd_min_pg_log_entries=1)
+    ctx.manager.set_config_many(osds, osd_min_pg_log_entries=1)
 
     # determine primary
     divergent = ctx.manager.get_pg_primary('foo', 0)
@@ -62,8 +61,7 @@ def task(ctx, config):
 
     # blackhole non_divergent
     log.info("blackholing osds %s", str(non_divergent))
-    for i in non_divergent:
-        ctx.manager.set_config(i, filestore_blackhole='')
+    ctx.manager.set_config_many(non_divergent, filestore_blackhole='')
 
     # write 1 (divergent) object
     log.info('writing divergent object existing_0')
@@ -93,8 +91,7 @@ def task(ctx, config):
         ctx.manager.mark_in_osd(i)
 
     log.info('making log long to prevent backfill')
-    for i in non_divergent:
-        ctx.manager.set_config(i, osd_min_pg_log_entries=100000)
+    ctx.manager.set_config_many(non_divergent, osd_min_pg_log_entries=100000)
 
     # write 1 non-divergent object (ensure that old divergent one is divergent)
     log.info('writing non-divergent object existing_1')
@@ -104,8 +101,8 @@ def task(ctx, config):
 
     # ensure no recovery
     log.info('delay recovery')
-    for i in non_divergent:
-        ctx.manager.set_config(i, osd_recovery_delay_start=100000)
+    ctx.manager.set_config_many(non_divergent,
+                                osd_recovery_delay_start=100000)
 
     # bring in our divergent friend
     log.info("revive divergent %d", divergent)
@@ -128,8 +125,7 @@ def task(ctx, config):
     ctx.manager.revive_osd(divergent)
 
     log.info('allowing recovery')
-    for i in non_divergent:
-        ctx.manager.set_config(i, osd_recovery_delay_start=0)
+    ctx.manager.set_config_many(non_divergent, osd_recovery_delay_start=0)
 
     log.info('reading existing_0')
     exit_status = rados(ctx, mon,
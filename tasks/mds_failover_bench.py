@@ -0,0 +1,275 @@
+"""
+MDS failover latency benchmark
+"""
+import contextlib
+import json
+import logging
+import os
+import random
+import time
+from textwrap import dedent
+
+import ceph_manager
+from teuthology import misc as teuthology
+from util.failover import (FailoverStats, INTERVALS, replacement,
+                           standby_replay_configured, takeover_mode)
+from util.mdsmap import MDSMapWatcher, mds_info
+from util.roles import get_role_index
+from util.wait import get_wait_report
+
+log = logging.getLogger(__name__)
+
+STEADY_STATES = ['up:active', 'up:standby', 'up:standby-replay']
+
+
+class ClientLoad(object):
+    """
+    Keep the given mounts busy writing and fsyncing small files until
+    stop() is called.
+    """
+    def __init__(self, mounts):
+        self.mounts = mounts
+        self.procs = []
+
+    def start(self):
+        """
+        Start one writer per mount.
+        """
+        for mount in self.mounts:
+            path = os.path.join(mount.mountpoint,
+                                'failover_bench.{id}'.format(
+                                    id=mount.client_id))
+            pyscript = dedent("""
+                import os
+                import itertools
+
+                if not os.path.exists("{path}"):
+                    os.mkdir("{path}")
+                data = 'x' * 65536
+                for i in itertools.count():
+                    f = open(os.path.join("{path}", str(i % 64)), 'w')
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+                    f.close()
+                """).format(path=path)
+            log.info('starting client load on client.{id}'.format(
+                id=mount.client_id))
+            self.procs.append(mount._run_python(pyscript))
+
+    def stop(self):
+        """
+        Stop the writers; daemon-helper kills them once stdin closes.
+        """
+        for proc in self.procs:
+            proc.stdin.close()
+        for proc in self.procs:
+            try:
+                proc.wait()
+            except Exception:
+                log.debug('client load exited', exc_info=True)
+        self.procs = []
+
+
+class MDSFailoverBench(object):
+    """
+    Kill the active mds over and over and time each failover from the
+    mdsmap.
+    """
+    def __init__(self, ctx, manager, watcher, config):
+        self.ctx = ctx
+        self.manager = manager
+        self.watcher = watcher
+        self.config = config
+        self.iterations = int(config.get('iterations', 10))
+        self.revive_delay = float(config.get('revive_delay', 2))
+        self.settle_delay = float(config.get('settle_delay', 5))
+        self.timeout = float(config.get('timeout', 300))
+        self.rng = random.Random(config.get('seed', int(time.time())))
+        self.stats = FailoverStats()
+
+    def wait_for(self, name, predicate):
+        """
+        Wait for predicate(mdsmap).
+
+        :returns: when it was first seen to hold, and the map it held for
+        """
+        mdsmap = self.watcher.wait_for('mds_failover_bench.' + name,
+                                       predicate, timeout=self.timeout)
+        assert mdsmap is not None, \
+            'timed out after {t}s waiting for {n}'.format(
+                t=self.timeout, n=name)
+        return (time.time(), mdsmap)
+
+    def steady(self, mdsmap):
+        """
+        :returns: whether every mds is active or standing by
+        """
+        infos = mdsmap['info'].values()
+        return infos and all([i['state'] in STEADY_STATES for i in infos])
+
+    def failover(self):
+        """
+        Kill a random active mds, wait for the replacement and revive
+        the killed one.
+
+        :returns: the standby mode of the replacement and the intervals
+        """
+        before = self.watcher.current()
+        actives = [i for i in before['info'].itervalues()
+                   if i['state'] == 'up:active']
+        active = self.rng.choice(actives)
+        name = active['name']
+        rank = active['rank']
+
+        log.info('killing mds.{n} (rank {r})'.format(n=name, r=rank))
+        self.manager.kill_mds(name)
+        killed = time.time()
+
+        def failed(mdsmap):
+            status = mds_info(mdsmap, name)
+            return status is None or 'laggy_since' in status or \
+                rank in mdsmap['failed']
+        (failed_at, _) = self.wait_for('failed', failed)
+
+        def replaced(mdsmap):
+            return replacement(mdsmap, rank, name) is not None
+        (active_at, mdsmap) = self.wait_for('active', replaced)
+        successor = replacement(mdsmap, rank, name)['name']
+        mode = takeover_mode(before, successor)
+        log.info('mds.{s} ({m}) took over rank {r}'.format(
+            s=successor, m=mode, r=rank))
+
+        time.sleep(self.revive_delay)
+        log.info('reviving mds.{n}'.format(n=name))
+        self.manager.revive_mds(name)
+        revived = time.time()
+
+        def standby(mdsmap):
+            status = mds_info(mdsmap, name)
+            return status is not None and \
+                status['state'] in ('up:standby', 'up:standby-replay')
+        (standby_at, _) = self.wait_for('standby', standby)
+
+        intervals = {
+            'kill_to_failed': failed_at - killed,
+            'failed_to_active': active_at - failed_at,
+            'kill_to_active': active_at - killed,
+            'revive_to_standby': standby_at - revived,
+            }
+        log.info('mds.{n} failover ({m}): {i}'.format(
+            n=name, m=mode, i=', '.join(['{k} {v:.2f}s'.format(
+                k=k, v=intervals[k]) for k in INTERVALS])))
+        return (mode, intervals)
+
+    def run(self):
+        """
+        Run the iterations.
+        """
+        for i in range(self.iterations):
+            self.wait_for('steady', self.steady)
+            time.sleep(self.settle_delay)
+            log.info('failover {i} of {n}'.format(i=i + 1, n=self.iterations))
+            (mode, intervals) = self.failover()
+            self.stats.add(mode, intervals)
+
+    def report(self):
+        """
+        Store the results in ctx.summary and the archive.
+        """
+        results = {
+            'standby_replay': standby_replay_configured(self.ctx),
+            'failovers': self.stats.summary(),
+            }
+        log.info('mds failover latencies: {r}'.format(r=results))
+        if getattr(self.ctx, 'summary', None) is not None:
+            self.ctx.summary['mds_failover'] = results
+        if getattr(self.ctx, 'archive', None) is not None:
+            results = dict(results)
+            results['samples'] = self.stats.samples
+            with file(os.path.join(self.ctx.archive,
+                                   'mds_failover.json'), 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+
+
+@contextlib.contextmanager
+def task(ctx, config):
+    """
+    Measure how long mds failovers take.
+
+    Repeatedly kills a random active mds and times, from the mdsmap:
+
+    - kill_to_failed: kill until the mds is laggy, failed or removed
+    - failed_to_active: from then until another mds is up:active for
+      its rank
+    - kill_to_active: the whole failover
+    - revive_to_standby: restarting the killed mds until it is
+      up:standby or up:standby-replay
+
+    The mdsmap epoch is polled every poll_interval seconds while
+    waiting, so the intervals have sub-second resolution.  Results are
+    grouped by whether the mds that took over was in standby-replay,
+    and reported with the 'mds standby replay' setting of the job in
+    ctx.summary under mds_failover and in mds_failover.json in the
+    archive, which also has every sample.
+
+    The config is optional:
+
+    iterations: [default: 10] number of failovers
+    revive_delay: [default: 2] seconds to wait after a takeover before
+      reviving the killed mds
+    settle_delay: [default: 5] seconds to wait once all mdses are
+      active or standing by before the next kill
+    poll_interval: [default: 0.1] seconds between mdsmap epoch polls
+    timeout: [default: 300] seconds to wait for each state
+    seed: seed for choosing which active mds to kill
+    clients: list of clients (e.g. [client.0]) whose ceph-fuse or
+      kernel mounts keep writing and fsyncing files during the
+      failovers, or 'all'
+
+    Example::
+
+      tasks:
+      - ceph:
+      - ceph-fuse:
+      - mds_failover_bench:
+          iterations: 20
+          clients: all
+    """
+    if config is None:
+        config = {}
+    assert isinstance(config, dict), \
+        'mds_failover_bench task only accepts a dict for configuration'
+    mdslist = list(teuthology.all_roles_of_type(ctx.cluster, 'mds'))
+    assert len(mdslist) > 1, \
+        'mds_failover_bench task requires at least 2 metadata servers'
+
+    first = get_role_index(ctx).find('mds', mdslist[0])
+    manager = ceph_manager.CephManager(
+        first, ctx=ctx, logger=log.getChild('ceph_manager'),
+    )
+    watcher = MDSMapWatcher(manager.get_mds_epoch, manager.get_mds_status_all,
+                            interval=float(config.get('poll_interval', 0.1)),
+                            report=get_wait_report(ctx))
+    watcher.start()
+
+    mounts = []
+    clients = config.get('clients')
+    if clients:
+        all_mounts = getattr(ctx, 'mounts', {})
+        if clients == 'all':
+            mounts = all_mounts.values()
+        else:
+            mounts = [all_mounts[teuthology.get_clients(ctx, [c]).next()[0]]
+                      for c in clients]
+    load = ClientLoad(mounts)
+
+    bench = MDSFailoverBench(ctx, manager, watcher, config)
+    load.start()
+    try:
+        bench.run()
+    finally:
+        load.stop()
+        watcher.stop()
+        bench.report()
+    yield
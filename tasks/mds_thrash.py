@@ -9,6 +9,9 @@ import time
 from gevent.greenlet import Greenlet
 from gevent.event import Event
 from teuthology import misc as teuthology
+from util.mdsmap import MDSMapWatcher, mds_info
+from util.roles import get_role_index
+from util.wait import get_wait_report
 
 log = logging.getLogger(__name__)
 
@@ -42,6 +45,10 @@ class MDSThrasher(Greenlet):
     max_replay_thrash_delay: [default: 4] maximum number of seconds to delay while in
       the replay state before thrashing
 
+    mdsmap_poll_interval: [default: 0.5] seconds between polls of the mdsmap
+      epoch while a thrasher waits for an mds state change.  All failure groups
+      share one watcher, which only fetches the full mdsmap when the epoch changes.
+
     thrash_weights: allows specific MDSs to be thrashed more/less frequently.  This option
       overrides anything specified by max_thrash.  This option is a dict containing
       mds.x: weight pairs.  For example, [mds.a: 0.7, mds.b: 0.3, mds.c: 0.0].  Each weight
@@ -82,11 +89,13 @@ class MDSThrasher(Greenlet):
 
     """
 
-    def __init__(self, ctx, manager, config, logger, failure_group, weight):
+    def __init__(self, ctx, manager, config, logger, failure_group, weight,
+                 watcher):
         super(MDSThrasher, self).__init__()
 
         self.ctx = ctx
         self.manager = manager
+        self.watcher = watcher
         assert self.manager.is_clean()
 
         self.stopping = Event()
@@ -122,6 +131,22 @@ class MDSThrasher(Greenlet):
     def stop(self):
         self.stopping.set()
 
+    def wait_until(self, name, predicate):
+        """
+        Wait until predicate holds for the mdsmap; it is checked once
+        for each new map the shared watcher fetches.
+
+        :returns: the map the predicate held for
+        """
+        return self.watcher.wait_for('mds_thrash.' + name, predicate,
+                                     log_after=10)
+
+    def group_statuses(self, mdsmap):
+        """
+        :returns: the infos of the failure group's mdses in mdsmap
+        """
+        return [mds_info(mdsmap, m) for m in self.failure_group]
+
     def do_thrash(self):
         """
         Perform the random thrashing action
@@ -146,7 +171,7 @@ class MDSThrasher(Greenlet):
                 continue
 
             # find the active mds in the failure group
-            statuses = [self.manager.get_mds_status(m) for m in self.failure_group]
+            statuses = self.group_statuses(self.watcher.current())
             actives = filter(lambda s: s and s['state'] == 'up:active', statuses)
             assert len(actives) == 1, 'Can only have one active in a failure group'
 
@@ -157,25 +182,20 @@ class MDSThrasher(Greenlet):
             self.manager.kill_mds_by_rank(active_rank)
 
             # wait for mon to report killed mds as crashed
-            last_laggy_since = None
-            itercount = 0
-            while True:
-                failed = self.manager.get_mds_status_all()['failed']
-                status = self.manager.get_mds_status(active_mds)
-                if not status:
-                    break
-                if 'laggy_since' in status:
-                    last_laggy_since = status['laggy_since']
-                    break
+            def mds_down(mdsmap):
+                failed = mdsmap['failed']
+                status = mds_info(mdsmap, active_mds)
+                if not status or 'laggy_since' in status:
+                    return True
                 if any([(f == active_mds) for f in failed]):
-                    break
+                    return True
                 self.log(
                     'waiting till mds map indicates mds.{_id} is laggy/crashed, in failed state, or mds.{_id} is removed from mdsmap'.format(
                         _id=active_mds))
-                itercount = itercount + 1
-                if itercount > 10:
-                    self.log('mds map: {status}'.format(status=self.manager.get_mds_status_all()))
-                time.sleep(2)
+                return False
+            status = mds_info(self.wait_until('mds_down', mds_down),
+                              active_mds)
+            last_laggy_since = status and status.get('laggy_since')
             if last_laggy_since:
                 self.log(
                     'mds.{_id} reported laggy/crashed since: {since}'.format(_id=active_mds, since=last_laggy_since))
@@ -183,20 +203,14 @@ class MDSThrasher(Greenlet):
                 self.log('mds.{_id} down, removed from mdsmap'.format(_id=active_mds, since=last_laggy_since))
 
             # wait for a standby mds to takeover and become active
-            takeover_mds = None
-            takeover_rank = None
-            itercount = 0
-            while True:
-                statuses = [self.manager.get_mds_status(m) for m in self.failure_group]
+            def group_actives(mdsmap):
+                statuses = self.group_statuses(mdsmap)
                 actives = filter(lambda s: s and s['state'] == 'up:active', statuses)
-                if len(actives) > 0:
-                    assert len(actives) == 1, 'Can only have one active in failure group'
-                    takeover_mds = actives[0]['name']
-                    takeover_rank = actives[0]['rank']
-                    break
-                itercount = itercount + 1
-                if itercount > 10:
-                    self.log('mds map: {status}'.format(status=self.manager.get_mds_status_all()))
+                assert len(actives) <= 1, 'Can only have one active in failure group'
+                return actives
+            actives = group_actives(self.wait_until('takeover', group_actives))
+            takeover_mds = actives[0]['name']
+            takeover_rank = actives[0]['rank']
 
             self.log('New active mds is mds.{_id}'.format(_id=takeover_mds))
 
@@ -213,14 +227,14 @@ class MDSThrasher(Greenlet):
             self.log('reviving mds.{id}'.format(id=active_mds))
             self.manager.revive_mds(active_mds, standby_for_rank=takeover_rank)
 
-            status = {}
-            while True:
-                status = self.manager.get_mds_status(active_mds)
+            def standby(mdsmap):
+                status = mds_info(mdsmap, active_mds)
                 if status and (status['state'] == 'up:standby' or status['state'] == 'up:standby-replay'):
-                    break
+                    return True
                 self.log(
                     'waiting till mds map indicates mds.{_id} is in standby or standby-replay'.format(_id=active_mds))
-                time.sleep(2)
+                return False
+            status = mds_info(self.wait_until('standby', standby), active_mds)
             self.log('mds.{_id} reported in {state} state'.format(_id=active_mds, state=status['state']))
 
             # don't do replay thrashing right now
@@ -276,7 +290,7 @@ def task(ctx, config):
     max_thrashers = config.get('max_thrash', 1)
     thrashers = {}
 
-    (first,) = ctx.cluster.only('mds.{_id}'.format(_id=mdslist[0])).remotes.iterkeys()
+    first = get_role_index(ctx).find('mds', mdslist[0])
     manager = ceph_manager.CephManager(
         first, ctx=ctx, logger=log.getChild('ceph_manager'),
     )
@@ -286,7 +300,8 @@ def task(ctx, config):
     statuses = None
     statuses_by_rank = None
     while True:
-        statuses = {m: manager.get_mds_status(m) for m in mdslist}
+        mdsmap = manager.get_mds_status_all()
+        statuses = {m: mds_info(mdsmap, m) for m in mdslist}
         statuses_by_rank = {}
         for _, s in statuses.iteritems():
             if isinstance(s, dict):
@@ -315,6 +330,10 @@ def task(ctx, config):
                 failure_groups[active].append(r)
 
     manager.wait_for_clean()
+    watcher = MDSMapWatcher(manager.get_mds_epoch, manager.get_mds_status_all,
+                            interval=float(config.get('mdsmap_poll_interval', 0.5)),
+                            report=get_wait_report(ctx))
+    watcher.start()
     for (active, standbys) in failure_groups.iteritems():
         weight = 1.0
         if 'thrash_weights' in config:
@@ -331,7 +350,8 @@ def task(ctx, config):
             )
             ),
             failure_group=failure_group,
-            weight=weight)
+            weight=weight,
+            watcher=watcher)
         thrasher.start()
         thrashers[active] = thrasher
 
@@ -349,4 +369,6 @@ def task(ctx, config):
             log.info('join thrasher for failure group [{fg}]'.format(fg=', '.join(failure_group)))
             thrashers[t].stop()
             thrashers[t].join()
+        watcher.stop()
+        log.info('mdsmap watcher: {s}'.format(s=watcher.stats))
         log.info('done joining')
@@ -7,9 +7,13 @@ import ceph_manager
 import random
 import time
 import gevent
+from gevent.event import AsyncResult
 import json
 import math
+import os
 from teuthology import misc as teuthology
+from util.elections import ElectionStats
+from util.roles import get_role_index
 
 log = logging.getLogger(__name__)
 
@@ -59,6 +63,21 @@ class MonitorThrasher:
                         in % (default: 0)
     freeze_mon_duration: how many seconds to freeze the mon (default: 15)
     scrub               Scrub after each iteration (default: True)
+    election_poll_interval: seconds between mon_status polls of each
+                        monitor's admin socket while waiting for a new
+                        quorum (default: 0.1); each poll also takes the
+                        time to run the ceph CLI on the monitor's host
+    election_timeout    seconds to wait for a new quorum before counting
+                        an election as timed out (default: 300)
+
+    Every kill, revive and freeze is timed from the last step disrupting
+    the quorum (the last kill or revive, or the unfreeze if monitors were
+    frozen as well) until a monitor reports a quorum of the expected
+    size from a newer election.  The surviving monitors are polled in
+    parallel.  Latency distributions per event (kill, kill_freeze,
+    revive, revive_freeze, with a _store_thrashed suffix when a store
+    was thrashed) and the store_thrash setting go to ctx.summary under
+    mon_elections, and the samples to mon_elections.json in the archive.
 
     Note: if 'store-thrash' is set to True, then 'maintain-quorum' must also
           be set to True.
@@ -127,6 +146,13 @@ class MonitorThrasher:
             assert self.maintain_quorum, \
                 'store_thrash = true must imply maintain_quorum = true'
 
+        """ Election latency """
+        self.election_poll_interval = float(
+            self.config.get('election_poll_interval', 0.1))
+        self.election_timeout = float(
+            self.config.get('election_timeout', 300))
+        self.elections = ElectionStats(self.store_thrash)
+
         self.thread = gevent.spawn(self.do_thrash)
 
     def log(self, x):
@@ -200,6 +226,72 @@ class MonitorThrasher:
         self.log('reviving mon.{id}'.format(id=mon))
         self.manager.revive_mon(mon)
 
+    def wait_for_election(self, event, start, mons, size, epoch,
+                          store_thrashed=False):
+        """
+        Poll mon_status on mons in parallel until one of them reports a
+        quorum of size elected after epoch, and record the time since
+        start as an election of type event.
+
+        mon_status is read through each monitor's admin socket, which
+        works without a quorum and leaves the cluster state cache
+        alone.  Each poll still starts a 'ceph --admin-daemon' process
+        on the monitor's host, so the latencies are only accurate to
+        about the time that takes plus election_poll_interval.
+
+        :returns: the new election epoch, or epoch if none was seen
+                  before election_timeout
+        """
+        found = AsyncResult()
+
+        def poll(mon):
+            """
+            Poll one monitor until a new quorum is found.
+            """
+            while not found.ready():
+                s = None
+                try:
+                    proc = self.manager.admin_socket(
+                        'mon', mon, ['mon_status'], check_status=False)
+                    if proc.exitstatus == 0:
+                        s = json.loads(proc.stdout.getvalue())
+                except Exception:
+                    pass
+                if s is not None and s['election_epoch'] > epoch and \
+                        len(s['quorum']) == size and \
+                        s['state'] in ('leader', 'peon') and \
+                        not found.ready():
+                    found.set((time.time(), s['election_epoch']))
+                    return
+                time.sleep(self.election_poll_interval)
+
+        greenlets = [gevent.spawn(poll, mon) for mon in mons]
+        try:
+            (end, new_epoch) = found.get(timeout=self.election_timeout)
+        except gevent.Timeout:
+            self.log('{e}: no new quorum of {n} after {t}s'.format(
+                e=event, n=size, t=self.election_timeout))
+            self.elections.add(event, 0, store_thrashed, timed_out=True)
+            return epoch
+        finally:
+            gevent.killall(greenlets)
+        self.log('{e}: quorum of {n} elected (epoch {ep}) after {t:.2f}s'.format(
+            e=event, n=size, ep=new_epoch, t=end - start))
+        self.elections.add(event, end - start, store_thrashed)
+        return new_epoch
+
+    def report(self):
+        """
+        Store the election latencies in ctx.summary and the archive.
+        """
+        summary = self.elections.summary()
+        self.log('election latencies: {s}'.format(s=summary))
+        if getattr(self.ctx, 'summary', None) is not None:
+            self.ctx.summary['mon_elections'] = summary
+        if getattr(self.ctx, 'archive', None) is not None:
+            self.elections.write(
+                os.path.join(self.ctx.archive, 'mon_elections.json'))
+
     def max_killable(self):
         """
         Return the maximum number of monitors we can kill.
@@ -229,10 +321,12 @@ class MonitorThrasher:
             mons = _get_mons(self.ctx)
             self.manager.wait_for_mon_quorum_size(len(mons))
             self.log('making sure all monitors are in the quorum')
+            epoch = 0
             for m in mons:
                 s = self.manager.get_mon_status(m)
                 assert s['state'] == 'leader' or s['state'] == 'peon'
                 assert len(s['quorum']) == len(mons)
+                epoch = max(epoch, s['election_epoch'])
 
             kill_up_to = self.rng.randrange(1, self.max_killable()+1)
             mons_to_kill = self.rng.sample(mons, kill_up_to)
@@ -246,15 +340,19 @@ class MonitorThrasher:
                     mons_to_freeze.append(mon)
             self.log('monitors to freeze: {m}'.format(m=mons_to_freeze))
 
+            store_thrashed = False
             for mon in mons_to_kill:
                 self.log('thrashing mon.{m}'.format(m=mon))
 
                 """ we only thrash stores if we are maintaining quorum """
                 if self.should_thrash_store() and self.maintain_quorum:
                     self.thrash_store(mon)
+                    store_thrashed = True
 
                 self.kill_mon(mon)
+            start = time.time()
 
+            event = 'kill'
             if mons_to_freeze:
                 for mon in mons_to_freeze:
                     self.freeze_mon(mon)
@@ -263,8 +361,14 @@ class MonitorThrasher:
                 time.sleep(self.freeze_mon_duration)
                 for mon in mons_to_freeze:
                     self.unfreeze_mon(mon)
+                start = time.time()
+                event = 'kill_freeze'
 
             if self.maintain_quorum:
+                survivors = [m for m in mons if m not in mons_to_kill]
+                epoch = self.wait_for_election(
+                    event, start, survivors, len(survivors), epoch,
+                    store_thrashed)
                 self.manager.wait_for_mon_quorum_size(len(mons)-len(mons_to_kill))
                 for m in mons:
                     if m in mons_to_kill:
@@ -279,6 +383,8 @@ class MonitorThrasher:
 
             for mon in mons_to_kill:
                 self.revive_mon(mon)
+            start = time.time()
+            event = 'revive'
             # do more freezes
             if mons_to_freeze:
                 for mon in mons_to_freeze:
@@ -288,7 +394,11 @@ class MonitorThrasher:
                 time.sleep(self.freeze_mon_duration)
                 for mon in mons_to_freeze:
                     self.unfreeze_mon(mon)
+                start = time.time()
+                event = 'revive_freeze'
 
+            self.wait_for_election(event, start, mons, len(mons), epoch,
+                                   store_thrashed)
             self.manager.wait_for_mon_quorum_size(len(mons))
             for m in mons:
                 s = self.manager.get_mon_status(m)
@@ -307,6 +417,8 @@ class MonitorThrasher:
                     delay=self.thrash_delay))
                 time.sleep(self.thrash_delay)
 
+        self.report()
+
 @contextlib.contextmanager
 def task(ctx, config):
     """
@@ -324,7 +436,7 @@ def task(ctx, config):
         'mon_thrash task requires at least 3 monitors'
     log.info('Beginning mon_thrash...')
     first_mon = teuthology.get_first_mon(ctx, config)
-    (mon,) = ctx.cluster.only(first_mon).remotes.iterkeys()
+    mon = get_role_index(ctx).remote(first_mon)
     manager = ceph_manager.CephManager(
         mon,
         ctx=ctx,
@@ -142,10 +142,7 @@ def test_incomplete_pgs(ctx, config):
 
     log.info('Testing incomplete pgs...')
 
-    for i in range(4):
-        manager.set_config(
-            i,
-            osd_recovery_delay_start=1000)
+    manager.set_config_many(range(4), osd_recovery_delay_start=1000)
 
     # move data off of osd.0, osd.1
     manager.raw_cluster_cmd('osd', 'out', '0', '1')
@@ -3,12 +3,12 @@ Rest Api
 """
 import logging
 import contextlib
-import time
 
 from teuthology import misc as teuthology
 from teuthology import contextutil
 from teuthology.orchestra import run
 from teuthology.orchestra.daemon import DaemonGroup
+from util.wait import Waiter, get_wait_report
 
 log = logging.getLogger(__name__)
 
@@ -40,8 +40,8 @@ def run_rest_api_daemon(ctx, api_clients):
                     stdin=run.PIPE,
                     wait=False,
                     )
-                for i in range(1, 12):
-                    log.info('testing for ceph-rest-api try {0}'.format(i))
+                def api_up():
+                    log.info('testing for ceph-rest-api')
                     run_cmd = [
                         'wget',
                         '-O',
@@ -53,10 +53,11 @@ def run_rest_api_daemon(ctx, api_clients):
                         args=run_cmd,
                         check_status=False
                     )
-                    if proc.exitstatus == 0:
-                        break
-                    time.sleep(5)
-                if proc.exitstatus != 0:
+                    return proc.exitstatus == 0
+                waiter = Waiter('rest_api.start', api_up, timeout=55,
+                                interval=0.5, max_interval=5, backoff=2,
+                                report=get_wait_report(ctx))
+                if not waiter.wait():
                     raise RuntimeError('Cannot contact ceph-rest-api')
     try:
         yield
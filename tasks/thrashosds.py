@@ -2,13 +2,70 @@
 Thrash -- Simulate random osd failures.
 """
 import contextlib
+import functools
 import logging
+import os
 import ceph_manager
 from teuthology import misc as teuthology
+from teuthology.parallel import parallel
+from util.powercycle import FakeConsole
 
 
 log = logging.getLogger(__name__)
 
+
+def setup_console(ctx, t):
+    """
+    Attach the IPMI console of target t to its remote, if the console
+    answers.
+    """
+    host = t.split('@')[-1]
+    shortname = host.split('.')[0]
+    from teuthology.orchestra import remote as oremote
+    console = oremote.getRemoteConsole(
+        name=host,
+        ipmiuser=ctx.teuthology_config['ipmi_user'],
+        ipmipass=ctx.teuthology_config['ipmi_password'],
+        ipmidomain=ctx.teuthology_config['ipmi_domain'])
+    cname = '{host}.{domain}'.format(
+        host=shortname,
+        domain=ctx.teuthology_config['ipmi_domain'])
+    log.debug('checking console status of %s' % cname)
+    if not console.check_status():
+        log.info(
+            'Failed to get console status for '
+            '%s, disabling console...'
+            % cname)
+        return
+    # find the remote for this console and add it
+    remotes = [
+        r for r in ctx.cluster.remotes.keys() if r.name == t]
+    if len(remotes) != 1:
+        raise Exception(
+            'Too many (or too few) remotes '
+            'found for target {t}'.format(t=t))
+    remotes[0].console = console
+    log.debug('console ready on %s' % cname)
+
+
+def fake_power_off(ctx, remote):
+    """
+    What powering off does to a host, for FakeConsole: stop the daemons
+    running on it and unmount the osd data directories.
+    """
+    for role in ctx.cluster.remotes[remote]:
+        (type_, _, id_) = role.partition('.')
+        daemon = ctx.daemons.get_daemon(type_, id_)
+        if daemon is not None and daemon.running():
+            daemon.stop()
+        if type_ == 'osd' and \
+                id_ in ctx.disk_config.remote_to_roles_to_dev.get(remote, {}):
+            remote.run(args=[
+                    'sudo', 'umount',
+                    os.path.join('/var/lib/ceph/osd',
+                                 'ceph-{id}'.format(id=id_)),
+                    ])
+
 @contextlib.contextmanager
 def task(ctx, config):
     """
@@ -87,6 +144,10 @@ def task(ctx, config):
     powercycle: (false) whether to power cycle the node instead
         of just the osd process. Note that this assumes that a single
         osd is the only important process on the node.
+    fake_console: (false) with powercycle, give every node a stand-in
+        console that stops the node's daemons and unmounts its osd
+        data instead of cutting power, to exercise powercycle runs
+        without IPMI.
 
     chance_test_backfill_full: (0) chance to simulate full disks stopping
         backfill
@@ -94,8 +155,55 @@ def task(ctx, config):
     chance_test_map_discontinuity: (0) chance to test map discontinuity
     map_discontinuity_sleep_time: (40) time to wait for map trims
 
+    max_concurrent_actions: (1) when above 1, kill/revive/out/in actions
+       apply to a random batch of up to this many osds at once (still
+       honoring min_in, min_out, min_live and min_dead), run in parallel.
+       Dead osds are also revived in batches of this size before waiting
+       for clean.
+
     ceph_objectstore_tool: (true) whether to export/import a pg while an osd is down
     chance_move_pg: (1.0) chance of moving a pg if more than 1 osd is down (default 100%)
+    objectstore_tool_rate: (1.0) fraction of osd kills followed by a
+       ceph_objectstore_tool run.  Runs happen in the background; an osd
+       is only revived once the runs using it have finished.
+    objectstore_tool_concurrency: (2) number of ceph_objectstore_tool runs
+       in flight at once; kills while that many are running skip theirs
+    objectstore_tool_budget: (0) bytes of pg exports allowed between two
+       waits for clean; further runs are skipped.  0 means no limit.
+
+    actions_per_minute: (none) start this many thrash actions per minute
+       (the time an action takes counts against the interval) instead of
+       sleeping op_delay after each one
+    failures_per_minute: (none) most osd kills and outs per minute,
+       counting each osd of a batch; when none are left the other actions
+       are chosen instead
+    plugins: list of python modules adding thrash actions.  Each module
+       has a register_thrash_actions(thrasher, policy) function calling
+       policy.register(name, func, weight, available=None, failure=False)
+       for each of its actions; func takes no arguments and available,
+       if given, returns whether the action may run now.  Plugin actions
+       are recorded in the schedule by name; replaying them needs the
+       same plugins.
+
+    seed: (current time) seed of the thrasher's random number generator;
+       it is logged at startup
+
+    replay: path of a thrash_schedule.jsonl written by an earlier run (or
+       an inline list of its steps).  The recorded steps are executed
+       back to back instead of choosing random actions; op_delay gaps
+       are skipped while waits for recovery/clean and the sleeps that
+       are part of a test sequence are kept.
+
+    Every step the thrasher takes (action, arguments, seconds since
+    start) is logged and written to thrash_schedule.jsonl in the archive,
+    for use with replay.  ceph_objectstore_tool runs are not part of the
+    schedule.
+
+    Every thrash action is recorded with its start and end time, the
+    osds it touched and the time until the next wait for recovery/clean
+    completed.  The per-action summary goes to ctx.summary under
+    thrash_actions and the full timeline to thrash_timeline.jsonl in the
+    archive.
 
     example:
 
@@ -119,36 +227,16 @@ def task(ctx, config):
         log.info('Doing preliminary sync to avoid collateral damage...')
         ctx.cluster.run(args=['sync'])
 
-        if 'ipmi_user' in ctx.teuthology_config:
-            for t, key in ctx.config['targets'].iteritems():
-                host = t.split('@')[-1]
-                shortname = host.split('.')[0]
-                from teuthology.orchestra import remote as oremote
-                console = oremote.getRemoteConsole(
-                    name=host,
-                    ipmiuser=ctx.teuthology_config['ipmi_user'],
-                    ipmipass=ctx.teuthology_config['ipmi_password'],
-                    ipmidomain=ctx.teuthology_config['ipmi_domain'])
-                cname = '{host}.{domain}'.format(
-                    host=shortname,
-                    domain=ctx.teuthology_config['ipmi_domain'])
-                log.debug('checking console status of %s' % cname)
-                if not console.check_status():
-                    log.info(
-                        'Failed to get console status for '
-                        '%s, disabling console...'
-                        % cname)
-                    console=None
-                else:
-                    # find the remote for this console and add it
-                    remotes = [
-                        r for r in ctx.cluster.remotes.keys() if r.name == t]
-                    if len(remotes) != 1:
-                        raise Exception(
-                            'Too many (or too few) remotes '
-                            'found for target {t}'.format(t=t))
-                    remotes[0].console = console
-                    log.debug('console ready on %s' % cname)
+        if config.get('fake_console'):
+            for remote in ctx.cluster.remotes.iterkeys():
+                remote.console = FakeConsole(
+                    remote.name,
+                    on_power_off=functools.partial(
+                        fake_power_off, ctx, remote))
+        elif 'ipmi_user' in ctx.teuthology_config:
+            with parallel() as p:
+                for t in ctx.config['targets'].iterkeys():
+                    p.spawn(setup_console, ctx, t)
 
             # check that all osd remotes have a valid console
             osds = ctx.cluster.only(teuthology.is_type('osd'))
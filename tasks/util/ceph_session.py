@@ -0,0 +1,182 @@
+"""
+Long-lived ceph command channel on a remote.
+
+Every ``ceph`` CLI invocation pays for interpreter startup, keyring
+loading and mon authentication.  CephCommandSession starts one small
+python helper on the remote instead; it keeps a single mon connection
+open and executes mon commands sent to it as JSON lines on stdin,
+answering each with one JSON line on stdout.
+"""
+import base64
+import json
+import logging
+import threading
+
+from teuthology.orchestra import run
+
+log = logging.getLogger(__name__)
+
+SESSION_HELPER = """
+import base64
+import json
+import sys
+
+import rados
+from ceph_argparse import json_command, parse_json_funcsigs, validate_command
+
+
+def reply(**kwargs):
+    sys.stdout.write(json.dumps(kwargs) + '\\n')
+    sys.stdout.flush()
+
+cluster = rados.Rados(conffile='/etc/ceph/ceph.conf')
+cluster.connect()
+ret, outbuf, outs = json_command(cluster, prefix='get_command_descriptions')
+if ret:
+    reply(ready=False, outs=outs)
+    sys.exit(1)
+sigdict = parse_json_funcsigs(outbuf, 'cli')
+reply(ready=True)
+
+while True:
+    line = sys.stdin.readline()
+    if not line:
+        break
+    req = json.loads(line)
+    valid = validate_command(sigdict, req['args'])
+    if not valid:
+        reply(unsupported=True)
+        continue
+    if req.get('format'):
+        valid['format'] = req['format']
+    ret, outbuf, outs = json_command(cluster, argdict=valid)
+    reply(ret=ret, outbuf=base64.b64encode(outbuf), outs=outs)
+
+cluster.shutdown()
+"""
+
+# first words of commands the CLI routes somewhere other than the mon
+NON_MON_COMMANDS = ['tell', 'daemon', 'daemonperf']
+
+
+def split_format(args):
+    """
+    Separate the output format from a ceph CLI argument list.
+
+    :param args: arguments as passed to the ceph CLI
+    :returns: (args, format), or None if args carry options or targets
+              the session cannot handle.
+    """
+    args = [str(a) for a in args]
+    if args and args[0] == '--':
+        args = args[1:]
+    fmt = None
+    ret = []
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg.startswith('--format='):
+            fmt = arg[len('--format='):]
+        elif arg in ['--format', '-f'] and i + 1 < len(args):
+            i += 1
+            fmt = args[i]
+        elif arg.startswith('-'):
+            return None
+        else:
+            ret.append(arg)
+        i += 1
+    if not ret or ret[0] in NON_MON_COMMANDS:
+        return None
+    # 'pg <pgid> ...' is sent to the pg's primary
+    if ret[0] == 'pg' and len(ret) > 1 and '.' in ret[1]:
+        return None
+    return (ret, fmt)
+
+
+class CephCommandSession(object):
+    """
+    Client side of the command channel.
+
+    command() returns None for anything the helper cannot run so that
+    callers can fall back to the ceph CLI.  Requests are serialized; the
+    helper answers them in order.
+    """
+    def __init__(self, remote, testdir):
+        self.remote = remote
+        self.lock = threading.Lock()
+        self.proc = remote.run(
+            args=[
+                'adjust-ulimits',
+                'ceph-coverage',
+                '{tdir}/archive/coverage'.format(tdir=testdir),
+                'python',
+                '-c',
+                SESSION_HELPER,
+                ],
+            stdin=run.PIPE,
+            stdout=run.PIPE,
+            wait=False,
+            )
+        line = self.proc.stdout.readline()
+        ready = False
+        if line:
+            ready = json.loads(line).get('ready', False)
+        if not ready:
+            log.info('ceph command session on %s failed to start',
+                     remote.name)
+            self.close()
+
+    def is_open(self):
+        """
+        True if the helper is running and accepting commands.
+        """
+        return self.proc is not None
+
+    def command(self, args):
+        """
+        Run a mon command through the helper.
+
+        :param args: arguments as passed to the ceph CLI
+        :returns: (exitstatus, stdout, stderr) as the CLI would have
+                  produced them, or None if the command was not sent.
+        """
+        parsed = split_format(args)
+        if parsed is None:
+            return None
+        (cmd_args, fmt) = parsed
+        with self.lock:
+            if self.proc is None:
+                return None
+            try:
+                self.proc.stdin.write(
+                    json.dumps({'args': cmd_args, 'format': fmt}) + '\n')
+                self.proc.stdin.flush()
+            except Exception:
+                log.exception('ceph command session write failed')
+                self.close()
+                return None
+            line = self.proc.stdout.readline()
+            if not line:
+                self.close()
+                raise Exception(
+                    'ceph command session died running {args}'.format(
+                        args=' '.join(cmd_args)))
+        reply = json.loads(line)
+        if reply.get('unsupported'):
+            return None
+        return (-reply['ret'], base64.b64decode(reply['outbuf']),
+                reply['outs'])
+
+    def close(self):
+        """
+        Shut the helper down; it exits once its stdin is closed.
+        """
+        proc = self.proc
+        self.proc = None
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+            run.wait([proc])
+        except Exception:
+            log.exception('error closing ceph command session')
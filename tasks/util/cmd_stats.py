@@ -0,0 +1,202 @@
+"""
+Latency accounting for the commands tasks run against the cluster.
+
+Each call is recorded under a short verb (e.g. 'ceph pg dump' or
+'asok dump_ops_in_flight') with the remote it ran on, its wall time and
+the size of its output.  Times and sizes go into log-bucketed
+histograms, so memory stays constant however long the job runs.
+"""
+import json
+import logging
+import math
+import time
+
+log = logging.getLogger(__name__)
+
+# command line options whose value is a separate argument
+OPTIONS_WITH_VALUE = ['-m', '-c', '-k', '-n', '-p', '-f', '--format',
+                      '--cluster', '--name', '--pool', '--admin-daemon']
+
+
+def command_verb(args, words=2):
+    """
+    Reduce a command line to the words identifying the command.
+
+    Options, their values and ids (anything containing a digit or a
+    '.', such as pgids or 'osd.3') are skipped.
+
+    :param args: command line, starting with the program name
+    :param words: number of words to keep after the program name
+    """
+    args = [str(a) for a in args]
+    verb = [args[0]]
+    skip = False
+    for arg in args[1:]:
+        if len(verb) > words:
+            break
+        if skip:
+            skip = False
+        elif arg in OPTIONS_WITH_VALUE:
+            skip = True
+        elif arg.startswith('-') or '.' in arg or '/' in arg or \
+                any(c.isdigit() for c in arg):
+            continue
+        else:
+            verb.append(arg)
+    return ' '.join(verb)
+
+
+class Histogram(object):
+    """
+    Log-bucketed histogram.  Bucket i holds values up to
+    base * growth ** i, so percentiles are exact to within a factor of
+    growth.
+    """
+    def __init__(self, base, growth):
+        self.base = base
+        self.growth = growth
+        self.buckets = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def add(self, value):
+        """
+        Record one value.
+        """
+        if value <= self.base:
+            i = 0
+        else:
+            i = int(math.ceil(math.log(float(value) / self.base,
+                                       self.growth)))
+        self.buckets[i] = self.buckets.get(i, 0) + 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, pct):
+        """
+        :returns: upper bound of the bucket holding the pct'th
+                  percentile, capped at the largest value seen
+        """
+        if not self.count:
+            return 0
+        rank = self.count * pct / 100.0
+        seen = 0
+        for i in sorted(self.buckets):
+            seen += self.buckets[i]
+            if seen >= rank:
+                return min(self.base * self.growth ** i, self.max)
+        return self.max
+
+
+class CommandStats(object):
+    """
+    Per-verb latency and output size histograms of a job.
+    """
+    def __init__(self):
+        self.verbs = {}
+
+    def add(self, verb, remote, elapsed, size, success=True):
+        """
+        Record one completed command.
+        """
+        entry = self.verbs.get(verb)
+        if entry is None:
+            entry = {
+                'times': Histogram(0.001, 1.25),
+                'sizes': Histogram(1, 2),
+                'failures': 0,
+                'remotes': {},
+                }
+            self.verbs[verb] = entry
+        entry['times'].add(elapsed)
+        entry['sizes'].add(size)
+        if not success:
+            entry['failures'] += 1
+        entry['remotes'][remote] = entry['remotes'].get(remote, 0) + 1
+
+    def summary(self):
+        """
+        :returns: dict of verb -> count, failures, total, mean, p50, p99
+                  and max seconds, output bytes and calls per remote
+        """
+        ret = {}
+        for (verb, entry) in self.verbs.iteritems():
+            times = entry['times']
+            sizes = entry['sizes']
+            ret[verb] = {
+                'count': times.count,
+                'failures': entry['failures'],
+                'total': times.total,
+                'mean': times.total / times.count,
+                'p50': times.percentile(50),
+                'p99': times.percentile(99),
+                'max': times.max,
+                'bytes': sizes.total,
+                'bytes_p50': sizes.percentile(50),
+                'bytes_max': sizes.max,
+                'remotes': dict(entry['remotes']),
+                }
+        return ret
+
+    def write(self, path):
+        """
+        Write summary() to path as JSON.
+        """
+        with file(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2, sort_keys=True)
+
+
+class CommandTimer(object):
+    """
+    Context manager timing one command.  Set size to the length of the
+    command output before leaving the block, and success to False if
+    the command failed without raising.
+    """
+    def __init__(self, stats, verb, remote):
+        self.stats = stats
+        self.verb = verb
+        self.remote = str(remote)
+        self.size = 0
+        self.success = True
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def discard(self):
+        """
+        Do not record this call, e.g. because the command was not run
+        after all.
+        """
+        self.stats = None
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.stats is not None:
+            # a generator closed early by its consumer did not fail
+            failed = exc_type is not None and \
+                not issubclass(exc_type, GeneratorExit)
+            self.stats.add(self.verb, self.remote, time.time() - self.start,
+                           self.size, success=self.success and not failed)
+        return False
+
+
+def get_command_stats(ctx):
+    """
+    :returns: the CommandStats of this job, created on first use
+    """
+    if ctx is None:
+        return None
+    if getattr(ctx, 'command_stats', None) is None:
+        ctx.command_stats = CommandStats()
+    return ctx.command_stats
+
+
+def time_command(ctx, args, remote):
+    """
+    :returns: a CommandTimer recording into the job's CommandStats, or
+              one that records nothing without a ctx
+    """
+    return CommandTimer(get_command_stats(ctx), command_verb(args), remote)
@@ -0,0 +1,94 @@
+"""
+Monitor election latencies.
+
+Each thrash event (killing, reviving or freezing monitors) is timed from
+the step that disrupted the quorum until a new quorum of the expected
+size has been elected.  Latencies are kept per event type, with events
+whose monitor store was thrashed first kept apart, and reported along
+with the store_thrash setting of the job so that runs can be compared.
+"""
+import json
+import logging
+
+from .cmd_stats import Histogram
+
+log = logging.getLogger(__name__)
+
+
+def event_key(event, store_thrashed=False):
+    """
+    :returns: the name latencies of event are kept under
+    """
+    if store_thrashed:
+        return event + '_store_thrashed'
+    return event
+
+
+class ElectionStats(object):
+    """
+    Election latency histograms per event type.
+
+    :param store_thrash: the store_thrash setting of the job
+    """
+    def __init__(self, store_thrash=False):
+        self.store_thrash = store_thrash
+        self.events = {}
+
+    def add(self, event, seconds, store_thrashed=False, timed_out=False):
+        """
+        Record one election.
+
+        :param event: event type: 'kill', 'kill_freeze', 'revive' or
+                      'revive_freeze'
+        :param seconds: time until the new quorum was seen
+        :param store_thrashed: whether a store was thrashed before
+        :param timed_out: whether no new quorum was seen in time;
+                          seconds is then not recorded
+        """
+        key = event_key(event, store_thrashed)
+        entry = self.events.get(key)
+        if entry is None:
+            entry = {
+                'times': Histogram(0.01, 1.1),
+                'timeouts': 0,
+                'samples': [],
+                }
+            self.events[key] = entry
+        if timed_out:
+            entry['timeouts'] += 1
+            return
+        entry['times'].add(seconds)
+        entry['samples'].append(round(seconds, 3))
+
+    def summary(self, samples=False):
+        """
+        :param samples: include every recorded latency
+        :returns: dict with the store_thrash setting and, per event,
+                  count, timeouts, mean, p50, p90, p99 and max seconds
+        """
+        events = {}
+        for (key, entry) in self.events.iteritems():
+            times = entry['times']
+            events[key] = {
+                'count': times.count,
+                'timeouts': entry['timeouts'],
+                'mean': times.total / times.count if times.count else 0,
+                'p50': times.percentile(50),
+                'p90': times.percentile(90),
+                'p99': times.percentile(99),
+                'max': times.max,
+                }
+            if samples:
+                events[key]['samples'] = list(entry['samples'])
+        return {
+            'store_thrash': self.store_thrash,
+            'events': events,
+            }
+
+    def write(self, path):
+        """
+        Write summary(), with the samples, to path as JSON.
+        """
+        with file(path, 'w') as f:
+            json.dump(self.summary(samples=True), f, indent=2,
+                      sort_keys=True)
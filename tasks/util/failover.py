@@ -0,0 +1,100 @@
+"""
+MDS failover latencies.
+
+Each failover is timed in intervals read off the mdsmap and kept per
+standby mode, i.e. whether the mds that took over the rank was
+following it in standby-replay before the kill or was a plain standby.
+"""
+from .cmd_stats import Histogram
+from .mdsmap import mds_info
+
+INTERVALS = ['kill_to_failed', 'failed_to_active', 'kill_to_active',
+             'revive_to_standby']
+
+
+def standby_replay_configured(ctx):
+    """
+    :returns: whether 'mds standby replay' is set for any mds in the
+              ceph.conf of the job
+    """
+    conf = getattr(ctx, 'ceph', None)
+    if conf is None:
+        return False
+    for (section, values) in conf.conf.iteritems():
+        if section == 'mds' or section.startswith('mds.'):
+            value = values.get('mds standby replay')
+            if value is not None and str(value).lower() in ('true', '1'):
+                return True
+    return False
+
+
+def replacement(mdsmap, rank, name):
+    """
+    :returns: the info of the mds other than name that is active for
+              rank in mdsmap, or None
+    """
+    for info in mdsmap['info'].itervalues():
+        if info['rank'] == rank and info['state'] == 'up:active' and \
+                info['name'] != name:
+            return info
+    return None
+
+
+def takeover_mode(before, name):
+    """
+    :param before: the mdsmap from before the kill
+    :param name: name of the mds that took over
+    :returns: 'standby-replay' if that mds was in standby-replay in
+              before, otherwise 'standby'
+    """
+    info = mds_info(before, name)
+    if info is not None and info['state'] == 'up:standby-replay':
+        return 'standby-replay'
+    return 'standby'
+
+
+class FailoverStats(object):
+    """
+    Failover interval histograms per standby mode.
+    """
+    def __init__(self):
+        self.modes = {}
+        self.samples = []
+
+    def add(self, mode, intervals):
+        """
+        Record the intervals of one failover.
+
+        :param mode: 'standby' or 'standby-replay', the state of the mds
+                     that took over
+        :param intervals: dict of interval name -> seconds
+        """
+        hists = self.modes.setdefault(mode, {})
+        for (name, seconds) in intervals.iteritems():
+            hist = hists.get(name)
+            if hist is None:
+                hist = Histogram(0.01, 1.1)
+                hists[name] = hist
+            hist.add(seconds)
+        sample = dict(intervals)
+        sample['mode'] = mode
+        self.samples.append(sample)
+
+    def summary(self):
+        """
+        :returns: dict of mode -> interval -> count, mean, p50, p90, p99
+                  and max seconds
+        """
+        ret = {}
+        for (mode, hists) in self.modes.iteritems():
+            ret[mode] = {}
+            for (name, hist) in hists.iteritems():
+                ret[mode][name] = {
+                    'count': hist.count,
+                    'mean': hist.total / hist.count,
+                    'p50': hist.percentile(50),
+                    'p90': hist.percentile(90),
+                    'p99': hist.percentile(99),
+                    'max': hist.max,
+                    }
+        return ret
@@ -0,0 +1,163 @@
+"""
+Shared view of the mdsmap for tasks waiting on mds state changes.
+
+Every thrasher greenlet used to run a full ``mds dump`` for each mds it
+was interested in, on every poll.  MDSMapWatcher polls the (small) mds
+map epoch from one greenlet, fetches the full map only when the epoch
+changes, and wakes everyone waiting in wait_for() so that they can
+check their condition against the new map.  Waiters block on an event
+that is replaced and set for each new map, which gives the broadcast
+semantics of a condition variable; the watcher only polls while
+someone is waiting.
+"""
+import logging
+import time
+
+import gevent
+from gevent.event import Event
+from gevent.lock import RLock
+
+log = logging.getLogger(__name__)
+
+
+def mds_info(mdsmap, name):
+    """
+    :returns: the info of the mds called name in mdsmap, or None
+    """
+    for info in mdsmap['info'].itervalues():
+        if info['name'] == name:
+            return info
+    return None
+
+
+class MDSMapWatcher(object):
+    """
+    Fetches the mdsmap once per epoch on behalf of several waiters.
+
+    :param get_epoch: callable returning the current mdsmap epoch, or
+                      None if it cannot tell
+    :param get_map: callable returning the decoded mdsmap
+    :param interval: seconds between epoch polls while someone waits
+    :param report: WaitReport to record waits in, or None
+    """
+    def __init__(self, get_epoch, get_map, interval=0.5, report=None):
+        self.get_epoch = get_epoch
+        self.get_map = get_map
+        self.interval = interval
+        self.report = report
+        self.lock = RLock()
+        self.changed = Event()
+        self.wanted = Event()
+        self.stopping = Event()
+        self.waiters = 0
+        self.mdsmap = None
+        self.epoch = None
+        self.stats = {
+            'epoch_polls': 0,
+            'map_fetches': 0,
+            }
+        self.greenlet = None
+
+    def start(self):
+        """
+        Start polling in a greenlet.
+        """
+        self.greenlet = gevent.spawn(self._run)
+
+    def stop(self):
+        """
+        Stop polling and wait for the greenlet to finish.
+        """
+        self.stopping.set()
+        self.wanted.set()
+        if self.greenlet is not None:
+            self.greenlet.get()
+
+    def _run(self):
+        while not self.stopping.is_set():
+            self.wanted.wait()
+            if self.stopping.is_set():
+                break
+            try:
+                self.refresh()
+            except Exception:
+                log.exception('failed to refresh the mdsmap')
+            self.stopping.wait(self.interval)
+
+    def refresh(self):
+        """
+        Fetch the map if its epoch changed since the last fetch, and wake
+        the waiters if so.
+
+        :returns: the current map
+        """
+        with self.lock:
+            if self.mdsmap is not None:
+                self.stats['epoch_polls'] += 1
+                epoch = self.get_epoch()
+                if epoch is not None and epoch == self.epoch:
+                    return self.mdsmap
+            mdsmap = self.get_map()
+            self.stats['map_fetches'] += 1
+            self.mdsmap = mdsmap
+            self.epoch = mdsmap['epoch']
+            changed = self.changed
+            self.changed = Event()
+        changed.set()
+        return mdsmap
+
+    def current(self):
+        """
+        :returns: an up to date map
+        """
+        return self.refresh()
+
+    def status(self, name):
+        """
+        :returns: the up to date info of the mds called name, or None
+        """
+        return mds_info(self.current(), name)
+
+    def wait_for(self, name, predicate, timeout=None, log_after=None):
+        """
+        Block until predicate(mdsmap) holds for a map fetched by the
+        watcher.
+
+        :param name: name of the wait, for the wait report
+        :param predicate: callable taking the mdsmap
+        :param timeout: seconds before giving up, or None
+        :param log_after: log each map the predicate fails for once it
+                          failed this many times, or None
+        :returns: the map the predicate held for, or None on timeout
+        """
+        start = time.time()
+        checks = 0
+        found = None
+        self.waiters += 1
+        self.wanted.set()
+        try:
+            mdsmap = self.current()
+            while True:
+                changed = self.changed
+                checks += 1
+                if predicate(mdsmap):
+                    found = mdsmap
+                    break
+                if log_after is not None and checks > log_after:
+                    log.info('{name}: mds map: {m}'.format(name=name,
+                                                           m=mdsmap))
+                remaining = None
+                if timeout is not None:
+                    remaining = timeout - (time.time() - start)
+                    if remaining <= 0:
+                        break
+                changed.wait(remaining)
+                mdsmap = self.mdsmap
+        finally:
+            self.waiters -= 1
+            if not self.waiters:
+                self.wanted.clear()
+            if self.report is not None:
+                self.report.add('mdsmap.' + name, time.time() - start,
+                                checks, found is not None)
+        return found
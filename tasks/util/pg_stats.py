@@ -0,0 +1,183 @@
+"""
+Streaming access to the pg stats of a cluster.
+
+A full ``ceph pg dump`` grows with the pg count and used to be read and
+parsed as one string.  The helpers here read ``pg dump pgs`` a chunk at
+a time and decode one pg record at a time, so callers only ever hold
+the fields they ask for.
+"""
+import json
+import logging
+
+from teuthology.orchestra import run
+
+log = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+JSON_WHITESPACE = ' \t\r\n'
+JSON_DELIMITERS = JSON_WHITESPACE + ',]}'
+
+
+class JSONArrayReader(object):
+    """
+    Iterate over the elements of a JSON array read from a file-like
+    object.
+
+    If key is given the array is the value of that key, otherwise it is
+    the first array in the stream.  Anything before the array (such as
+    a status line) is skipped.
+    """
+    def __init__(self, stream, key=None, chunk_size=CHUNK_SIZE):
+        self.stream = stream
+        self.key = key
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self.size = 0
+
+    def _fill(self):
+        """
+        Read another chunk, dropping the consumed part of the buffer.
+
+        :returns: False at the end of the stream
+        """
+        if self.eof:
+            return False
+        data = self.stream.read(self.chunk_size)
+        if not data:
+            self.eof = True
+            return False
+        self.size += len(data)
+        self.buf = self.buf[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def _find(self, token):
+        """
+        Move past the next occurrence of token.
+        """
+        while True:
+            i = self.buf.find(token, self.pos)
+            if i >= 0:
+                self.pos = i + len(token)
+                return
+            # keep enough of the buffer for a token split across chunks
+            self.pos = max(self.pos, len(self.buf) - len(token) + 1)
+            if not self._fill():
+                raise ValueError('{token} not found in JSON stream'.format(
+                    token=token))
+
+    def _peek(self):
+        """
+        :returns: the next non-whitespace character
+        """
+        while True:
+            while self.pos < len(self.buf) and \
+                    self.buf[self.pos] in JSON_WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                raise ValueError('unexpected end of JSON stream')
+
+    def _expect(self, char):
+        """
+        Consume char, which must be the next non-whitespace character.
+        """
+        found = self._peek()
+        if found != char:
+            raise ValueError('expected {char!r} in JSON stream, got '
+                             '{found!r}'.format(char=char, found=found))
+        self.pos += 1
+
+    def _decode(self):
+        """
+        Decode the value starting at the current position.
+        """
+        while True:
+            try:
+                (obj, end) = self.decoder.raw_decode(self.buf, self.pos)
+            except ValueError:
+                if not self._fill():
+                    raise
+                continue
+            # a number cut by the end of the buffer may continue in the
+            # next chunk
+            if isinstance(obj, (int, long, float)) and \
+                    (end == len(self.buf) or
+                     self.buf[end] not in JSON_DELIMITERS) and \
+                    self._fill():
+                continue
+            self.pos = end
+            return obj
+
+    def __iter__(self):
+        if self.key is not None:
+            self._find(json.dumps(self.key))
+            self._expect(':')
+            self._expect('[')
+        else:
+            self._find('[')
+        if self._peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            self._peek()
+            yield self._decode()
+            found = self._peek()
+            self.pos += 1
+            if found == ']':
+                return
+            if found != ',':
+                raise ValueError('expected \',\' or \']\' in JSON stream, '
+                                 'got {found!r}'.format(found=found))
+
+
+def trim(record, fields):
+    """
+    :returns: record restricted to fields, or record itself if fields
+              is None
+    """
+    if fields is None:
+        return record
+    return dict([(f, record[f]) for f in fields if f in record])
+
+
+def iter_pg_stats(remote, testdir, fields=None, call=None):
+    """
+    Stream the pg stats of the cluster from ``ceph pg dump pgs``.
+
+    :param remote: remote to run the ceph CLI on
+    :param testdir: test directory, for coverage output
+    :param fields: pg stat fields to keep, or None for whole records
+    :param call: CommandTimer to set the output size of, or None
+    :returns: a generator of pg stat dicts
+    """
+    proc = remote.run(
+        args=[
+            'adjust-ulimits',
+            'ceph-coverage',
+            '{tdir}/archive/coverage'.format(tdir=testdir),
+            'ceph', 'pg', 'dump', 'pgs', '--format=json',
+            ],
+        stdout=run.PIPE,
+        wait=False,
+        )
+    reader = JSONArrayReader(proc.stdout)
+    try:
+        for pg in reader:
+            yield trim(pg, fields)
+    finally:
+        # let the command run to completion if the caller stopped early
+        size = reader.size
+        while True:
+            data = proc.stdout.read(CHUNK_SIZE)
+            if not data:
+                break
+            size += len(data)
+        if call is not None:
+            call.size = size
+        run.wait([proc])
@@ -0,0 +1,200 @@
+"""
+Power cycling of the hosts daemons run on.
+
+Powering a host off and on again, waiting for its console to report it
+up and reconnecting to it takes minutes, and used to be done one daemon
+at a time.  PowerCycler runs these steps for several hosts in parallel
+greenlets, powers each host off or on at most once however many of its
+daemons are killed or revived (concurrent callers for the same host
+wait for the one operation in flight), and only reconnects to a host
+after it was actually power cycled, so daemons revived on a host that
+is already up reuse the existing connection.
+
+FakeConsole stands in for an IPMI console, so that the powercycle code
+paths can be run on hosts without one.
+"""
+import logging
+import time
+
+import gevent
+from gevent.event import AsyncResult
+
+log = logging.getLogger(__name__)
+
+
+class FakeConsole(object):
+    """
+    Stand-in for a RemoteConsole.  Powering off calls on_power_off
+    (e.g. to stop the daemons of the host) instead of cutting power.
+
+    :param name: host name, for logging
+    :param on_power_off: callable run when the host is powered off
+    :param boot_time: seconds power_on takes
+    """
+    def __init__(self, name, on_power_off=None, boot_time=0):
+        self.name = name
+        self.on_power_off = on_power_off
+        self.boot_time = boot_time
+        self.powered = True
+        self.calls = []
+
+    def power_off(self):
+        """
+        Pretend to cut power.
+        """
+        log.info('fake console: power off {name}'.format(name=self.name))
+        self.calls.append('power_off')
+        self.powered = False
+        if self.on_power_off is not None:
+            self.on_power_off()
+
+    def power_on(self):
+        """
+        Pretend to power on and boot.
+        """
+        log.info('fake console: power on {name}'.format(name=self.name))
+        self.calls.append('power_on')
+        gevent.sleep(self.boot_time)
+        self.powered = True
+
+    def power_cycle(self):
+        """
+        Power off, then on.
+        """
+        self.power_off()
+        self.power_on()
+
+    def check_status(self, timeout=None):
+        """
+        :returns: whether the host is powered on
+        """
+        self.calls.append('check_status')
+        return self.powered
+
+
+class PowerCycler(object):
+    """
+    Powers hosts off and on through their consoles.
+
+    :param reconnect: callable taking a list of remotes, reconnecting to
+                      them once they are up again
+    :param on_boot: callable taking a remote, run once after each boot
+                    before any caller continues
+    :param timeout: seconds to wait for a console to report a host up
+    :param logger: callable taking a message, or None to use this
+                   module's logger
+    """
+    def __init__(self, reconnect, on_boot=None, timeout=300, logger=None):
+        self.reconnect = reconnect
+        self.on_boot = on_boot
+        self.timeout = timeout
+        self.log = logger or log.info
+        self.down = set()
+        self.inflight = {}
+        self.stats = {
+            'power_off': 0,
+            'power_on': 0,
+            'joined': 0,
+            'seconds': 0.0,
+            }
+
+    def _console(self, remote):
+        """
+        :returns: the console of remote
+        """
+        assert remote.console is not None, \
+            "powercycling requested but RemoteConsole is not initialized.  " \
+            "Check ipmi config."
+        return remote.console
+
+    def _once(self, op, remote, func):
+        """
+        Run func(remote), unless the same op is already in flight for
+        the host, in which case wait for that one instead.
+        """
+        key = (op, remote.name)
+        pending = self.inflight.get(key)
+        if pending is not None:
+            self.stats['joined'] += 1
+            return pending.get()
+        result = AsyncResult()
+        self.inflight[key] = result
+        try:
+            value = func(remote)
+        except Exception as e:
+            result.set_exception(e)
+            raise
+        else:
+            result.set(value)
+            return value
+        finally:
+            del self.inflight[key]
+
+    def _each(self, op, remotes, func):
+        """
+        Run op on each distinct host of remotes in parallel.
+        """
+        hosts = dict([(remote.name, remote) for remote in remotes])
+        if len(hosts) == 1:
+            self._once(op, hosts.values()[0], func)
+            return
+        greenlets = [gevent.spawn(self._once, op, remote, func)
+                     for remote in hosts.itervalues()]
+        gevent.joinall(greenlets)
+        for greenlet in greenlets:
+            # raise the first failure
+            greenlet.get()
+
+    def _power_off(self, remote):
+        """
+        Power one host off, unless it already is.
+        """
+        if remote.name in self.down:
+            return
+        self.log('powering off {r}'.format(r=remote.name))
+        start = time.time()
+        self._console(remote).power_off()
+        self.down.add(remote.name)
+        self.stats['power_off'] += 1
+        self.stats['seconds'] += time.time() - start
+
+    def _power_on(self, remote):
+        """
+        Power one host on and reconnect to it, unless it is up.
+        """
+        if remote.name not in self.down:
+            return
+        self.log('powering on {r}'.format(r=remote.name))
+        start = time.time()
+        console = self._console(remote)
+        console.power_on()
+        if not console.check_status(self.timeout):
+            raise Exception('Failed to power on {r} via ipmi'.format(
+                    r=remote.name))
+        self.reconnect([remote])
+        if self.on_boot is not None:
+            self.on_boot(remote)
+        self.down.discard(remote.name)
+        self.stats['power_on'] += 1
+        self.stats['seconds'] += time.time() - start
+        self.log('{r} is back after {s:.1f}s'.format(
+                r=remote.name, s=time.time() - start))
+
+    def power_off(self, remotes):
+        """
+        Power off the hosts of remotes in parallel.
+        """
+        self._each('power_off', remotes, self._power_off)
+
+    def power_on(self, remotes):
+        """
+        Power on the hosts of remotes in parallel, and reconnect to the
+        ones that were down.
+        """
+        self._each('power_on', remotes, self._power_on)
+
+    def is_down(self, remote):
+        """
+        :returns: whether the host of remote was powered off
+        """
+        return remote.name in self.down
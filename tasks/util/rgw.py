@@ -7,6 +7,8 @@ from urlparse import urlparse
 from teuthology.orchestra.connection import split_user
 from teuthology import misc as teuthology
 
+from .cmd_stats import time_command
+
 log = logging.getLogger(__name__)
 
 # simple test to indicate if multi-region testing should occur
@@ -30,13 +32,16 @@ def rgwadmin(ctx, client, cmd, stdin=StringIO(), check_status=False):
     pre.extend(cmd)
     log.info('rgwadmin: cmd=%s' % pre)
     (remote,) = ctx.cluster.only(client).remotes.iterkeys()
-    proc = remote.run(
-        args=pre,
-        check_status=check_status,
-        stdout=StringIO(),
-        stderr=StringIO(),
-        stdin=stdin,
-        )
+    with time_command(ctx, ['radosgw-admin'] + list(cmd),
+                      remote.name) as call:
+        proc = remote.run(
+            args=pre,
+            check_status=check_status,
+            stdout=StringIO(),
+            stderr=StringIO(),
+            stdin=stdin,
+            )
+        call.size = len(proc.stdout.getvalue())
     r = proc.exitstatus
     out = proc.stdout.getvalue()
     j = None
@@ -0,0 +1,58 @@
+"""
+Role -> remote lookups shared by the tasks of a job.
+
+``ctx.cluster.only(role)`` filters every remote and every role of the
+cluster on each call.  RoleIndex maps roles to remotes once; the index
+is kept on the ctx and rebuilt when ctx.cluster is replaced or after
+invalidate_role_index() (e.g. once remotes have been reconnected).
+"""
+import logging
+
+log = logging.getLogger(__name__)
+
+
+class RoleIndex(object):
+    """
+    Role -> Remote map of a cluster.
+    """
+    def __init__(self, cluster):
+        self.cluster = cluster
+        self.remotes = {}
+        for (remote, roles) in cluster.remotes.iteritems():
+            for role in roles:
+                self.remotes[role] = remote
+
+    def remote(self, role):
+        """
+        :returns: the Remote a role runs on
+        :raises: KeyError if no remote has the role
+        """
+        return self.remotes[role]
+
+    def find(self, type_, id_):
+        """
+        :returns: the Remote the role type_.id_ runs on
+        :raises: KeyError if no remote has the role
+        """
+        try:
+            return self.remotes['{type}.{id}'.format(type=type_, id=id_)]
+        except KeyError:
+            raise KeyError("Service {0}.{1} not found".format(type_, id_))
+
+
+def get_role_index(ctx):
+    """
+    :returns: the RoleIndex of ctx.cluster, built on first use
+    """
+    index = getattr(ctx, 'role_index', None)
+    if index is None or index.cluster is not ctx.cluster:
+        index = RoleIndex(ctx.cluster)
+        ctx.role_index = index
+    return index
+
+
+def invalidate_role_index(ctx):
+    """
+    Drop the cached index so that the next lookup rebuilds it.
+    """
+    ctx.role_index = None
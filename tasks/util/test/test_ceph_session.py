@@ -0,0 +1,21 @@
+from .. import ceph_session
+
+
+class TestCephSession(object):
+
+    def test_split_format(self):
+        assert ceph_session.split_format(['osd', 'dump', '--format=json']) == \
+            (['osd', 'dump'], 'json')
+        assert ceph_session.split_format(['pg', 'dump', '-f', 'json']) == \
+            (['pg', 'dump'], 'json')
+        assert ceph_session.split_format(['osd', 'reweight', 1, 0.5]) == \
+            (['osd', 'reweight', '1', '0.5'], None)
+
+    def test_split_format_unsupported(self):
+        assert ceph_session.split_format(
+            ['--', 'tell', 'osd.0', 'injectargs', '--debug-osd 20']) is None
+        assert ceph_session.split_format(
+            ['-m', '1.2.3.4:6789', 'mon_status']) is None
+        assert ceph_session.split_format(
+            ['--', 'pg', '1.0', 'list_missing', '{}']) is None
+        assert ceph_session.split_format([]) is None
@@ -0,0 +1,68 @@
+from .. import cmd_stats
+
+
+class TestCommandVerb(object):
+
+    def test_ceph(self):
+        verb = cmd_stats.command_verb
+        assert verb(['ceph', 'pg', 'dump', '--format=json']) == 'ceph pg dump'
+        assert verb(['ceph', 'status', '--format=json']) == 'ceph status'
+        assert verb(['ceph', '--', 'pg', '1.0', 'query']) == 'ceph pg query'
+        assert verb(['ceph', '-m', '1.2.3.4:6789', 'mon_status']) == \
+            'ceph mon_status'
+        assert verb(['ceph', 'tell', 'osd.3', 'injectargs', '--debug']) == \
+            'ceph tell injectargs'
+
+    def test_others(self):
+        verb = cmd_stats.command_verb
+        assert verb(['rados', '-p', 'rbd', 'bench', '10', 'write']) == \
+            'rados bench write'
+        assert verb(['radosgw-admin', '-n', 'client.0', 'user', 'create',
+                     '--uid', 'foo']) == 'radosgw-admin user create'
+
+
+class TestCommandStats(object):
+
+    def test_summary(self):
+        stats = cmd_stats.CommandStats()
+        for i in range(100):
+            stats.add('ceph status', 'host1', 0.01 * (i + 1), 1000)
+        stats.add('ceph status', 'host2', 10.0, 5000, success=False)
+        summary = stats.summary()['ceph status']
+        assert summary['count'] == 101
+        assert summary['failures'] == 1
+        assert summary['max'] == 10.0
+        assert 0.5 / 1.25 <= summary['p50'] <= 0.5 * 1.25
+        assert 0.99 / 1.25 <= summary['p99'] <= 0.99 * 1.25
+        assert summary['bytes'] == 105000
+        assert summary['remotes'] == {'host1': 100, 'host2': 1}
+
+    def test_timer(self):
+        stats = cmd_stats.CommandStats()
+        with cmd_stats.CommandTimer(stats, 'ceph osd dump', 'host1') as call:
+            call.size = 42
+        try:
+            with cmd_stats.CommandTimer(stats, 'ceph osd dump', 'host1'):
+                raise RuntimeError()
+        except RuntimeError:
+            pass
+        with cmd_stats.CommandTimer(stats, 'ceph osd dump', 'host1') as call:
+            call.success = False
+        with cmd_stats.CommandTimer(stats, 'ceph osd dump', 'host1') as call:
+            call.discard()
+        summary = stats.summary()['ceph osd dump']
+        assert summary['count'] == 3
+        assert summary['failures'] == 2
+        assert summary['bytes'] == 42
+
+    def test_timer_in_closed_generator(self):
+        stats = cmd_stats.CommandStats()
+
+        def gen():
+            with cmd_stats.CommandTimer(stats, 'ceph pg dump', 'host1'):
+                for i in range(10):
+                    yield i
+        it = gen()
+        it.next()
+        it.close()
+        assert stats.summary()['ceph pg dump']['failures'] == 0
@@ -0,0 +1,41 @@
+import json
+import os
+import tempfile
+
+from .. import elections
+
+
+class TestElectionStats(object):
+
+    def test_events(self):
+        stats = elections.ElectionStats(store_thrash=True)
+        for seconds in [0.5, 1.0, 1.5, 2.0]:
+            stats.add('kill', seconds)
+        stats.add('kill', 3.0, store_thrashed=True)
+        stats.add('revive', 0, timed_out=True)
+        summary = stats.summary()
+        assert summary['store_thrash'] is True
+        kill = summary['events']['kill']
+        assert kill['count'] == 4
+        assert kill['mean'] == 1.25
+        assert kill['max'] == 2.0
+        assert 0.9 <= kill['p50'] <= 1.1
+        assert summary['events']['kill_store_thrashed']['count'] == 1
+        assert summary['events']['revive'] == {
+            'count': 0, 'timeouts': 1, 'mean': 0, 'p50': 0, 'p90': 0,
+            'p99': 0, 'max': 0}
+        assert 'samples' not in kill
+
+    def test_write(self):
+        stats = elections.ElectionStats()
+        stats.add('revive_freeze', 0.25)
+        (fd, path) = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            stats.write(path)
+            with file(path) as f:
+                written = json.load(f)
+        finally:
+            os.unlink(path)
+        assert written['store_thrash'] is False
+        assert written['events']['revive_freeze']['samples'] == [0.25]
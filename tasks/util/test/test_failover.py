@@ -0,0 +1,75 @@
+from .. import failover
+
+
+def make_map(*infos):
+    return {
+        'epoch': 1,
+        'failed': [],
+        'info': dict([('gid_{i}'.format(i=i), dict(zip(
+                            ('name', 'rank', 'state'), info)))
+                      for (i, info) in enumerate(infos)]),
+        }
+
+
+class FakeConf(object):
+
+    def __init__(self, conf):
+        self.conf = conf
+
+
+class FakeCtx(object):
+    pass
+
+
+class TestTakeover(object):
+
+    def test_replacement(self):
+        mdsmap = make_map(('a', 0, 'up:active'), ('b', -1, 'up:standby'))
+        assert failover.replacement(mdsmap, 0, 'a') is None
+        mdsmap = make_map(('b', 0, 'up:active'), ('c', -1, 'up:standby'))
+        assert failover.replacement(mdsmap, 0, 'a')['name'] == 'b'
+        assert failover.replacement(mdsmap, 1, 'a') is None
+
+    def test_mode_of_successor(self):
+        # a plain standby wins although another mds followed the rank
+        before = make_map(('a', 0, 'up:active'),
+                          ('b', -1, 'up:standby-replay'),
+                          ('c', -1, 'up:standby'))
+        assert failover.takeover_mode(before, 'c') == 'standby'
+        assert failover.takeover_mode(before, 'b') == 'standby-replay'
+        assert failover.takeover_mode(before, 'd') == 'standby'
+
+
+class TestStandbyReplayConfigured(object):
+
+    def test_conf(self):
+        ctx = FakeCtx()
+        assert not failover.standby_replay_configured(ctx)
+        ctx.ceph = FakeConf({'global': {'mds standby replay': True},
+                             'mds.a': {'mds standby for rank': 0}})
+        assert not failover.standby_replay_configured(ctx)
+        ctx.ceph = FakeConf({'mds.b': {'mds standby replay': 'true'}})
+        assert failover.standby_replay_configured(ctx)
+        ctx.ceph = FakeConf({'mds': {'mds standby replay': False}})
+        assert not failover.standby_replay_configured(ctx)
+
+
+class TestFailoverStats(object):
+
+    def test_summary(self):
+        stats = failover.FailoverStats()
+        for seconds in [1.0, 2.0, 3.0]:
+            stats.add('standby', {'kill_to_active': seconds})
+        stats.add('standby-replay', {'kill_to_active': 0.5,
+                                     'revive_to_standby': 4.0})
+        summary = stats.summary()
+        standby = summary['standby']['kill_to_active']
+        assert standby['count'] == 3
+        assert standby['mean'] == 2.0
+        assert standby['max'] == 3.0
+        assert 1.8 <= standby['p50'] <= 2.2
+        assert summary['standby-replay']['revive_to_standby']['count'] == 1
+        assert 'revive_to_standby' not in summary['standby']
+        assert stats.samples[-1] == {'kill_to_active': 0.5,
+                                     'revive_to_standby': 4.0,
+                                     'mode': 'standby-replay'}
@@ -0,0 +1,73 @@
+import gevent
+
+from .. import mdsmap
+
+
+def make_map(epoch, state='up:active'):
+    return {
+        'epoch': epoch,
+        'failed': [],
+        'info': {
+            'gid_1': {'name': 'a', 'rank': 0, 'state': state},
+            },
+        }
+
+
+class FakeCluster(object):
+
+    def __init__(self):
+        self.map = make_map(1)
+        self.epoch_calls = 0
+        self.map_calls = 0
+
+    def get_epoch(self):
+        self.epoch_calls += 1
+        return self.map['epoch']
+
+    def get_map(self):
+        self.map_calls += 1
+        return self.map
+
+
+class TestMDSMapWatcher(object):
+
+    def setup(self):
+        self.cluster = FakeCluster()
+        self.watcher = mdsmap.MDSMapWatcher(
+            self.cluster.get_epoch, self.cluster.get_map, interval=0.01)
+
+    def test_fetch_once_per_epoch(self):
+        assert self.watcher.status('a')['state'] == 'up:active'
+        self.watcher.current()
+        self.watcher.current()
+        assert self.cluster.map_calls == 1
+        assert self.cluster.epoch_calls == 2
+        self.cluster.map = make_map(2, 'up:standby')
+        assert self.watcher.status('a')['state'] == 'up:standby'
+        assert self.cluster.map_calls == 2
+        assert self.watcher.status('b') is None
+
+    def test_waiters_share_fetches(self):
+        self.watcher.start()
+        seen = []
+
+        def wait():
+            seen.append(self.watcher.wait_for(
+                'standby',
+                lambda m: mdsmap.mds_info(m, 'a')['state'] == 'up:standby'))
+        waiters = [gevent.spawn(wait) for _ in range(3)]
+        gevent.sleep(0.05)
+        assert seen == []
+        self.cluster.map = make_map(2, 'up:standby')
+        gevent.joinall(waiters, timeout=5, raise_error=True)
+        self.watcher.stop()
+        assert [m['epoch'] for m in seen] == [2, 2, 2]
+        # one fetch for the first map, one for epoch 2
+        assert self.cluster.map_calls == 2
+        assert self.watcher.waiters == 0
+
+    def test_timeout(self):
+        self.watcher.start()
+        assert self.watcher.wait_for('never', lambda m: False,
+                                     timeout=0.05) is None
+        self.watcher.stop()
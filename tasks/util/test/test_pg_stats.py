@@ -0,0 +1,58 @@
+import json
+
+from cStringIO import StringIO
+
+from .. import pg_stats
+
+
+def read_array(text, key=None, chunk_size=pg_stats.CHUNK_SIZE):
+    reader = pg_stats.JSONArrayReader(StringIO(text), key=key,
+                                      chunk_size=chunk_size)
+    return list(reader)
+
+
+class TestJSONArrayReader(object):
+
+    pgs = [
+        {'pgid': '0.%x' % i, 'state': 'active+clean', 'acting': [i, i + 1],
+         'stat_sum': {'num_bytes': i * 4096}}
+        for i in range(50)
+        ]
+
+    def test_bare_array(self):
+        text = json.dumps(self.pgs)
+        assert read_array(text) == self.pgs
+
+    def test_small_chunks(self):
+        text = json.dumps(self.pgs, indent=4)
+        for chunk_size in [1, 2, 7, 64]:
+            assert read_array(text, chunk_size=chunk_size) == self.pgs
+
+    def test_numbers_across_chunks(self):
+        values = [1, 22, 333, 4444, 55555, -6, 7.5]
+        text = json.dumps(values)
+        for chunk_size in range(1, 8):
+            assert read_array(text, chunk_size=chunk_size) == values
+
+    def test_key(self):
+        text = json.dumps({'version': 3, 'pg_stats_sum': [1, 2],
+                           'pg_stats': self.pgs, 'osd_stats': [3]})
+        assert read_array(text, key='pg_stats', chunk_size=5) == self.pgs
+
+    def test_preamble_and_empty(self):
+        assert read_array('dumped pgs in format json\n[ ]') == []
+
+    def test_truncated(self):
+        text = json.dumps(self.pgs)[:-10]
+        try:
+            read_array(text, chunk_size=16)
+        except ValueError:
+            pass
+        else:
+            assert False, 'truncated stream parsed'
+
+    def test_trim(self):
+        pg = self.pgs[3]
+        assert pg_stats.trim(pg, ('pgid', 'state', 'missing')) == \
+            {'pgid': '0.3', 'state': 'active+clean'}
+        assert pg_stats.trim(pg, None) is pg
@@ -0,0 +1,73 @@
+import time
+
+import gevent
+
+from .. import powercycle
+
+
+class FakeRemote(object):
+
+    def __init__(self, name, boot_time=0):
+        self.name = name
+        self.console = powercycle.FakeConsole(name, boot_time=boot_time)
+
+
+class TestPowerCycler(object):
+
+    def setup(self):
+        self.reconnected = []
+        self.booted = []
+        self.cycler = powercycle.PowerCycler(
+            self.reconnected.extend, on_boot=self.booted.append)
+
+    def test_cycle(self):
+        remotes = [FakeRemote('a'), FakeRemote('b')]
+        self.cycler.power_off(remotes)
+        assert not remotes[0].console.powered
+        assert self.cycler.is_down(remotes[1])
+        self.cycler.power_on(remotes)
+        assert remotes[0].console.powered
+        assert sorted(r.name for r in self.reconnected) == ['a', 'b']
+        assert sorted(r.name for r in self.booted) == ['a', 'b']
+        assert self.cycler.stats['power_on'] == 2
+
+    def test_host_cycled_once(self):
+        remote = FakeRemote('a')
+        self.cycler.power_off([remote, remote])
+        self.cycler.power_off([remote])
+        self.cycler.power_on([remote])
+        # a second daemon revived on the host reuses the connection
+        self.cycler.power_on([remote])
+        assert remote.console.calls == ['power_off', 'power_on',
+                                        'check_status']
+        assert len(self.reconnected) == 1
+
+    def test_concurrent_callers_join(self):
+        remote = FakeRemote('a', boot_time=0.1)
+        self.cycler.power_off([remote])
+        greenlets = [gevent.spawn(self.cycler.power_on, [remote])
+                     for _ in range(3)]
+        gevent.joinall(greenlets, raise_error=True)
+        assert remote.console.calls.count('power_on') == 1
+        assert self.cycler.stats['joined'] == 2
+        assert len(self.booted) == 1
+
+    def test_parallel(self):
+        remotes = [FakeRemote(str(i), boot_time=0.2) for i in range(5)]
+        self.cycler.power_off(remotes)
+        start = time.time()
+        self.cycler.power_on(remotes)
+        assert time.time() - start < 0.6
+
+    def test_failed_boot(self):
+        remote = FakeRemote('a')
+        self.cycler.power_off([remote])
+        remote.console.check_status = lambda timeout=None: False
+        try:
+            self.cycler.power_on([remote])
+        except Exception:
+            pass
+        else:
+            assert False, 'power_on should have failed'
+        assert self.cycler.is_down(remote)
+        assert self.reconnected == []
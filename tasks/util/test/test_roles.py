@@ -0,0 +1,44 @@
+from .. import roles
+
+
+class FakeCluster(object):
+
+    def __init__(self, remotes):
+        self.remotes = remotes
+
+
+class FakeCtx(object):
+    pass
+
+
+class TestRoleIndex(object):
+
+    def setup(self):
+        self.ctx = FakeCtx()
+        self.ctx.cluster = FakeCluster({
+            'host1': ['mon.a', 'osd.0', 'osd.1'],
+            'host2': ['mon.b', 'osd.2', 'client.0'],
+            })
+
+    def test_lookups(self):
+        index = roles.get_role_index(self.ctx)
+        assert index.remote('mon.b') == 'host2'
+        assert index.find('osd', 1) == 'host1'
+        try:
+            index.find('osd', 3)
+        except KeyError:
+            pass
+        else:
+            assert False, 'osd.3 found'
+
+    def test_cached_until_invalidated(self):
+        index = roles.get_role_index(self.ctx)
+        assert roles.get_role_index(self.ctx) is index
+        roles.invalidate_role_index(self.ctx)
+        assert roles.get_role_index(self.ctx) is not index
+
+    def test_rebuilt_for_new_cluster(self):
+        index = roles.get_role_index(self.ctx)
+        self.ctx.cluster = FakeCluster({'host3': ['osd.0']})
+        assert roles.get_role_index(self.ctx) is not index
+        assert roles.get_role_index(self.ctx).find('osd', 0) == 'host3'
@@ -0,0 +1,79 @@
+import random
+
+from .. import thrash_policy
+
+
+def make_policy(**kwargs):
+    return thrash_policy.ThrashPolicy(random.Random(0), **kwargs)
+
+
+class TestThrashPolicy(object):
+
+    def test_weights(self):
+        policy = make_policy()
+        policy.register('a', lambda: 'a', 3)
+        policy.register('b', lambda: 'b', 1)
+        counts = {'a': 0, 'b': 0}
+        for _ in range(4000):
+            counts[policy.choose()()] += 1
+        assert 2700 < counts['a'] < 3300
+
+    def test_zero_weight(self):
+        policy = make_policy()
+        policy.register('a', lambda: 'a', 0)
+        assert policy.choose() is None
+        policy.register('b', lambda: 'b', 1)
+        assert [a.name for a in policy.actions] == ['b']
+
+    def test_available(self):
+        policy = make_policy()
+        policy.register('a', lambda: 'a', 100, available=lambda: False)
+        policy.register('b', lambda: 'b', 1)
+        for _ in range(100):
+            assert policy.choose().name == 'b'
+
+    def test_none_available(self):
+        policy = make_policy()
+        policy.register('a', lambda: 'a', 1, available=lambda: False)
+        assert policy.choose() is None
+
+    def test_failures_per_minute(self):
+        policy = make_policy(failures_per_minute=2)
+        policy.register('kill', lambda: 'kill', 100, failure=True)
+        policy.register('in', lambda: 'in', 1)
+        names = [policy.choose().name for _ in range(50)]
+        assert names.count('kill') == 2
+
+    def test_charge_failures(self):
+        policy = make_policy(failures_per_minute=3)
+        policy.register('kill', lambda: 'kill', 1, failure=True)
+        assert policy.choose().name == 'kill'
+        assert policy.spare_failures() == 2
+        policy.charge_failures(2)
+        assert policy.spare_failures() == 0
+        assert policy.choose() is None
+        assert make_policy().spare_failures() is None
+
+    def test_duplicate_name(self):
+        policy = make_policy()
+        policy.register('a', lambda: 'a', 1)
+        try:
+            policy.register('a', lambda: 'a', 1)
+        except AssertionError:
+            pass
+        else:
+            assert False, 'duplicate action registered'
+        assert policy.find('a').name == 'a'
+        assert policy.find('b') is None
+
+    def test_delay(self):
+        policy = make_policy(op_delay=5)
+        assert policy.interval() == 5
+        assert policy.delay() == 5
+        policy = make_policy(actions_per_minute=6)
+        assert policy.interval() == 10
+        assert policy.delay() == 0
+        policy.started()
+        assert 9 < policy.delay() <= 10
+        policy.last_start -= 30
+        assert policy.delay() == 0
@@ -0,0 +1,78 @@
+import json
+import os
+import tempfile
+
+from .. import timeline
+
+
+class TestThrashTimeline(object):
+
+    def test_recovery(self):
+        tl = timeline.ThrashTimeline()
+        with tl.action('kill_osd', [1]):
+            pass
+        with tl.action('out_osd', [2]):
+            pass
+        tl.recovered('clean')
+        with tl.action('kill_osd', [3]):
+            pass
+        summary = tl.summary()
+        assert summary['kill_osd']['count'] == 2
+        assert summary['kill_osd']['recovery']['count'] == 1
+        assert summary['out_osd']['recovery']['count'] == 1
+        assert tl.events[0]['recovery_wait'] == 'clean'
+        assert 'recovered' not in tl.events[2]
+        assert tl.pending == [tl.events[2]]
+
+    def test_failure(self):
+        tl = timeline.ThrashTimeline()
+        try:
+            with tl.action('inject_pause', [0]):
+                raise AssertionError()
+        except AssertionError:
+            pass
+        assert tl.summary()['inject_pause']['failures'] == 1
+
+    def test_write(self):
+        tl = timeline.ThrashTimeline()
+        with tl.action('grow_pool'):
+            pass
+        (fd, path) = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            tl.write(path)
+            with file(path) as f:
+                lines = f.readlines()
+        finally:
+            os.remove(path)
+        assert len(lines) == 1
+        assert json.loads(lines[0])['action'] == 'grow_pool'
+
+
+class TestThrashSchedule(object):
+
+    def test_nested_steps(self):
+        schedule = timeline.ThrashSchedule()
+        with schedule.step('kill_osd', osd=1, mark_out=True):
+            with schedule.step('out_osd', osd=1):
+                pass
+        with schedule.step('wait_for_clean'):
+            pass
+        assert [s['action'] for s in schedule.steps] == \
+            ['kill_osd', 'wait_for_clean']
+        assert schedule.steps[0]['args'] == {'osd': 1, 'mark_out': True}
+        assert 'args' not in schedule.steps[1]
+
+    def test_write_and_load(self):
+        schedule = timeline.ThrashSchedule()
+        with schedule.step('revive_osd', osd=3):
+            pass
+        (fd, path) = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            schedule.write(path)
+            steps = timeline.load_schedule(path)
+        finally:
+            os.remove(path)
+        assert steps == schedule.steps
+        assert timeline.load_schedule(steps) is steps
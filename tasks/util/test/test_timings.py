@@ -0,0 +1,70 @@
+import contextlib
+import json
+import os
+import tempfile
+
+from .. import timings
+
+
+@contextlib.contextmanager
+def phase(events, suppress=False):
+    events.append('setup')
+    try:
+        yield 'value'
+    except ValueError:
+        events.append('error')
+        if not suppress:
+            raise
+    finally:
+        events.append('teardown')
+
+
+class TestPhaseTimings(object):
+
+    def test_timed_phase(self):
+        t = timings.PhaseTimings()
+        events = []
+        with timings.timed_phase(t, 'cluster', phase(events)) as value:
+            assert value == 'value'
+            with t.timed('cluster', 'mkfs'):
+                pass
+        assert events == ['setup', 'teardown']
+        assert sorted(t.phases['cluster']) == ['mkfs', 'setup', 'teardown']
+
+    def test_timed_phase_error(self):
+        t = timings.PhaseTimings()
+        events = []
+        try:
+            with timings.timed_phase(t, 'cluster', phase(events)):
+                raise ValueError('boom')
+        except ValueError:
+            pass
+        else:
+            assert False, 'the error should propagate'
+        assert events == ['setup', 'error', 'teardown']
+        assert 'teardown' in t.phases['cluster']
+
+    def test_timed_phase_suppressed(self):
+        t = timings.PhaseTimings()
+        events = []
+        with timings.timed_phase(t, 'cluster', phase(events, True)):
+            raise ValueError('boom')
+        assert events == ['setup', 'error', 'teardown']
+
+    def test_hosts(self):
+        t = timings.PhaseTimings()
+        t.add_host('osd_mkfs', 'a', 1.0)
+        t.add_host('osd_mkfs', 'b', 3.0)
+        t.add_host('osd_mkfs', 'a', 1.5)
+        summary = t.summary()
+        assert summary['hosts']['osd_mkfs']['a'] == 2.5
+        assert summary['hosts']['osd_mkfs']['slowest'] == {
+            'host': 'b', 'seconds': 3.0}
+        (fd, path) = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            t.write(path)
+            with file(path) as f:
+                assert json.load(f) == summary
+        finally:
+            os.unlink(path)
@@ -0,0 +1,36 @@
+from .. import wait
+
+
+class TestWaiter(object):
+
+    def test_wait_succeeds(self):
+        results = iter([False, False, True])
+        sleeps = []
+        report = wait.WaitReport()
+        waiter = wait.Waiter('test', lambda: next(results), interval=1,
+                             max_interval=3, backoff=2, wake=sleeps.append,
+                             report=report)
+        assert waiter.wait()
+        assert sleeps == [1, 2]
+        assert waiter.polls == 3
+        summary = report.summary()['test']
+        assert summary['count'] == 1
+        assert summary['polls'] == 3
+        assert summary['timeouts'] == 0
+
+    def test_wait_times_out(self):
+        report = wait.WaitReport()
+        waiter = wait.Waiter('test', lambda: False, timeout=0.01,
+                             interval=0.005, report=report)
+        assert not waiter.wait()
+        assert report.summary()['test']['timeouts'] == 1
+
+    def test_progress_resets_backoff(self):
+        progress = iter([0, 0, 1, 1, 1])
+        results = iter([False, False, False, True])
+        sleeps = []
+        waiter = wait.Waiter('test', lambda: next(results),
+                             progress=lambda: next(progress), interval=1,
+                             max_interval=8, backoff=2, wake=sleeps.append)
+        assert waiter.wait()
+        assert sleeps == [1, 1, 2]
@@ -0,0 +1,227 @@
+"""
+Weighted, rate-controlled choice of thrash actions.
+
+Actions are registered once with a weight and an optional availability
+check.  Choosing draws from a cumulative weight table built at
+registration time and redraws if the drawn action is not available at
+the moment, which keeps the relative weights of the available actions.
+Actions flagged as failures (killing or marking out osds) can be
+limited to a number per minute, and the pace of actions can be set as
+a number per minute instead of a fixed delay.
+
+Plugins are modules with a ``register_thrash_actions(thrasher, policy)``
+function, which calls policy.register() for each action it adds; their
+actions are marked with the plugin name so that they can be recorded
+and replayed by name.
+"""
+import bisect
+import importlib
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+# redraws before falling back to scanning the available actions
+MAX_DRAWS = 8
+
+
+class ThrashAction(object):
+    """
+    A registered action.
+    """
+    def __init__(self, name, func, weight, available=None, failure=False):
+        self.name = name
+        self.func = func
+        self.weight = weight
+        self.available = available
+        self.failure = failure
+        self.plugin = None
+
+    def __call__(self):
+        return self.func()
+
+
+class TokenBucket(object):
+    """
+    Allows up to rate events per minute, with bursts of up to rate.
+    """
+    def __init__(self, rate):
+        self.rate = float(rate)
+        self.tokens = self.rate
+        self.stamp = time.time()
+
+    def refill(self):
+        """
+        Add the tokens accrued since the last refill.
+        """
+        now = time.time()
+        self.tokens = min(self.rate,
+                          self.tokens + (now - self.stamp) * self.rate / 60)
+        self.stamp = now
+
+    def available(self):
+        """
+        :returns: the number of events that may happen now
+        """
+        self.refill()
+        return int(max(0, self.tokens))
+
+    def has_token(self):
+        """
+        True if an event may happen now.
+        """
+        return self.available() >= 1
+
+    def take(self, count=1):
+        """
+        Account for count events.
+        """
+        self.refill()
+        self.tokens -= count
+
+
+class ThrashPolicy(object):
+    """
+    Registry of thrash actions and the pacing between them.
+
+    :param rng: random.Random to draw with
+    :param op_delay: seconds to sleep after each action
+    :param actions_per_minute: if set, pace actions to start this often
+                               instead of sleeping op_delay
+    :param failures_per_minute: if set, most failure actions per minute
+    """
+    def __init__(self, rng, op_delay=5, actions_per_minute=None,
+                 failures_per_minute=None):
+        self.rng = rng
+        self.op_delay = op_delay
+        self.actions_per_minute = actions_per_minute
+        self.failures = None
+        if failures_per_minute is not None:
+            self.failures = TokenBucket(failures_per_minute)
+        self.actions = []
+        self.cumulative = []
+        self.total = 0.0
+        self.last_start = None
+
+    def register(self, name, func, weight, available=None, failure=False):
+        """
+        Add an action.  Actions with a weight of 0 are ignored.
+
+        :param name: action name, for logging
+        :param func: callable taking no arguments
+        :param weight: relative chance of being chosen
+        :param available: callable returning whether the action may run
+                          now, or None if it always may
+        :param failure: whether the action counts against
+                        failures_per_minute
+        """
+        if weight <= 0:
+            return
+        assert self.find(name) is None, \
+            'thrash action {name} registered twice'.format(name=name)
+        self.actions.append(
+            ThrashAction(name, func, float(weight), available, failure))
+        self.total += float(weight)
+        self.cumulative.append(self.total)
+
+    def find(self, name):
+        """
+        :returns: the registered action called name, or None
+        """
+        for action in self.actions:
+            if action.name == name:
+                return action
+        return None
+
+    def spare_failures(self):
+        """
+        :returns: the number of failures that may happen now on top of
+                  the one a chosen failure action already took, or None
+                  if failures are not limited
+        """
+        if self.failures is None:
+            return None
+        return self.failures.available()
+
+    def charge_failures(self, count):
+        """
+        Account for count more failures, e.g. when a failure action
+        hits several osds.
+        """
+        if self.failures is not None and count > 0:
+            self.failures.take(count)
+
+    def is_available(self, action):
+        """
+        True if action may run now.
+        """
+        if action.failure and self.failures is not None and \
+                not self.failures.has_token():
+            return False
+        return action.available is None or action.available()
+
+    def choose(self):
+        """
+        :returns: a ThrashAction available now, or None
+        """
+        if not self.actions:
+            return None
+        chosen = None
+        for _ in range(MAX_DRAWS):
+            i = bisect.bisect_right(self.cumulative,
+                                    self.rng.uniform(0, self.total))
+            action = self.actions[min(i, len(self.actions) - 1)]
+            if self.is_available(action):
+                chosen = action
+                break
+        if chosen is None:
+            available = [a for a in self.actions if self.is_available(a)]
+            if not available:
+                return None
+            val = self.rng.uniform(0, sum([a.weight for a in available]))
+            for action in available:
+                chosen = action
+                if val < action.weight:
+                    break
+                val -= action.weight
+        if chosen.failure and self.failures is not None:
+            self.failures.take()
+        return chosen
+
+    def interval(self):
+        """
+        :returns: the average number of seconds between actions
+        """
+        if self.actions_per_minute:
+            return 60.0 / self.actions_per_minute
+        return self.op_delay
+
+    def started(self):
+        """
+        Note that an action is starting.
+        """
+        self.last_start = time.time()
+
+    def delay(self):
+        """
+        :returns: seconds to sleep before the next action
+        """
+        if not self.actions_per_minute:
+            return self.op_delay
+        if self.last_start is None:
+            return 0
+        return max(0, self.last_start + self.interval() - time.time())
+
+    def load_plugins(self, thrasher, modules):
+        """
+        Let each plugin module register its actions.
+
+        :param modules: list of module names
+        """
+        for name in modules:
+            log.info('loading thrash plugin %s', name)
+            module = importlib.import_module(name)
+            first = len(self.actions)
+            module.register_thrash_actions(thrasher, self)
+            for action in self.actions[first:]:
+                action.plugin = name
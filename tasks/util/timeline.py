@@ -0,0 +1,161 @@
+"""
+Timeline of thrash actions and of how long the cluster took to recover
+from them, and replayable thrash schedules.
+"""
+import contextlib
+import json
+import logging
+import time
+
+from .cmd_stats import Histogram
+
+log = logging.getLogger(__name__)
+
+
+class ThrashTimeline(object):
+    """
+    Records each thrash action with its start and end time and the osds
+    it touched.  recovered() stamps every action since the previous call
+    with the time from the end of the action until the cluster was
+    found recovered/clean again, and feeds that into a per-action
+    histogram.
+    """
+    def __init__(self):
+        self.events = []
+        self.pending = []
+        self.recovery = {}
+
+    @contextlib.contextmanager
+    def action(self, name, osds=()):
+        """
+        Context manager recording one action around its block.
+
+        :param name: action type, e.g. 'kill_osd'
+        :param osds: osd ids the action applies to
+        """
+        event = {
+            'action': name,
+            'osds': list(osds),
+            'start': time.time(),
+            'failed': False,
+            }
+        try:
+            yield event
+        except Exception:
+            event['failed'] = True
+            raise
+        finally:
+            event['end'] = time.time()
+            self.events.append(event)
+            self.pending.append(event)
+
+    def recovered(self, wait):
+        """
+        Mark the actions since the last call as recovered from.
+
+        :param wait: what was waited for, e.g. 'recovery' or 'clean'
+        """
+        now = time.time()
+        for event in self.pending:
+            event['recovered'] = now - event['end']
+            event['recovery_wait'] = wait
+            hist = self.recovery.get(event['action'])
+            if hist is None:
+                hist = Histogram(0.01, 1.25)
+                self.recovery[event['action']] = hist
+            hist.add(event['recovered'])
+        self.pending = []
+
+    def summary(self):
+        """
+        :returns: dict of action -> count, failures, mean and max action
+                  duration, and count, p50, p99 and max seconds to
+                  recover
+        """
+        ret = {}
+        for event in self.events:
+            entry = ret.setdefault(event['action'], {
+                'count': 0,
+                'failures': 0,
+                'duration_total': 0.0,
+                'duration_max': 0.0,
+                })
+            duration = event['end'] - event['start']
+            entry['count'] += 1
+            entry['duration_total'] += duration
+            entry['duration_max'] = max(entry['duration_max'], duration)
+            if event['failed']:
+                entry['failures'] += 1
+        for (name, entry) in ret.iteritems():
+            entry['duration_mean'] = entry['duration_total'] / entry['count']
+            hist = self.recovery.get(name)
+            if hist is not None:
+                entry['recovery'] = {
+                    'count': hist.count,
+                    'mean': hist.total / hist.count,
+                    'p50': hist.percentile(50),
+                    'p99': hist.percentile(99),
+                    'max': hist.max,
+                    }
+        return ret
+
+    def write(self, path):
+        """
+        Write the events to path, one JSON object per line.
+        """
+        with file(path, 'w') as f:
+            for event in self.events:
+                f.write(json.dumps(event) + '\n')
+
+
+class ThrashSchedule(object):
+    """
+    Compact, replayable record of the steps a thrasher took: the action
+    (a Thrasher method), its arguments and the time since thrashing
+    started.  Steps nested in a recorded step are not recorded, since
+    replaying the outer step repeats them.
+    """
+    def __init__(self, logger=None):
+        self.steps = []
+        self.start = time.time()
+        self.paused = 0
+        self.logger = logger
+
+    @contextlib.contextmanager
+    def step(self, action, **args):
+        """
+        Context manager recording one step around its block.
+        """
+        if not self.paused:
+            step = {'t': round(time.time() - self.start, 2),
+                    'action': action}
+            if args:
+                step['args'] = args
+            self.steps.append(step)
+            if self.logger is not None:
+                self.logger('schedule: ' + json.dumps(step))
+        self.paused += 1
+        try:
+            yield
+        finally:
+            self.paused -= 1
+
+    def write(self, path):
+        """
+        Write the steps to path, one JSON object per line.
+        """
+        with file(path, 'w') as f:
+            for step in self.steps:
+                f.write(json.dumps(step, separators=(',', ':')) + '\n')
+
+
+def load_schedule(source):
+    """
+    :param source: list of steps, or path of a schedule written by
+                   ThrashSchedule.write
+    :returns: list of steps
+    """
+    if isinstance(source, list):
+        return source
+    with file(source) as f:
+        return [json.loads(line) for line in f if line.strip()]
@@ -0,0 +1,122 @@
+"""
+Wall clock timings of the phases of a task.
+
+Each phase is timed in named parts, e.g. 'setup' and 'teardown' for a
+contextmanager phase, or finer steps such as 'compress_logs'.  Steps
+run on every host (mkfs, pulling logs) are also timed per host, so that
+a slow host or a slow step on every host stands out.
+"""
+import contextlib
+import json
+import logging
+import sys
+import time
+
+log = logging.getLogger(__name__)
+
+
+class PhaseTimings(object):
+    """
+    Seconds spent per phase and part, and per step and host.
+    """
+    def __init__(self):
+        self.phases = {}
+        self.hosts = {}
+
+    def add(self, phase, part, seconds):
+        """
+        Add seconds to a part of a phase.
+        """
+        parts = self.phases.setdefault(phase, {})
+        parts[part] = parts.get(part, 0.0) + seconds
+
+    def add_host(self, step, host, seconds):
+        """
+        Add seconds to a step on a host.
+        """
+        hosts = self.hosts.setdefault(step, {})
+        hosts[host] = hosts.get(host, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def timed(self, phase, part='total'):
+        """
+        Context manager timing its block as a part of a phase.
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add(phase, part, time.time() - start)
+
+    @contextlib.contextmanager
+    def timed_host(self, step, host):
+        """
+        Context manager timing its block as a step on a host.
+        """
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add_host(step, host, time.time() - start)
+
+    def summary(self):
+        """
+        :returns: dict with 'phases' (phase -> part -> seconds) and
+                  'hosts' (step -> host -> seconds, plus the max over
+                  hosts under 'slowest')
+        """
+        hosts = {}
+        for (step, times) in self.hosts.iteritems():
+            hosts[step] = dict(times)
+            (host, seconds) = max(times.iteritems(), key=lambda t: t[1])
+            hosts[step]['slowest'] = {'host': host, 'seconds': seconds}
+        return {
+            'phases': dict([(phase, dict(parts))
+                            for (phase, parts) in self.phases.iteritems()]),
+            'hosts': hosts,
+            }
+
+    def write(self, path):
+        """
+        Write summary() to path as JSON.
+        """
+        with file(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2, sort_keys=True)
+
+
+def get_phase_timings(ctx):
+    """
+    :returns: the PhaseTimings of this job, created on first use
+    """
+    if getattr(ctx, 'phase_timings', None) is None:
+        ctx.phase_timings = PhaseTimings()
+    return ctx.phase_timings
+
+
+@contextlib.contextmanager
+def timed_phase(timings, phase, manager):
+    """
+    Enter the context manager manager, timing its setup (entering) and
+    its teardown (exiting) as parts of phase.
+    """
+    start = time.time()
+    try:
+        value = manager.__enter__()
+    finally:
+        timings.add(phase, 'setup', time.time() - start)
+    try:
+        yield value
+    except:
+        exc_info = sys.exc_info()
+        start = time.time()
+        try:
+            if not manager.__exit__(*exc_info):
+                raise exc_info[0], exc_info[1], exc_info[2]
+        finally:
+            timings.add(phase, 'teardown', time.time() - start)
+    else:
+        start = time.time()
+        try:
+            manager.__exit__(None, None, None)
+        finally:
+            timings.add(phase, 'teardown', time.time() - start)
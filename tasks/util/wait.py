@@ -0,0 +1,152 @@
+"""
+Polling helper shared by tasks that wait for cluster state changes.
+"""
+import logging
+import random
+import time
+
+log = logging.getLogger(__name__)
+
+
+class WaitReport(object):
+    """
+    Accumulates how long each named wait took over a job.
+    """
+    def __init__(self):
+        self.waits = {}
+
+    def add(self, name, elapsed, polls, success):
+        """
+        Record one completed wait.
+        """
+        entry = self.waits.setdefault(name, {
+            'count': 0,
+            'timeouts': 0,
+            'polls': 0,
+            'total': 0.0,
+            'max': 0.0,
+            })
+        entry['count'] += 1
+        entry['polls'] += polls
+        entry['total'] += elapsed
+        entry['max'] = max(entry['max'], elapsed)
+        if not success:
+            entry['timeouts'] += 1
+
+    def summary(self):
+        """
+        :returns: dict of wait name -> count, timeouts, polls, total,
+                  mean and max seconds
+        """
+        ret = {}
+        for (name, entry) in self.waits.iteritems():
+            ret[name] = dict(entry)
+            ret[name]['mean'] = entry['total'] / entry['count']
+        return ret
+
+
+def get_wait_report(ctx):
+    """
+    :returns: the WaitReport of this job, created on first use
+    """
+    if ctx is None:
+        return None
+    if getattr(ctx, 'wait_report', None) is None:
+        ctx.wait_report = WaitReport()
+    return ctx.wait_report
+
+
+class Waiter(object):
+    """
+    Poll predicate until it returns true.
+
+    The delay between polls starts at interval and grows by backoff up
+    to max_interval, with +/- jitter (a fraction of the delay) applied.
+    If timeout is set, wait() gives up once timeout seconds pass without
+    progress: the deadline is reset whenever the progress callable
+    returns a new value or making_progress returns true, and the delay
+    drops back to interval.  wake(seconds) is used for sleeping when
+    given, so that an event source can end a sleep early.
+    """
+    def __init__(self, name, predicate, timeout=None, progress=None,
+                 making_progress=None, interval=1.0, max_interval=None,
+                 backoff=1.0, jitter=0.0, wake=None, report=None,
+                 logger=None):
+        self.name = name
+        self.predicate = predicate
+        self.timeout = timeout
+        self.progress = progress
+        self.making_progress = making_progress
+        self.interval = interval
+        if max_interval is None:
+            max_interval = interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.wake = wake
+        self.report = report
+        if logger is None:
+            logger = log
+        self.logger = logger
+        self.elapsed = 0.0
+        self.polls = 0
+
+    def sleep(self, seconds):
+        """
+        Sleep between polls, through wake if set.
+        """
+        if self.wake is not None:
+            self.wake(seconds)
+        else:
+            time.sleep(seconds)
+
+    def wait(self):
+        """
+        :returns: True once predicate holds, False if the timeout expired.
+        """
+        start = time.time()
+        deadline_start = start
+        delay = self.interval
+        last = None
+        if self.progress is not None:
+            last = self.progress()
+        while True:
+            self.polls += 1
+            if self.predicate():
+                return self.done(start, True)
+            now = time.time()
+            reset = False
+            if self.progress is not None:
+                cur = self.progress()
+                if cur != last:
+                    last = cur
+                    reset = True
+            if self.timeout is not None and not reset and \
+                    self.making_progress is not None and \
+                    self.making_progress():
+                self.logger.info('%s: making progress, resetting timeout',
+                                 self.name)
+                reset = True
+            if reset:
+                deadline_start = now
+                delay = self.interval
+            if self.timeout is not None:
+                remaining = self.timeout - (now - deadline_start)
+                if remaining <= 0:
+                    return self.done(start, False)
+            sleep = delay
+            if self.jitter:
+                sleep += random.uniform(-self.jitter, self.jitter) * delay
+            if self.timeout is not None:
+                sleep = min(sleep, remaining)
+            self.sleep(max(sleep, 0))
+            delay = min(delay * self.backoff, self.max_interval)
+
+    def done(self, start, success):
+        """
+        Record the finished wait.
+        """
+        self.elapsed = time.time() - start
+        if self.report is not None:
+            self.report.add(self.name, self.elapsed, self.polls, success)
+        return success